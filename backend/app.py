@@ -1,17 +1,21 @@
 from flask import Flask
-from flask_socketio import SocketIO
 from flask_cors import CORS
-from models import db
+from models import db, Lobby
 from config import Config
 from routes.api import create_api_routes
-from sockets.connection import register_connection_handlers
-from sockets.lobby import register_lobby_handlers
-from sockets.game import register_game_handlers
-from utils.helpers import start_cleanup_thread
-from dotenv import load_dotenv
+from services.persistence import write_behind
+from services.scheduler import scheduler
+from services.cluster import cluster
+from services.storage import init_storage
+from services.sweeper import sweeper
+from services.archive import archiver
+from services.code_pool import code_pool
+from services import metrics, wire
+from services.log import configure_logging, get_logger
 
-# Load environment variables from .env file
-load_dotenv()
+# Start the background log writer before anything logs
+configure_logging()
+log = get_logger('app')
 
 # Create Flask app
 app = Flask(__name__, static_folder=Config.STATIC_FOLDER)
@@ -23,32 +27,80 @@ app.config.from_object(Config)
 # Initialize database
 db.init_app(app)
 
-# Initialize SocketIO
-socketio = SocketIO(
-    app,
-    cors_allowed_origins=Config.SOCKETIO_CORS_ALLOWED_ORIGINS,
-    async_mode=Config.SOCKETIO_ASYNC_MODE
-)
-
 # Register HTTP routes
 create_api_routes(app)
 
-# Register Socket.IO handlers
-register_connection_handlers(socketio)
-register_lobby_handlers(socketio)
-register_game_handlers(app, socketio)
+# The compact wire format needs msgpack; without it clients fall back to JSON
+if Config.COMPACT_WIRE and not wire.available():
+    log.warning('compact_wire_unavailable', "COMPACT_WIRE is on but msgpack is not installed; "
+                "every socket will get JSON")
+
+# Connect to the other workers, if any
+cluster.connect()
+
+if Config.SOCKETIO_ASYNC_MODE == 'asgi':
+    # Initialize AsyncServer; serve with uvicorn (app:asgi_app)
+    from sockets.async_server import create_asgi_app
+    asgi_app, transport = create_asgi_app(app)
+else:
+    from flask_socketio import SocketIO
+    from sockets.transport import ThreadingTransport
+    from services.payloads import payload_json
+    from sockets.connection import register_connection_handlers
+    from sockets.lobby import register_lobby_handlers
+    from sockets.game import register_game_handlers
+
+    # Initialize SocketIO
+    socketio = SocketIO(
+        app,
+        cors_allowed_origins=Config.SOCKETIO_CORS_ALLOWED_ORIGINS,
+        async_mode=Config.SOCKETIO_ASYNC_MODE,
+        client_manager=cluster.client_manager(),
+        json=payload_json
+    )
+    transport = ThreadingTransport(socketio)
+
+    # Register Socket.IO handlers
+    register_connection_handlers(app, socketio, transport)
+    register_lobby_handlers(app, socketio, transport)
+    register_game_handlers(app, socketio, transport)
+
+# Initialize database tables and bring older databases up to date
+init_storage(app, db)
+log.info('database_ready', "Database initialized successfully")
 
-# Initialize database tables
+# Count and time queries and commits for /metrics
 with app.app_context():
-    db.create_all()
-    print("Database initialized successfully")
+    metrics.watch_database(db.engine, db.session)
+
+# Fill the lobby code pool, skipping codes of lobbies already in the database
+with app.app_context():
+    code_pool.load(db.session.query(Lobby.code, Lobby.expires_at).all())
+log.info('code_pool_ready', f"Lobby code pool ready: {code_pool.stats()['free']} free codes")
+
+# Start write-behind flusher for in-memory lobby state
+write_behind.start(app)
+
+# Start the game deadline scheduler
+scheduler.start()
+
+# Start running events forwarded from other workers
+cluster.start(app)
+
+# Start sweeping expired lobbies and stale rows
+sweeper.start(app, transport)
 
-# Start cleanup thread
-start_cleanup_thread(app, db)
+# Start moving finished games to the archive
+archiver.start(app)
 
 if __name__ == '__main__':
     print("=" * 40)
     print("Trivia Server Running")
-    print("http://localhost:5000")
+    print(f"http://localhost:{Config.PORT}")
     print("=" * 40)
-    socketio.run(app, host='0.0.0.0', port=5000, debug=True)
+    if Config.SOCKETIO_ASYNC_MODE == 'asgi':
+        import uvicorn
+        uvicorn.run(asgi_app, host='0.0.0.0', port=Config.PORT)
+    else:
+        # The reloader would start a second copy of each worker
+        socketio.run(app, host='0.0.0.0', port=Config.PORT, debug=True, use_reloader=not cluster.enabled)
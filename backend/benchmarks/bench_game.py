@@ -0,0 +1,292 @@
+"""
+Game hot path benchmarks.
+
+Seeds a scratch SQLite database with a history of finished games, sets up
+one live lobby, then times each hot path: calculate_points, start_question,
+submit_answer, end_question, next_question, end_game, join_lobby (with the
+lobby in memory, and cold from the database) and the write-behind flush
+that persists their changes. Each path reports median and p95 wall time
+and database queries per call, and is compared against the stored
+baseline; a path is flagged when it gets slower than --threshold or runs
+more queries.
+
+    cd backend && python -m benchmarks.bench_game
+    cd backend && python -m benchmarks.bench_game --players 500 --history-lobbies 1000
+    cd backend && python -m benchmarks.bench_game --save-baseline
+
+Exits with status 1 if anything regressed. Timings depend on the machine,
+so re-record the baseline when moving to a different one.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from flask import Flask
+from sqlalchemy import event
+
+from models import db, Lobby, Player, PlayerAnswer
+from services.storage import init_storage
+from services.lobby_state import registry, LobbyState, PlayerState, AnswerState
+from services.persistence import write_behind
+from services.answer_ingest import answer_ingest
+from services.scheduler import scheduler
+from services.question_bank import question_bank
+from services.game_service import calculate_points, start_question, end_question, next_question, end_game
+from sockets.game import submit_answer
+from sockets.lobby import join_lobby
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+CODE = 'BNCH'
+MODE = 'ffa'
+# Timing differences below this many ms are noise, never a regression
+NOISE_MS = 0.05
+
+
+class RecordingTransport:
+    """Transport that only counts what would have been sent"""
+
+    def __init__(self):
+        self.emits = 0
+
+    def emit(self, event, data, room=None, to=None, skip_sid=None):
+        self.emits += 1
+
+    def enter_room(self, sid, room):
+        pass
+
+    def leave_room(self, sid, room):
+        pass
+
+
+class QueryCounter:
+    def __init__(self, engine):
+        self.count = 0
+        event.listen(engine, 'before_cursor_execute', self._on_query)
+
+    def _on_query(self, *args):
+        self.count += 1
+
+
+def seed_history(lobbies, players, questions):
+    """Finished games: lobbies with players and one answer per player per question"""
+    old = datetime.utcnow() - timedelta(hours=1)
+    lobby_rows, player_rows, answer_rows = [], [], []
+    for i in range(lobbies):
+        code = f'H{i:03d}' if i < 1000 else f'{i:04d}'
+        lobby_rows.append({'code': code, 'host_session_id': f'{code}-host', 'status': 'results',
+                           'game_mode': MODE, 'current_question_index': questions, 'created_at': old,
+                           'expires_at': old + timedelta(hours=24)})
+        for p in range(players):
+            session_id = f'{code}-{p}'
+            player_rows.append({'session_id': session_id, 'lobby_code': code, 'display_name': f'Player {p}',
+                                'score': 0, 'is_connected': False, 'last_seen_at': old, 'joined_at': old})
+            for q in range(questions):
+                answer_rows.append({'player_session_id': session_id, 'lobby_code': code, 'question_index': q,
+                                    'answer_index': p % 4, 'answered_at': old, 'time_taken': 2.5,
+                                    'points_earned': 3 if p % 4 == 0 else 0})
+    db.session.execute(Lobby.__table__.insert(), lobby_rows)
+    db.session.execute(Player.__table__.insert(), player_rows)
+    if answer_rows:
+        db.session.execute(PlayerAnswer.__table__.insert(), answer_rows)
+    db.session.commit()
+    return len(answer_rows)
+
+
+def seed_live(players):
+    """The lobby being benchmarked, live in the registry and flushed to the database"""
+    lobby = LobbyState(CODE, host_session_id='bench-host', status='playing', game_mode=MODE)
+    for p in range(players):
+        session_id = f'bench-{p}'
+        lobby.add_player(PlayerState(session_id, f'Player {p}'))
+        write_behind.mark_player(CODE, session_id)
+    add_live(lobby)
+    write_behind.mark_lobby(CODE)
+    write_behind.flush()
+    return lobby
+
+
+def add_live(lobby):
+    registry.add(lobby)
+    for p, session_id in enumerate(lobby.players):
+        registry.bind_socket(f'sid-{p}', session_id, CODE, 'player')
+
+
+def reset_question(lobby, status='playing', index=0):
+    with lobby.lock:
+        lobby.status = status
+        lobby.current_question_index = index
+        lobby.begin_question()
+    answer_ingest.discard_lobby(CODE)
+    scheduler.cancel_lobby(CODE)
+
+
+def answer_all(lobby, question_index=0):
+    for p, session_id in enumerate(lobby.players):
+        lobby.record_answer(AnswerState(session_id, question_index, p % 4, 2.5, 3 if p % 4 == 0 else 0))
+
+
+def cases(app, transport, lobby):
+    """(name, setup, call) per path; setup runs untimed and returns the call's args"""
+    points_args = [(t / 10, 7, t % 3 != 0) for t in range(1000)]
+
+    def calculate_points_x1000():
+        for args in points_args:
+            calculate_points(*args)
+
+    def setup_submit():
+        reset_question(lobby)
+        return ('sid-0', {'question_index': 0, 'answer_index': 2})
+
+    def setup_end_question():
+        reset_question(lobby)
+        answer_all(lobby)
+        return ()
+
+    def setup_join():
+        return (str(uuid.uuid4()), {'code': CODE, 'name': 'Newcomer', 'sessionId': str(uuid.uuid4())})
+
+    def call_join(sid, data):
+        join_lobby(transport, sid, data)
+        # Leave the roster as it was for the next run
+        live = registry.get(CODE)
+        with live.lock:
+            live.remove_player(data['sessionId'])
+        registry.unbind_socket(sid)
+
+    def call_join_cold(sid, data):
+        registry.remove(CODE)
+        try:
+            call_join(sid, data)
+        finally:
+            registry.remove(CODE)
+            add_live(lobby)
+
+    flush_round = [0]
+
+    def setup_flush():
+        # A question's worth of answers plus every player's roster entry
+        flush_round[0] += 1
+        question_index = 1000 + flush_round[0]
+        for p, session_id in enumerate(lobby.players):
+            answer_ingest.submit(CODE, AnswerState(session_id, question_index, p % 4, 2.5, 3 if p % 4 == 0 else 0))
+            write_behind.mark_player(CODE, session_id)
+        write_behind.mark_lobby(CODE)
+        return ()
+
+    return [
+        ('calculate_points x1000', lambda: (), calculate_points_x1000),
+        ('start_question', lambda: reset_question(lobby) or (app, transport, CODE), start_question),
+        ('submit_answer', setup_submit, lambda sid, data: submit_answer(app, transport, sid, data)),
+        ('end_question', setup_end_question, lambda: end_question(app, transport, CODE)),
+        ('next_question', lambda: reset_question(lobby, status='reveal') or (app, transport, CODE), next_question),
+        ('end_game', lambda: reset_question(lobby) or (app, transport, CODE), end_game),
+        ('join_lobby', setup_join, call_join),
+        ('join_lobby cold', setup_join, call_join_cold),
+        ('write_behind.flush', setup_flush, write_behind.flush),
+    ]
+
+
+def measure(setup, call, repeat, counter):
+    samples = []
+    queries = 0
+    for _ in range(repeat):
+        args = setup()
+        before = counter.count
+        started = time.perf_counter()
+        call(*args)
+        samples.append((time.perf_counter() - started) * 1000)
+        queries += counter.count - before
+    samples.sort()
+    return {
+        'median_ms': round(samples[len(samples) // 2], 4),
+        'p95_ms': round(samples[min(len(samples) - 1, int(len(samples) * 0.95))], 4),
+        'queries': round(queries / repeat, 2)
+    }
+
+
+def compare(results, baseline, threshold):
+    """Print results next to the baseline; return the names of regressed paths"""
+    regressed = []
+    print(f"{'path':<24} {'median ms':>10} {'p95 ms':>9} {'queries':>8} {'base ms':>9} {'change':>8}")
+    for name, r in results.items():
+        base = baseline.get(name)
+        flag = ''
+        if base:
+            change = (r['median_ms'] - base['median_ms']) / base['median_ms'] if base['median_ms'] else 0.0
+            slower = change > threshold and r['median_ms'] - base['median_ms'] > NOISE_MS
+            more_queries = r['queries'] > base['queries']
+            if slower or more_queries:
+                regressed.append(name)
+                flag = '  REGRESSED' + (' (queries)' if more_queries else '')
+            base_ms, change_text = f"{base['median_ms']:>9.3f}", f"{change:>+8.0%}"
+        else:
+            base_ms, change_text = f"{'-':>9}", f"{'-':>8}"
+        print(f"{name:<24} {r['median_ms']:>10.3f} {r['p95_ms']:>9.3f} {r['queries']:>8.1f} "
+              f"{base_ms} {change_text}{flag}")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the game hot paths')
+    parser.add_argument('--players', type=int, default=100, help='players in the live lobby')
+    parser.add_argument('--history-lobbies', type=int, default=200, help='finished games already in the database')
+    parser.add_argument('--history-players', type=int, default=20, help='players per finished game')
+    parser.add_argument('--history-questions', type=int, default=10, help='answers per player per finished game')
+    parser.add_argument('--repeat', type=int, default=50, help='timed runs per path')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed slowdown before flagging, 0.25 = 25%%')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the new baseline')
+    args = parser.parse_args()
+    params = {k: getattr(args, k) for k in ('players', 'history_lobbies', 'history_players', 'history_questions')}
+
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+    init_storage(app, db)
+    write_behind.init_app(app)
+
+    try:
+        with app.app_context():
+            started = time.perf_counter()
+            answers = seed_history(args.history_lobbies, args.history_players, args.history_questions)
+            lobby = seed_live(args.players)
+            print(f"Seeded {args.history_lobbies} finished games ({answers} answers) and a live lobby "
+                  f"of {args.players} players in {time.perf_counter() - started:.1f}s "
+                  f"({len(question_bank.get(MODE).questions)}-question pack)\n")
+
+            counter = QueryCounter(db.engine)
+            transport = RecordingTransport()
+            results = {
+                name: measure(setup, call, args.repeat, counter)
+                for name, setup, call in cases(app, transport, lobby)
+            }
+    finally:
+        os.remove(path)
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE) as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        if stored['params'] != params:
+            print(f"Note: baseline was recorded with {stored['params']}\n")
+
+    regressed = compare(results, baseline, args.threshold)
+
+    if args.save_baseline:
+        with open(BASELINE, 'w') as f:
+            json.dump({'params': params, 'results': results}, f, indent=2)
+        print(f"\nBaseline saved to {BASELINE}")
+    elif regressed:
+        print(f"\n{len(regressed)} path(s) regressed: {', '.join(regressed)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
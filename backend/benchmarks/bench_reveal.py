@@ -0,0 +1,98 @@
+"""
+Reveal latency benchmark.
+
+Times building the end_question reveal (answer_stats plus the score updates)
+for 10, 100 and 1000 players, comparing the old path (one query for
+the answers, one Player query per answer, one more for the roster) with
+services.reveal.build_reveal over in-memory state.
+
+    cd backend && python -m benchmarks.bench_reveal
+"""
+import os
+import random
+import tempfile
+import time
+from flask import Flask
+from models import db, Lobby, Player, PlayerAnswer
+from services.lobby_state import LobbyState, PlayerState, AnswerState
+from services.reveal import build_reveal
+from services.question_bank import Question
+
+SIZES = (10, 100, 1000)
+REPEAT = 20
+QUESTION = Question(id=1, text='q', answers=('a', 'b', 'c', 'd'), correct=2, audio=None)
+
+
+def legacy_reveal(code, question_index):
+    """The reveal as end_question built it from the database"""
+    answers = PlayerAnswer.query.filter_by(
+        lobby_code=code,
+        question_index=question_index
+    ).order_by(PlayerAnswer.answered_at).all()
+
+    answer_stats = [{'players': []} for _ in range(len(QUESTION.answers))]
+    for answer in answers:
+        player = Player.query.filter_by(session_id=answer.player_session_id).first()
+        if player:
+            answer_stats[answer.answer_index]['players'].append({
+                'name': player.display_name,
+                'initial': player.display_name[0].upper(),
+                'points': answer.points_earned,
+                'session_id': player.session_id
+            })
+
+    players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=code).all()]
+    return answer_stats, players_list
+
+
+def seed(code, size):
+    """Create a lobby with size players who all answered question 0"""
+    lobby = LobbyState(code, host_session_id='host', status='playing', game_mode='ffa')
+    db.session.add(Lobby(code=code, host_session_id='host', status='playing', game_mode='ffa'))
+    for i in range(size):
+        session_id = f'{code}-{i}'
+        answer_index = random.randrange(4)
+        points = 3 if answer_index == QUESTION.correct else 0
+        lobby.add_player(PlayerState(session_id, f'Player {i}', score=points))
+        lobby.record_answer(AnswerState(session_id, 0, answer_index, 2.5, points))
+        db.session.add(Player(session_id=session_id, lobby_code=code, display_name=f'Player {i}', score=points))
+        db.session.add(PlayerAnswer(player_session_id=session_id, lobby_code=code, question_index=0,
+                                    answer_index=answer_index, time_taken=2.5, points_earned=points))
+    db.session.commit()
+    return lobby
+
+
+def timed(fn, *args):
+    """Median wall time of fn(*args) in milliseconds"""
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def main():
+    handle, path = tempfile.mkstemp(suffix='.db')
+    os.close(handle)
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{path}'
+    db.init_app(app)
+
+    try:
+        with app.app_context():
+            db.create_all()
+            print(f"{'players':>8} {'legacy ms':>10} {'in-memory ms':>13} {'speedup':>8}")
+            for i, size in enumerate(SIZES):
+                code = f'B{i:03d}'
+                lobby = seed(code, size)
+                legacy = timed(legacy_reveal, code, 0)
+                current = timed(build_reveal, lobby, QUESTION)
+                print(f"{size:>8} {legacy:>10.2f} {current:>13.3f} {legacy / current:>7.0f}x")
+    finally:
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Wire format benchmark.
+
+Builds the biggest events a lobby sends (question_started, players_updated,
+question_ended and leaderboard) for 10, 100 and 1000 players and compares
+the JSON the server sends today with the compact msgpack format from
+services.wire: bytes per event and encode time per event.
+
+    cd backend && python -m benchmarks.bench_wire
+
+Needs the msgpack package.
+"""
+import json
+import random
+import sys
+import time
+import uuid
+from services import wire
+from services.lobby_state import LobbyState, PlayerState, AnswerState
+from services.reveal import build_reveal
+from services.question_bank import Question
+
+SIZES = (10, 100, 1000)
+REPEAT = 50
+QUESTION = Question(id=1, text="What was the original title of 'The Little Drummer Boy'?",
+                    answers=('Carol of the Drum', 'Boy with the Drum', 'Little Drummer', 'Drum Carol'),
+                    correct=0, audio='/audio/questions/question-2.mp3')
+
+
+def events(size):
+    """(event, payload) pairs for a lobby of `size` players who all answered"""
+    lobby = LobbyState('BWIR', host_session_id=str(uuid.uuid4()), status='playing', game_mode='ffa')
+    for i in range(size):
+        session_id = str(uuid.uuid4())
+        answer_index = random.randrange(4)
+        points = random.randrange(1, 6) if answer_index == QUESTION.correct else 0
+        lobby.add_player(PlayerState(session_id, f'Player {i}', score=random.randrange(40)))
+        lobby.record_answer(AnswerState(session_id, 0, answer_index, 2.5, points))
+    answer_stats, _ = build_reveal(lobby, QUESTION)
+    ranks = lobby.rank_changes()
+    top = lobby.standings(10)
+    for entry in top:
+        entry['delta'] = ranks[entry['session_id']][1]
+    return [
+        ('question_started', {'question_index': 0, 'question': QUESTION.text, 'answers': list(QUESTION.answers),
+                              'time_limit': 15, 'total_questions': 10, 'audio': QUESTION.audio}),
+        ('players_updated', lobby.roster_snapshot()),
+        ('question_ended', {'question_index': 0, 'correct_answer': QUESTION.correct, 'answer_stats': answer_stats}),
+        ('leaderboard', {'question_index': 0, 'total': size, 'top': top})
+    ]
+
+
+def timed(fn, *args):
+    """Median wall time of fn(*args) in microseconds"""
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        fn(*args)
+        samples.append((time.perf_counter() - start) * 1e6)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def encode_json(event, data):
+    # As the Socket.IO server frames it
+    return json.dumps([event, data], separators=(',', ':'))
+
+
+def main():
+    if wire.msgpack is None:
+        sys.exit('bench_wire needs the msgpack package')
+    random.seed(1)
+    print(f"{'players':>8} {'event':<18} {'json B':>9} {'compact B':>10} {'size':>6} {'json us':>9} {'compact us':>11}")
+    for size in SIZES:
+        for event, data in events(size):
+            json_bytes = len(encode_json(event, data))
+            compact_bytes = len(wire._pack(event, data))
+            json_us = timed(encode_json, event, data)
+            compact_us = timed(wire._pack, event, data)
+            print(f"{size:>8} {event:<18} {json_bytes:>9} {compact_bytes:>10} "
+                  f"{compact_bytes / json_bytes:>6.0%} {json_us:>9.1f} {compact_us:>11.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,281 @@
+"""
+Socket.IO load test.
+
+Drives N lobbies of M simulated players through the real event flow:
+create_lobby, join_lobby, start_game, select_game_mode, then per question
+question_started, host audio_finished, submit_answer and question_ended,
+until game_ended. Reports p50/p95/p99 latency per event, how far apart the
+clients of a lobby received each broadcast (skew), and error counts.
+
+Against a running server:
+
+    cd backend && python -m benchmarks.loadtest --url http://127.0.0.1:5000 --lobbies 20 --players 30
+
+Or start the asgi server in-process on a scratch database, with a short
+copy of the question pack so a run takes seconds rather than minutes:
+
+    cd backend && python -m benchmarks.loadtest --in-process --questions 3 --time-limit 2
+
+Needs the asyncio client extras (pip install "python-socketio[asyncio_client]").
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+import socketio
+
+
+class Stats:
+    """Latency samples per event, broadcast skew samples and error counts"""
+
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.skew = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def report(self):
+        lines = [f"{'event':<28} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}"]
+        for name, samples in sorted(self.latency.items()):
+            lines.append(_row(name, samples))
+        if self.skew:
+            lines.append('')
+            lines.append(f"{'broadcast skew':<28} {'count':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+            for name, samples in sorted(self.skew.items()):
+                lines.append(_row(name, samples))
+        lines.append('')
+        if self.errors:
+            lines.append('errors:')
+            for message, count in sorted(self.errors.items(), key=lambda e: -e[1]):
+                lines.append(f"  {count:>6}  {message}")
+        else:
+            lines.append('errors: none')
+        return '\n'.join(lines)
+
+    def to_dict(self):
+        return {
+            'latency_ms': {k: _summary(v) for k, v in self.latency.items()},
+            'skew_ms': {k: _summary(v) for k, v in self.skew.items()},
+            'errors': dict(self.errors)
+        }
+
+
+def _percentile(ordered, p):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+
+def _summary(samples):
+    ordered = sorted(samples)
+    return {
+        'count': len(ordered),
+        'p50': round(_percentile(ordered, 50) * 1000, 2),
+        'p95': round(_percentile(ordered, 95) * 1000, 2),
+        'p99': round(_percentile(ordered, 99) * 1000, 2),
+        'max': round(ordered[-1] * 1000, 2)
+    }
+
+
+def _row(name, samples):
+    s = _summary(samples)
+    return f"{name:<28} {s['count']:>6} {s['p50']:>8.1f} {s['p95']:>8.1f} {s['p99']:>8.1f} {s['max']:>8.1f}"
+
+
+class SimClient:
+    """One simulated browser: records every event it receives with its arrival time"""
+
+    def __init__(self, stats, timeout):
+        self.stats = stats
+        self.timeout = timeout
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.inbox = defaultdict(list)   # event -> [(arrived, data)]
+        self.changed = asyncio.Condition()
+        self.sio.on('*', self._on_event)
+
+    async def _on_event(self, event, data=None):
+        if event == 'error':
+            self.stats.errors[(data or {}).get('message', 'unknown')] += 1
+        async with self.changed:
+            self.inbox[event].append((time.perf_counter(), data))
+            self.changed.notify_all()
+
+    async def connect(self, url):
+        started = time.perf_counter()
+        await self.sio.connect(url, transports=['websocket'])
+        self.stats.latency['connect'].append(time.perf_counter() - started)
+
+    async def wait_for(self, event, match=None, after=0.0):
+        """Arrival time and data of the first matching event received after `after`"""
+        def find():
+            for arrived, data in self.inbox[event]:
+                if arrived >= after and (match is None or match(data)):
+                    return arrived, data
+            return None
+
+        async with self.changed:
+            found = await asyncio.wait_for(self.changed.wait_for(find), self.timeout)
+        return found
+
+    async def request(self, event, data, reply, match=None):
+        """Emit an event and time until its reply arrives"""
+        started = time.perf_counter()
+        await self.sio.emit(event, data)
+        arrived, payload = await self.wait_for(reply, match, after=started)
+        self.stats.latency[event].append(arrived - started)
+        return payload
+
+
+async def run_lobby(url, players, mode, think, stats, timeout):
+    host = SimClient(stats, timeout)
+    clients = [SimClient(stats, timeout) for _ in range(players)]
+    everyone = [host] + clients
+    try:
+        await host.connect(url)
+        created = await host.request('create_lobby', {}, 'lobby_created')
+        code = created['code']
+
+        await asyncio.gather(*(c.connect(url) for c in clients))
+        await asyncio.gather(*(
+            c.request('join_lobby', {'code': code, 'name': f'Player {i}'}, 'lobby_joined')
+            for i, c in enumerate(clients)
+        ))
+
+        await host.request('start_game', {'code': code}, 'mode_selection_started')
+        await host.request('select_game_mode', {'code': code, 'mode': mode}, 'game_mode_selected')
+
+        question_index = 0
+        while True:
+            is_question = lambda d, q=question_index: d['question_index'] == q
+            started = await asyncio.gather(*(c.wait_for('question_started', is_question) for c in everyone))
+            _record_skew(stats, 'question_started', started)
+            info = started[0][1]
+
+            # Host finishes the audio; players answer while the timer runs
+            timer_at, _ = await _host_audio_finished(host, question_index, stats, started[0][0])
+            answered = await asyncio.gather(*(
+                _answer(c, question_index, len(info['answers']), think) for c in clients
+            ))
+
+            ended = await asyncio.gather(*(c.wait_for('question_ended', is_question) for c in everyone))
+            _record_skew(stats, 'question_ended', ended)
+            # Once everyone has answered the reveal comes early: time it from the last answer
+            deadline = timer_at + info['time_limit']
+            if ended[0][0] < deadline:
+                stats.latency['question_ended early'].append(
+                    max(0.0, ended[0][0] - max(answered)))
+            else:
+                stats.latency['question_ended after limit'].append(ended[0][0] - deadline)
+
+            question_index += 1
+            if question_index >= info['total_questions']:
+                break
+
+        ended = await asyncio.gather(*(c.wait_for('game_ended') for c in everyone))
+        _record_skew(stats, 'game_ended', ended)
+    except asyncio.TimeoutError:
+        stats.errors['timed out waiting for an event'] += 1
+    except socketio.exceptions.ConnectionError as e:
+        stats.errors[f'connect failed: {e}'] += 1
+    finally:
+        await asyncio.gather(*(c.sio.disconnect() for c in everyone), return_exceptions=True)
+
+
+async def _host_audio_finished(host, question_index, stats, question_at):
+    sent = time.perf_counter()
+    await host.sio.emit('audio_finished', {'question_index': question_index})
+    # Questions without audio start their timer before the host says anything
+    arrived, data = await host.wait_for('timer_start', after=question_at)
+    stats.latency['audio_finished'].append(max(0.0, arrived - sent))
+    return arrived, data
+
+
+async def _answer(client, question_index, choices, think):
+    await asyncio.sleep(random.uniform(0, think))
+    await client.request('submit_answer', {
+        'question_index': question_index,
+        'answer_index': random.randrange(choices)
+    }, 'answer_submitted', lambda d: d.get('question_index') == question_index)
+    return time.perf_counter()
+
+
+def _record_skew(stats, event, arrivals):
+    times = [arrived for arrived, _ in arrivals]
+    stats.skew[event].append(max(times) - min(times))
+
+
+def start_in_process(questions, time_limit, mode):
+    """Start the asgi app on a free port with a scratch database; returns its url"""
+    backend = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, backend)
+    os.chdir(backend)
+    os.environ['SOCKETIO_ASYNC_MODE'] = 'asgi'
+
+    import config
+    scratch = tempfile.mkdtemp(prefix='trivia-load-')
+    with open(os.path.join(backend, config.Config.QUESTION_PACKS[mode])) as f:
+        pack = json.load(f)
+    if questions:
+        pack['questions'] = pack['questions'][:questions]
+    if time_limit:
+        pack['time_per_question'] = time_limit
+    pack_path = os.path.join(scratch, 'pack.json')
+    with open(pack_path, 'w') as f:
+        json.dump(pack, f)
+    config.Config.QUESTION_PACKS = {mode: pack_path}
+    config.Config.SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(scratch, 'load.db')}"
+
+    import uvicorn
+    from app import asgi_app
+
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(asgi_app, host='127.0.0.1', port=port, log_level='warning'))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f'http://127.0.0.1:{port}'
+
+
+async def run(args):
+    stats = Stats()
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        run_lobby(args.url, args.players, args.mode, args.think, stats, args.timeout)
+        for _ in range(args.lobbies)
+    ))
+    elapsed = time.perf_counter() - started
+    print(f"{args.lobbies} lobbies x {args.players} players in {elapsed:.1f}s\n")
+    print(stats.report())
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(stats.to_dict(), f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000', help='server to test')
+    parser.add_argument('--in-process', action='store_true', help='start the asgi server here instead')
+    parser.add_argument('--lobbies', type=int, default=10)
+    parser.add_argument('--players', type=int, default=10, help='players per lobby')
+    parser.add_argument('--mode', default='ffa', help='game mode to play')
+    parser.add_argument('--think', type=float, default=1.0, help='max seconds a player takes to answer')
+    parser.add_argument('--timeout', type=float, default=60.0, help='seconds to wait for any one event')
+    parser.add_argument('--questions', type=int, help='in-process only: questions per game')
+    parser.add_argument('--time-limit', type=float, help='in-process only: seconds per question')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    if args.in_process:
+        args.url = start_in_process(args.questions, args.time_limit, args.mode)
+    asyncio.run(run(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,8 @@
 import os
-import json
+from dotenv import load_dotenv
+
+# Load environment variables from .env file
+load_dotenv()
 
 # Get absolute path to the backend directory
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -13,6 +16,11 @@ db_path = os.path.join(data_dir, 'trivia.db')
 # Convert Windows backslashes to forward slashes for SQLite URI
 db_uri = db_path.replace('\\', '/')
 
+def _pairs(value, convert=str):
+    """Parse "a=1,b=2" from an environment variable into a dict"""
+    pairs = (item.split('=', 1) for item in value.split(',') if '=' in item)
+    return {key.strip(): convert(val.strip()) for key, val in pairs}
+
 class Config:
     """Application configuration"""
 
@@ -22,27 +30,103 @@ class Config:
     # Database config
     SQLALCHEMY_DATABASE_URI = f'sqlite:///{db_uri}'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Applied to every connection by services.storage
+    SQLITE_BUSY_TIMEOUT_MS = 5000
+    SQLITE_SYNCHRONOUS = 'NORMAL'  # safe with WAL; FULL also syncs every commit
 
     # CORS config
     CORS_ORIGINS = "*"
 
     # SocketIO config
-    SOCKETIO_ASYNC_MODE = 'threading'
+    # 'threading' runs Flask-SocketIO; 'asgi' runs python-socketio's AsyncServer under uvicorn
+    SOCKETIO_ASYNC_MODE = os.getenv('SOCKETIO_ASYNC_MODE', 'threading')
     SOCKETIO_CORS_ALLOWED_ORIGINS = "*"
 
-    # Game modes config
-    @staticmethod
-    def load_game_modes():
-        """Load game mode configurations"""
-        with open(os.path.join(basedir, 'questions_ffa.json'), 'r') as f:
-            questions_ffa = json.load(f)
+    # Seconds between write-behind flushes of in-memory lobby state
+    WRITE_BEHIND_INTERVAL = 0.5
+
+    # Worker threads that run due game deadlines
+    SCHEDULER_WORKERS = 4
+
+    # Threads used for database work in asgi mode
+    ASYNC_DB_WORKERS = 4
+
+    # Port this worker listens on
+    PORT = int(os.getenv('PORT', '5000'))
+
+    # Multi-worker mode: each lobby is owned by one of WORKER_COUNT processes
+    WORKER_COUNT = int(os.getenv('WORKER_COUNT', '1'))
+    WORKER_INDEX = int(os.getenv('WORKER_INDEX', '0'))
+    # Queue shared by workers: local://host:port, memory:// or redis://...
+    MESSAGE_QUEUE = os.getenv('MESSAGE_QUEUE', 'local://127.0.0.1:5599')
+
+    # Expiry sweeper: seconds between sweeps, rows per DELETE batch, and
+    # seconds of work per sweep before the rest waits for the next one
+    SWEEP_INTERVAL = 60
+    SWEEP_BATCH_SIZE = 500
+    SWEEP_TIME_BUDGET = 0.5
+    # Seconds before a disconnected player, or a socket session without a lobby, is swept
+    STALE_PLAYER_AGE = 2 * 60 * 60
+    ORPHAN_SOCKET_AGE = 60 * 60
+
+    # Finished games are appended to gzip files here (one per worker) and
+    # their answers dropped from the live tables; the lobby and its players
+    # follow after ARCHIVED_LOBBY_RETENTION seconds
+    ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(data_dir, 'archive'))
+    ARCHIVE_COMPRESS_LEVEL = 6
+    ARCHIVED_LOBBY_RETENTION = 60 * 60
+
+    # Skip lobby codes with misreadable letters or offensive words
+    LOBBY_CODE_FILTER = os.getenv('LOBBY_CODE_FILTER', 'false').lower() == 'true'
+
+    # Question packs by game mode, relative to the backend directory
+    QUESTION_PACKS = {
+        'ffa': 'questions_ffa.json',
+        'classic': 'questions.json'
+    }
+
+    # Seconds between checks for edited question pack files
+    QUESTION_RELOAD_INTERVAL = 2.0
+
+    # Logging: default level, per-category levels ("game=WARNING,http=DEBUG")
+    # and the fraction of high-volume events kept ("answer_submitted=0.1")
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_LEVELS = _pairs(os.getenv('LOG_LEVELS', ''), str.upper)
+    LOG_SAMPLING = {'answer_submitted': 0.1, **_pairs(os.getenv('LOG_SAMPLING', ''), float)}
+    LOG_STDOUT = os.getenv('LOG_STDOUT', 'true').lower() == 'true'
+    # Rotated log files; empty to only log to stdout
+    LOG_DIR = os.getenv('LOG_DIR', os.path.join(os.path.dirname(basedir), 'logs'))
+    LOG_MAX_BYTES = 10 * 1024 * 1024
+    LOG_BACKUP_COUNT = 5
+    # Records waiting for the writer thread before new ones are dropped
+    LOG_QUEUE_SIZE = 10000
+
+    # A question whose connected players have all answered is revealed
+    # early, but not before it has been up this many seconds
+    EARLY_CLOSE_MIN_DWELL = 3.0
+
+    # Offer the msgpack wire format to clients that ask for it at connect
+    # (needs the msgpack package)
+    COMPACT_WIRE = os.getenv('COMPACT_WIRE', 'true').lower() == 'true'
+
+    # Live answer updates sent to the host per second, at most
+    HOST_FEED_RATE = 4.0
+
+    # Rooms with more players than this reveal per-player answers to the
+    # host only; players get their own result and everyone gets counts
+    LARGE_AUDIENCE_PLAYERS = int(os.getenv('LARGE_AUDIENCE_PLAYERS', '50'))
 
-        return {
-            'ffa': questions_ffa
-        }
+    # Players listed in leaderboard updates and final results; larger rooms
+    # get this many plus each player's own rank
+    LEADERBOARD_TOP_N = 10
 
-# Load game modes
-GAME_MODES = Config.load_game_modes()
+    # Question audio durations, built by local_utility/build_audio_manifest.py
+    AUDIO_MANIFEST = 'audio_manifest.json'
+    # The answer timer starts this long after the narration would end, to
+    # cover the host browser fetching and starting the clip
+    AUDIO_LEAD_TIME = 1.0
+    # Timer delay for a clip missing from the manifest
+    AUDIO_FALLBACK_DELAY = 15.0
 
 # Print database URI for debugging
 print(f"Database URI: sqlite:///{db_uri}")
@@ -14,7 +14,7 @@ class Lobby(db.Model):
     current_question_index = db.Column(db.Integer, default=0)
     question_start_time = db.Column(db.DateTime, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    expires_at = db.Column(db.DateTime, default=lambda: datetime.utcnow() + timedelta(hours=24))
+    expires_at = db.Column(db.DateTime, default=lambda: datetime.utcnow() + timedelta(hours=24), index=True)
 
     # Relationships
     players = db.relationship('Player', backref='lobby', lazy=True, cascade='all, delete-orphan')
@@ -33,9 +33,13 @@ class Lobby(db.Model):
 
 class Player(db.Model):
     __tablename__ = 'players'
+    __table_args__ = (
+        # Stale disconnected players, for the expiry sweeper
+        db.Index('ix_players_connected_last_seen', 'is_connected', 'last_seen_at'),
+    )
 
     session_id = db.Column(db.String(100), primary_key=True)
-    lobby_code = db.Column(db.String(4), db.ForeignKey('lobbies.code'), nullable=False)
+    lobby_code = db.Column(db.String(4), db.ForeignKey('lobbies.code'), nullable=False, index=True)
     display_name = db.Column(db.String(100), nullable=False)
     score = db.Column(db.Integer, default=0)
     is_connected = db.Column(db.Boolean, default=True)
@@ -54,8 +58,8 @@ class SocketSession(db.Model):
     __tablename__ = 'socket_sessions'
 
     socket_id = db.Column(db.String(100), primary_key=True)
-    session_id = db.Column(db.String(100), nullable=False)
-    lobby_code = db.Column(db.String(4), db.ForeignKey('lobbies.code'), nullable=True)
+    session_id = db.Column(db.String(100), nullable=False, index=True)
+    lobby_code = db.Column(db.String(4), db.ForeignKey('lobbies.code'), nullable=True, index=True)
     role = db.Column(db.String(20), nullable=False)  # host or player
     connected_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -69,6 +73,11 @@ class SocketSession(db.Model):
 
 class PlayerAnswer(db.Model):
     __tablename__ = 'player_answers'
+    __table_args__ = (
+        db.Index('ix_player_answers_lobby_question', 'lobby_code', 'question_index'),
+        # One answer per player per question; a duplicate insert is a conflict
+        db.Index('uq_player_answers_player_question', 'player_session_id', 'lobby_code', 'question_index', unique=True),
+    )
 
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     player_session_id = db.Column(db.String(100), nullable=False)
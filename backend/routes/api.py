@@ -1,15 +1,24 @@
-from flask import Blueprint, request, send_from_directory, jsonify
+from flask import Blueprint, Response, request, jsonify
 import os
-from models import Lobby, Player
+from services.lobby_state import registry
+from services.cluster import cluster
+from services.resume import build_resume
+from services import metrics
+from services.static_assets import StaticAssets, NO_STORE
+from services.log import get_logger
+
+log = get_logger('http')
 
 def create_api_routes(app):
     """Create and register API routes"""
+    assets = StaticAssets(app.static_folder, overrides={'asset-manifest.json': NO_STORE})
+    log.info('assets_indexed', f"Indexed {assets.load()} static assets", assets=len(assets.assets))
 
     api = Blueprint('api', __name__)
 
     @api.route('/api/reconnect', methods=['POST'])
     def reconnect():
-        """HTTP endpoint for player/host reconnection"""
+        """HTTP endpoint for player/host reconnection; returns a resume snapshot"""
         data = request.json
         session_id = data.get('sessionId')
         lobby_code = data.get('lobbyCode')
@@ -17,34 +26,15 @@ def create_api_routes(app):
         if not session_id or not lobby_code:
             return jsonify({'success': False, 'message': 'Missing sessionId or lobbyCode'}), 400
 
-        # Check if lobby exists
-        lobby = Lobby.query.filter_by(code=lobby_code).first()
+        # Check if lobby exists; another worker's lobby is read from the database
+        lobby = registry.load(lobby_code, cache=cluster.is_owner(lobby_code))
         if not lobby:
             return jsonify({'success': False, 'message': 'Lobby not found'}), 404
 
-        # Check if user is the host
-        if lobby.host_session_id == session_id:
-            players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=lobby_code).all()]
-            return jsonify({
-                'success': True,
-                'role': 'host',
-                'lobbyCode': lobby_code,
-                'status': lobby.status,
-                'players': players_list
-            })
-
-        # Check if user is a player
-        player = Player.query.filter_by(session_id=session_id, lobby_code=lobby_code).first()
-        if player:
-            players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=lobby_code).all()]
-            return jsonify({
-                'success': True,
-                'role': 'player',
-                'lobbyCode': lobby_code,
-                'displayName': player.display_name,
-                'status': lobby.status,
-                'players': players_list
-            })
+        # Host or player: everything needed to redraw their screen in one payload
+        resume = build_resume(lobby, session_id)
+        if resume is not None:
+            return Response(resume.json, mimetype='application/json')
 
         return jsonify({'success': False, 'message': 'Session not found in this lobby'}), 404
 
@@ -54,57 +44,40 @@ def create_api_routes(app):
         theme = os.getenv('THEME', 'standard')
         return jsonify({'theme': theme})
 
-    # Enhanced asset-manifest.json route with cache control
+    @api.route('/metrics', methods=['GET'])
+    def get_metrics():
+        """Prometheus metrics for this worker"""
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+    # asset-manifest.json must never be cached, so clients always find the latest bundle
     @api.route('/asset-manifest.json')
     def serve_manifest():
-        response = send_from_directory(app.static_folder, 'asset-manifest.json')
-        # Add cache control headers to ensure latest version is always used
-        response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-        response.headers['Pragma'] = 'no-cache'
-        response.headers['Expires'] = '0'
-        return response
+        return assets.response('asset-manifest.json') or ('Not found', 404)
 
     # Development-only route for hot reloading
     @api.route('/<path:filename>.hot-update.json')
     def hot_update_json(filename):
         """Handles hot-update requests during development"""
-        print(f"Hot-update request received for: {filename}")
+        log.debug('hot_update', f"Hot-update request received for: {filename}")
         return jsonify({"message": "Hot-update not handled here"}), 200
 
-    # Static files route to handle CSS and JS files properly
+    # Content-hashed bundles under build/static
     @api.route('/static/<path:filepath>')
     def serve_static_files(filepath):
-        print(f"Attempting to serve static file from: {filepath}")
-        try:
-            response = send_from_directory(os.path.join(app.static_folder, 'static'), filepath)
-            # Set proper MIME types for different file types
-            if filepath.endswith('.css'):
-                response.headers['Content-Type'] = 'text/css'
-            elif filepath.endswith('.js'):
-                response.headers['Content-Type'] = 'application/javascript'
-            return response
-        except Exception as e:
-            print(f"Error serving static file: {e}")
-            return str(e), 404
+        return assets.response(f'static/{filepath}') or ('Not found', 404)
 
     # Main application route handler (catch-all for React routing)
     @api.route('/', defaults={'path': ''})
     @api.route('/<path:path>')
     def serve(path):
         """
-        Main route handler that serves the React application and other static files.
-        This acts as a catch-all route for any unmatched paths.
+        Serves files from the React build, and index.html for any other path
+        so client-side routes work on reload.
         """
-        try:
-            if path and os.path.exists(os.path.join(app.static_folder, path)):
-                print(f"Serving static file: {path}")
-                return send_from_directory(app.static_folder, path)
-            else:
-                print("Serving default file: index.html")
-                return send_from_directory(app.static_folder, 'index.html')
-        except Exception as e:
-            print(f"Error in serving file: {path}, Error: {e}")
-            return "An error occurred", 500
+        response = (path and assets.response(path)) or assets.response('index.html')
+        if response is None:
+            return 'Frontend build not found', 404
+        return response
 
     # Register blueprint
     app.register_blueprint(api)
@@ -0,0 +1,54 @@
+"""
+Run several server workers on one host.
+
+Worker i listens on PORT + i and owns the lobbies whose code hashes to i
+(see services/cluster.py). Put a proxy with sticky sessions in front so
+every request of one Socket.IO connection reaches the same worker; which
+worker that is does not matter, events are forwarded to the lobby owner.
+For example with nginx:
+
+    upstream trivia {
+        hash $remote_addr consistent;
+        server 127.0.0.1:5000;
+        server 127.0.0.1:5001;
+    }
+
+Usage: WORKER_COUNT=4 python run_workers.py
+"""
+import os
+import subprocess
+import sys
+from flask import Flask
+from models import db
+from config import Config
+from services.storage import init_storage
+
+def init_db():
+    """Create and upgrade the schema once, so workers don't race to do it"""
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    db.init_app(app)
+    init_storage(app, db)
+
+def main():
+    count = max(Config.WORKER_COUNT, 1)
+    init_db()
+    workers = []
+    for index in range(count):
+        env = dict(os.environ,
+                   WORKER_COUNT=str(count),
+                   WORKER_INDEX=str(index),
+                   PORT=str(Config.PORT + index))
+        workers.append(subprocess.Popen([sys.executable, 'app.py'], env=env,
+                                        cwd=os.path.dirname(os.path.abspath(__file__))))
+        print(f"Started worker {index} on port {Config.PORT + index}")
+
+    try:
+        for worker in workers:
+            worker.wait()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.terminate()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Answer ingestion pipeline.
+
+submit_answer hands each answer to a per-lobby queue and acks the player
+straight away. Duplicates are rejected in memory by (player, question), and
+the unique index on player_answers turns any that slip through (e.g. after a
+restart) into an insert conflict that is skipped. The write-behind flusher
+drains every queue on its tick, or as soon as a question closes, and writes
+all PlayerAnswer rows plus the matching Player.score increments in the same
+transaction as the rest of the batch.
+"""
+import threading
+from sqlalchemy import select, update, bindparam
+from sqlalchemy.dialects.sqlite import insert
+from models import db, Player, PlayerAnswer
+
+
+class LobbyAnswerQueue:
+    __slots__ = ('pending', 'seen')
+
+    def __init__(self):
+        self.pending = []
+        self.seen = set()
+
+
+class AnswerIngestion:
+    """Per-lobby answer queues with in-memory dedup and bulk writes"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queues = {}
+
+    def _queue(self, code):
+        queue = self._queues.get(code)
+        if queue is None:
+            queue = self._queues[code] = LobbyAnswerQueue()
+        return queue
+
+    def submit(self, code, answer):
+        """Queue an answer. Returns False if this player already answered this question."""
+        key = (answer.session_id, answer.question_index)
+        with self._lock:
+            queue = self._queue(code)
+            if key in queue.seen:
+                return False
+            queue.seen.add(key)
+            queue.pending.append(answer)
+        return True
+
+    def seed(self, code, answers):
+        """Mark answers already in the database as seen (lobby loaded after a restart)"""
+        with self._lock:
+            queue = self._queue(code)
+            queue.seen.update((a.session_id, a.question_index) for a in answers)
+
+    def discard_lobby(self, code):
+        with self._lock:
+            self._queues.pop(code, None)
+
+    def pending_count(self):
+        with self._lock:
+            return sum(len(q.pending) for q in self._queues.values())
+
+    def has_pending(self, code):
+        """True if a lobby has answers not yet written"""
+        with self._lock:
+            queue = self._queues.get(code)
+            return bool(queue and queue.pending)
+
+    def take(self):
+        """Detach every pending answer as a list of (code, answers)"""
+        batch = []
+        with self._lock:
+            for code, queue in self._queues.items():
+                if queue.pending:
+                    batch.append((code, queue.pending))
+                    queue.pending = []
+        return batch
+
+    def requeue(self, batch):
+        """Put a batch back at the front of its queues after a failed write"""
+        with self._lock:
+            for code, answers in batch:
+                queue = self._queues.get(code)
+                if queue is not None:
+                    queue.pending[:0] = answers
+
+    @staticmethod
+    def write(batch):
+        """
+        Insert answer rows and apply score increments in the current
+        transaction. Answers already in the table are skipped along with
+        their points. Returns the number of answers written.
+        """
+        answer_rows = []
+        for code, answers in batch:
+            for a in answers:
+                answer_rows.append({
+                    'player_session_id': a.session_id,
+                    'lobby_code': code,
+                    'question_index': a.question_index,
+                    'answer_index': a.answer_index,
+                    'answered_at': a.answered_at,
+                    'time_taken': a.time_taken,
+                    'points_earned': a.points
+                })
+
+        if not answer_rows:
+            return 0
+
+        answer_table = PlayerAnswer.__table__
+        stmt = (
+            insert(answer_table)
+            .on_conflict_do_nothing(index_elements=['player_session_id', 'lobby_code', 'question_index'])
+        )
+        if db.engine.dialect.insert_returning:
+            inserted = db.session.execute(stmt.returning(
+                answer_table.c.player_session_id, answer_table.c.lobby_code, answer_table.c.points_earned
+            ), answer_rows).all()
+        else:
+            # SQLite before 3.35 has no RETURNING; work out the new rows first
+            inserted = AnswerIngestion._new_rows(answer_rows)
+            db.session.execute(stmt, answer_rows)
+
+        increments = {}
+        for sid, code, points in inserted:
+            if points:
+                increments[(code, sid)] = increments.get((code, sid), 0) + points
+
+        if increments:
+            table = Player.__table__
+            stmt = (
+                update(table)
+                .where(table.c.session_id == bindparam('sid'))
+                .where(table.c.lobby_code == bindparam('code'))
+                .values(score=table.c.score + bindparam('points'))
+            )
+            db.session.execute(stmt, [
+                {'sid': sid, 'code': code, 'points': points}
+                for (code, sid), points in increments.items()
+            ])
+        return len(inserted)
+
+    @staticmethod
+    def _new_rows(answer_rows):
+        """
+        (session_id, code, points) of the rows an insert that skips
+        conflicts would add. Only the flusher writes answers, so nothing
+        changes between this read and the insert.
+        """
+        table = PlayerAnswer.__table__
+        existing = {tuple(row) for row in db.session.execute(
+            select(table.c.player_session_id, table.c.lobby_code, table.c.question_index)
+            .where(table.c.lobby_code.in_({r['lobby_code'] for r in answer_rows}))
+            .where(table.c.question_index.in_({r['question_index'] for r in answer_rows}))
+        )}
+        new = []
+        for r in answer_rows:
+            key = (r['player_session_id'], r['lobby_code'], r['question_index'])
+            if key not in existing:
+                existing.add(key)  # a duplicate later in the batch is skipped too
+                new.append((r['player_session_id'], r['lobby_code'], r['points_earned']))
+        return new
+
+
+answer_ingest = AnswerIngestion()
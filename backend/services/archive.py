@@ -0,0 +1,327 @@
+"""
+Finished game archive.
+
+end_game hands each finished lobby to the archiver. A background thread
+flushes the write-behind queue so every answer is in the database, reads the
+game back, and appends it to an append-only archive file: gzip members of
+JSON lines, one line per game, one member per archiving pass. Answers are
+packed as parallel arrays (player index, question index, answer, time,
+points) instead of one object per row. Once a game is on disk its
+player_answers rows are deleted and the lobby is left to expire after
+ARCHIVED_LOBBY_RETENTION instead of the full lobby lifetime, so the live
+tables only hold games in progress and recently finished ones.
+
+Appending is done once per game: a game whose answers could not be
+deleted after it was written is only deleted on the retry. At startup the
+archiver queues this worker's finished games that still have answers in
+the database (ended just before a restart), skipping the append for any the
+archive already holds.
+
+Each worker appends to its own file in Config.ARCHIVE_DIR. iter_games
+streams games back one line at a time from one file or the whole directory,
+and also reads files that zcat or gzip.open can.
+
+Record layout (version 1):
+    {"v": 1, "code", "game_mode", "created_at", "ended_at", "archived_at",
+     "question_ids": [pack question id per question index],
+     "players": {"session_id": [...], "name": [...], "score": [...]},
+     "answers": {"player": [...], "question": [...], "answer": [...],
+                 "time": [...], "points": [...]}}
+answers.player indexes the players arrays; players who left before the end
+are listed with a null name.
+"""
+import glob
+import gzip
+import json
+import os
+import threading
+import zlib
+from datetime import datetime, timedelta
+from sqlalchemy import text, bindparam, exists
+from config import Config
+from models import db, Lobby, Player, PlayerAnswer
+from services.lobby_state import registry
+from services.answer_ingest import answer_ingest
+from services.persistence import write_behind
+from services.cluster import cluster
+from services.question_bank import question_bank
+from services.metrics import track_function
+from services.log import get_logger
+
+log = get_logger('archive')
+
+FORMAT_VERSION = 1
+
+_DELETE_ANSWERS = text(
+    'DELETE FROM player_answers WHERE lobby_code IN :codes'
+).bindparams(bindparam('codes', expanding=True))
+
+_SHORTEN_EXPIRY = text(
+    'UPDATE lobbies SET expires_at = :expires_at WHERE code IN :codes AND expires_at > :expires_at'
+).bindparams(bindparam('codes', expanding=True))
+
+
+def archive_path(worker_index=None):
+    """This worker's archive file"""
+    index = Config.WORKER_INDEX if worker_index is None else worker_index
+    return os.path.join(Config.ARCHIVE_DIR, f'games-w{index}.jsonl.gz')
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+def build_record(code, ended_at, now=None):
+    """The archive record for a finished lobby, from the database. None if it is gone."""
+    lobby = db.session.get(Lobby, code)
+    if lobby is None:
+        return None
+
+    players = {'session_id': [], 'name': [], 'score': []}
+    index = {}
+    for player in Player.query.filter_by(lobby_code=code).order_by(Player.joined_at):
+        index[player.session_id] = len(index)
+        players['session_id'].append(player.session_id)
+        players['name'].append(player.display_name)
+        players['score'].append(player.score or 0)
+
+    answers = {'player': [], 'question': [], 'answer': [], 'time': [], 'points': []}
+    departed = set()
+    rows = db.session.query(
+        PlayerAnswer.player_session_id, PlayerAnswer.question_index, PlayerAnswer.answer_index,
+        PlayerAnswer.time_taken, PlayerAnswer.points_earned
+    ).filter_by(lobby_code=code).order_by(PlayerAnswer.question_index, PlayerAnswer.time_taken)
+    for session_id, question_index, answer_index, time_taken, points in rows:
+        player = index.get(session_id)
+        if player is None:
+            # Left the lobby before the end; keep their answers
+            player = index[session_id] = len(index)
+            departed.add(player)
+            players['session_id'].append(session_id)
+            players['name'].append(None)
+            players['score'].append(0)
+        if player in departed:
+            players['score'][player] += points or 0
+        answers['player'].append(player)
+        answers['question'].append(question_index)
+        answers['answer'].append(answer_index)
+        answers['time'].append(round(time_taken, 3))
+        answers['points'].append(points or 0)
+
+    live = registry.get(code)
+    if live is not None:
+        pack = live.question_pack()
+    else:
+        pack = question_bank.get(lobby.game_mode) if lobby.game_mode else None
+    asked = (lobby.current_question_index or 0) + 1
+    question_ids = [q.id for q in pack.questions[:asked]] if pack else []
+
+    return {
+        'v': FORMAT_VERSION,
+        'code': code,
+        'game_mode': lobby.game_mode,
+        'created_at': _iso(lobby.created_at),
+        'ended_at': _iso(ended_at),
+        'archived_at': _iso(now or datetime.utcnow()),
+        'question_ids': question_ids,
+        'players': players,
+        'answers': answers
+    }
+
+
+def append_records(path, records):
+    """Append records as one gzip member. Returns the bytes written."""
+    lines = ''.join(json.dumps(r, separators=(',', ':')) + '\n' for r in records)
+    member = gzip.compress(lines.encode('utf-8'), compresslevel=Config.ARCHIVE_COMPRESS_LEVEL)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # One write per member, so a crash leaves at most a truncated last member
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, member)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    return len(member)
+
+
+def _archive_files(path):
+    if path is None:
+        path = Config.ARCHIVE_DIR
+    if os.path.isdir(path):
+        return sorted(glob.glob(os.path.join(path, 'games-*.jsonl.gz')))
+    return [path]
+
+
+def iter_games(path=None, codes=None):
+    """
+    Yield archived games as dicts, one at a time, from one archive file or
+    every file in a directory (Config.ARCHIVE_DIR by default). codes limits
+    the result to those lobby codes. A truncated last member, from a crash
+    mid-write, ends that file early instead of raising.
+    """
+    wanted = set(codes) if codes is not None else None
+    for file_path in _archive_files(path):
+        try:
+            with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                for line in f:
+                    game = json.loads(line)
+                    if wanted is None or game['code'] in wanted:
+                        yield game
+        except (EOFError, gzip.BadGzipFile, zlib.error) as e:
+            log.warning('archive_truncated', f"Archive {file_path} ends early: {e}", path=file_path)
+
+
+def iter_answers(game):
+    """A game's answers as (session_id, question_index, answer_index, time_taken, points)"""
+    session_ids = game['players']['session_id']
+    answers = game['answers']
+    for player, question, answer, time_taken, points in zip(
+            answers['player'], answers['question'], answers['answer'], answers['time'], answers['points']):
+        yield session_ids[player], question, answer, time_taken, points
+
+
+class Archiver:
+    """Moves finished games from the live tables to the archive file"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._pending = {}   # code -> ended_at
+        self._written = set()  # codes appended to the archive whose answers are not yet deleted
+        self._app = None
+        self.archived = 0
+
+    def submit(self, code, ended_at=None):
+        """Queue a lobby whose game just ended"""
+        with self._lock:
+            self._pending[code] = ended_at or datetime.utcnow()
+        self._wake.set()
+
+    def pending_count(self):
+        with self._lock:
+            return len(self._pending)
+
+    def _take(self):
+        with self._lock:
+            codes, self._pending = self._pending, {}
+        return codes
+
+    def _requeue(self, codes):
+        with self._lock:
+            for code, ended_at in codes.items():
+                self._pending.setdefault(code, ended_at)
+
+    @track_function
+    def run_once(self):
+        """Archive every queued game. Returns the number archived."""
+        codes = self._take()
+        if not codes:
+            return 0
+
+        # Everything the game wrote has to be in the database first
+        write_behind.flush()
+        waiting = {code: codes.pop(code) for code in list(codes) if answer_ingest.has_pending(code)}
+        if waiting:
+            self._requeue(waiting)
+            if not codes:
+                return 0
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=Config.ARCHIVED_LOBBY_RETENTION)
+        records = []
+        with self._app.app_context():
+            try:
+                # Games already on disk from a pass whose delete failed are not appended again
+                records = [r for r in (build_record(code, codes[code], now)
+                                       for code in sorted(codes) if code not in self._written) if r]
+                if records:
+                    size = append_records(archive_path(), records)
+                    self._written.update(r['code'] for r in records)
+                done = [code for code in codes if code in self._written]
+                if done:
+                    db.session.execute(_DELETE_ANSWERS, {'codes': done})
+                    # Results stay up for a while, then the sweeper removes the rest
+                    db.session.execute(_SHORTEN_EXPIRY, {'codes': done, 'expires_at': expires_at})
+                    db.session.commit()
+                    self._written.difference_update(done)
+            except Exception as e:
+                db.session.rollback()
+                self._requeue(codes)
+                log.exception('archive_failed', f"Error archiving games: {e}")
+                return 0
+
+        # The flusher writes live lobbies' expiry from memory, so shorten it there too
+        for code in done:
+            lobby = registry.get(code)
+            if lobby is None:
+                continue
+            with lobby.lock:
+                if lobby.expires_at > expires_at:
+                    lobby.expires_at = expires_at
+            write_behind.mark_lobby(code)
+
+        if records:
+            self.archived += len(records)
+            answers = sum(len(r['answers']['player']) for r in records)
+            log.info('games_archived', f"Archived {len(records)} games ({answers} answers, {size} bytes)",
+                     games=len(records), answers=answers, bytes=size)
+        return len(records)
+
+    def recover(self):
+        """
+        Queue this worker's finished games that still have answers in the
+        database, i.e. ones that ended shortly before a restart. A game the
+        archive already holds (a crash between appending it and deleting its
+        answers) is only deleted, not appended again. Returns how many were
+        queued. Must be called inside an app context.
+        """
+        rows = [row for row in db.session.query(Lobby.code, Lobby.created_at, Lobby.question_start_time)
+                .filter(Lobby.status == 'results')
+                .filter(exists().where(PlayerAnswer.lobby_code == Lobby.code))
+                if cluster.is_owner(row.code)]
+        if not rows:
+            return 0
+
+        path = archive_path()
+        if os.path.exists(path):
+            # Codes are reused, so a game is identified by code and creation time
+            unarchived = {row.code: _iso(row.created_at) for row in rows}
+            for game in iter_games(path, codes=unarchived):
+                if game['created_at'] == unarchived[game['code']]:
+                    self._written.add(game['code'])
+
+        for row in rows:
+            # The last question's start is the closest record of when it ended
+            self.submit(row.code, row.question_start_time)
+        log.info('archive_recovered', f"Queued {len(rows)} finished games left from before a restart",
+                 games=len(rows))
+        return len(rows)
+
+    def _run(self):
+        with self._app.app_context():
+            try:
+                self.recover()
+            except Exception as e:
+                log.exception('archive_recover_failed', f"Error looking for unarchived games: {e}")
+        while True:
+            self._wake.wait()
+            self._wake.clear()
+            self.run_once()
+            if self.pending_count():
+                # Answers still queued or a failed pass; retry shortly
+                self._wake.wait(Config.WRITE_BEHIND_INTERVAL)
+                self._wake.set()
+
+    def init_app(self, app):
+        """Bind the app whose database run_once() reads from"""
+        self._app = app
+
+    def start(self, app):
+        """Start the background archiver thread"""
+        self.init_app(app)
+        thread = threading.Thread(target=self._run, daemon=True)
+        thread.start()
+        log.info('archiver_started', "Game archiver started")
+
+
+archiver = Archiver()
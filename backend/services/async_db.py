@@ -0,0 +1,30 @@
+"""
+Database access for the asyncio server.
+
+SQLite and Flask-SQLAlchemy are synchronous, so coroutines hand database
+work to a small dedicated thread pool (with an app context pushed) instead
+of blocking the event loop.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+
+
+class AsyncDB:
+    """Runs database-touching callables off the event loop"""
+
+    def __init__(self, app, workers=None):
+        self._app = app
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers or Config.ASYNC_DB_WORKERS,
+            thread_name_prefix='async-db'
+        )
+
+    def _call(self, fn, args):
+        with self._app.app_context():
+            return fn(*args)
+
+    async def run(self, fn, *args):
+        """Await fn(*args) run on a database thread"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._call, fn, args)
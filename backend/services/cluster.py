@@ -0,0 +1,337 @@
+"""
+Multi-worker mode.
+
+Each lobby is owned by exactly one worker process, picked by hashing its
+code, and only the owner keeps the lobby in its registry, runs its handlers
+and schedules its timers. A socket may be connected to any worker: events for
+a lobby owned elsewhere are forwarded to the owner over the message queue,
+and the owner's emits reach the socket through the Socket.IO client manager,
+which shares rooms across workers on the same queue.
+
+The queue backend is picked by Config.MESSAGE_QUEUE:
+    local://host:port   workers talk over a local TCP hub (first worker to
+                        bind the port runs it, taken over by another worker
+                        if it exits); the default
+    memory://           in-process only, for tests and single-process runs
+    redis://...         Redis pub/sub (needs the redis package)
+
+With WORKER_COUNT=1 (the default) none of this is active and every call here
+is a cheap no-op.
+"""
+import asyncio
+import json
+import queue
+import random
+import socket
+import threading
+import time
+import zlib
+from collections import defaultdict, deque
+from urllib.parse import urlparse
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from config import Config
+from services.log import get_logger
+
+log = get_logger('cluster')
+
+
+class MemoryBus:
+    """In-process pub/sub; every subscriber of a channel gets every message"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(list)
+
+    def start(self):
+        pass
+
+    def publish(self, channel, message):
+        with self._lock:
+            queues = list(self._subscribers[channel])
+        for q in queues:
+            q.put(message)
+
+    def subscribe(self, channel):
+        """Return a blocking iterator over messages published from now on"""
+        q = queue.Queue()
+        with self._lock:
+            self._subscribers[channel].append(q)
+        return self._drain(q)
+
+    @staticmethod
+    def _drain(q):
+        while True:
+            yield q.get()
+
+
+class LocalBus(MemoryBus):
+    """
+    Pub/sub between processes on one host over a TCP socket. The first
+    worker to bind the address runs a hub that relays every frame to all
+    connected workers, including the sender.
+
+    If the hub goes away (its worker exited), every other worker reconnects
+    with backoff, and the first to find the address free runs the new hub.
+    Frames published while disconnected are kept, up to
+    RECONNECT_BACKLOG, and sent once connected again; frames other workers
+    published in that window are lost.
+    """
+
+    RECONNECT_MIN_DELAY = 0.05
+    RECONNECT_MAX_DELAY = 2.0
+    RECONNECT_BACKLOG = 10000
+
+    def __init__(self, host, port):
+        super().__init__()
+        self.address = (host, port)
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._backlog = deque(maxlen=self.RECONNECT_BACKLOG)
+
+    def start(self):
+        self._connect()
+        threading.Thread(target=self._read, daemon=True).start()
+
+    def _connect(self):
+        """Connect to the hub, running it in this worker if none is listening"""
+        try:
+            listener = socket.create_server(self.address)
+        except OSError:
+            pass  # another worker runs the hub
+        else:
+            threading.Thread(target=self._serve_hub, args=(listener,), daemon=True).start()
+            log.info('hub_listening', f"Message queue hub listening on {self.address[0]}:{self.address[1]}")
+
+        sock = socket.create_connection(self.address)
+        with self._send_lock:
+            try:
+                while self._backlog:
+                    sock.sendall(self._backlog[0])
+                    self._backlog.popleft()
+            except OSError:
+                sock.close()
+                raise
+            self._sock = sock
+
+    def publish(self, channel, message):
+        frame = (json.dumps({'channel': channel, 'message': message}) + '\n').encode()
+        with self._send_lock:
+            if self._sock is not None:
+                try:
+                    self._sock.sendall(frame)
+                    return
+                except OSError:
+                    self._sock = None  # the reader reconnects
+            self._backlog.append(frame)
+
+    def _read(self):
+        while True:
+            sock = self._sock
+            try:
+                for line in sock.makefile('rb'):
+                    frame = json.loads(line)
+                    MemoryBus.publish(self, frame['channel'], frame['message'])
+            except OSError:
+                pass
+            log.warning('hub_disconnected', "Message queue connection closed, reconnecting")
+            with self._send_lock:
+                if self._sock is sock:
+                    self._sock = None
+            sock.close()
+            self._reconnect()
+
+    def _reconnect(self):
+        delay = self.RECONNECT_MIN_DELAY
+        while True:
+            # Jitter so workers don't all race for the hub address at once
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            try:
+                self._connect()
+            except OSError:
+                delay = min(delay * 2, self.RECONNECT_MAX_DELAY)
+                continue
+            log.info('hub_reconnected', "Message queue connection restored")
+            return
+
+    def _serve_hub(self, listener):
+        peers = []
+        peers_lock = threading.Lock()
+
+        def relay(conn):
+            for line in conn.makefile('rb'):
+                with peers_lock:
+                    targets = list(peers)
+                for peer in targets:
+                    try:
+                        peer.sendall(line)
+                    except OSError:
+                        with peers_lock:
+                            if peer in peers:
+                                peers.remove(peer)
+            with peers_lock:
+                if conn in peers:
+                    peers.remove(conn)
+
+        while True:
+            conn, _ = listener.accept()
+            with peers_lock:
+                peers.append(conn)
+            threading.Thread(target=relay, args=(conn,), daemon=True).start()
+
+
+class RedisBus:
+    """Pub/sub over Redis, for workers on more than one host"""
+
+    def __init__(self, url):
+        import redis  # only needed for redis:// queues
+        self._redis = redis.Redis.from_url(url)
+
+    def start(self):
+        pass
+
+    def publish(self, channel, message):
+        self._redis.publish(channel, json.dumps(message))
+
+    def subscribe(self, channel):
+        pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(channel)
+        return (json.loads(m['data']) for m in pubsub.listen())
+
+
+def create_bus(url):
+    """Create the bus backend named by a MESSAGE_QUEUE url"""
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        return MemoryBus()
+    if parsed.scheme == 'local':
+        return LocalBus(parsed.hostname or '127.0.0.1', parsed.port or 5599)
+    if parsed.scheme in ('redis', 'rediss'):
+        return RedisBus(url)
+    raise ValueError(f"Unsupported message queue: {url}")
+
+
+class BusManager(socketio.PubSubManager):
+    """Socket.IO client manager sharing rooms and emits over a bus"""
+
+    name = 'bus'
+
+    def __init__(self, bus, channel='socketio'):
+        super().__init__(channel=channel)
+        self.bus = bus
+
+    def _publish(self, data):
+        self.bus.publish(self.channel, data)
+
+    def _listen(self):
+        return self.bus.subscribe(self.channel)
+
+
+class AsyncBusManager(AsyncPubSubManager):
+    """BusManager for the asyncio server"""
+
+    name = 'bus'
+
+    def __init__(self, bus, channel='socketio'):
+        super().__init__(channel=channel)
+        self.bus = bus
+
+    async def _publish(self, data):
+        self.bus.publish(self.channel, data)
+
+    async def _listen(self):
+        # The bus iterator blocks, so pump it from a thread into the loop
+        loop = asyncio.get_running_loop()
+        messages = asyncio.Queue()
+
+        def pump():
+            for message in self.bus.subscribe(self.channel):
+                loop.call_soon_threadsafe(messages.put_nowait, message)
+
+        threading.Thread(target=pump, daemon=True).start()
+        while True:
+            yield await messages.get()
+
+
+class Cluster:
+    """Lobby ownership and event forwarding between workers"""
+
+    def __init__(self, index=Config.WORKER_INDEX, count=Config.WORKER_COUNT,
+                 url=Config.MESSAGE_QUEUE):
+        self.index = index
+        self.count = count
+        self.url = url
+        self.bus = None
+        self._handlers = {}   # event -> fn(sid, data), run when forwarded here
+        self._routes = {}     # sid -> lobby code, for sockets connected here
+
+    @property
+    def enabled(self):
+        return self.count > 1
+
+    def owner_of(self, code):
+        """Index of the worker that owns a lobby code"""
+        return zlib.crc32(code.encode()) % self.count
+
+    def is_owner(self, code):
+        return not self.enabled or self.owner_of(code) == self.index
+
+    def connect(self):
+        """Open the message queue; call before creating the Socket.IO server"""
+        if self.enabled:
+            self.bus = create_bus(self.url)
+            self.bus.start()
+
+    def client_manager(self, asyncio=False):
+        """Socket.IO client manager for this worker, or None for the default"""
+        if not self.enabled:
+            return None
+        return AsyncBusManager(self.bus) if asyncio else BusManager(self.bus)
+
+    def add_handler(self, event, fn):
+        """Register fn(sid, data) to run events forwarded to this worker"""
+        self._handlers[event] = fn
+
+    def route(self, event, sid, data=None, code=None):
+        """
+        Forward an event to the worker that owns its lobby. The lobby is
+        taken from `code`, or from the last lobby this socket addressed.
+        Returns True if forwarded, False if it should be handled here.
+        """
+        if not self.enabled:
+            return False
+        if code is None:
+            code = self._routes.get(sid)
+        else:
+            self._routes[sid] = code
+        if code is None or self.is_owner(code):
+            return False
+        self.bus.publish(f'worker-{self.owner_of(code)}', {'event': event, 'sid': sid, 'data': data})
+        return True
+
+    def forget(self, sid):
+        self._routes.pop(sid, None)
+
+    def start(self, app):
+        """Start running events forwarded to this worker"""
+        if not self.enabled:
+            return
+        thread = threading.Thread(target=self._run, args=(app,), daemon=True)
+        thread.start()
+        log.info('worker_started', f"Worker {self.index} of {self.count} started", worker=self.index)
+
+    def _run(self, app):
+        # One thread keeps forwarded events in the order each worker sent them
+        for message in self.bus.subscribe(f'worker-{self.index}'):
+            handler = self._handlers.get(message['event'])
+            if handler is None:
+                continue
+            try:
+                with app.app_context():
+                    handler(message['sid'], message['data'])
+            except Exception as e:
+                log.exception('forward_failed', f"Error handling forwarded {message['event']}: {e}",
+                              sid=message['sid'], forwarded=message['event'])
+
+
+cluster = Cluster()
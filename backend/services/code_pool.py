@@ -0,0 +1,124 @@
+"""
+Lobby code allocator.
+
+Every 4-letter code this worker owns sits in a shuffled in-memory free pool,
+stored as integer indexes. Reserving pops one in O(1) under a lock, so two
+concurrent create_lobby calls can never get the same code and creation cost
+doesn't grow with the number of lobbies. Codes go back to the pool when a
+lobby is disbanded, or after its expiry once the sweeper has deleted its
+rows.
+"""
+import random
+import re
+import string
+import threading
+from array import array
+from datetime import datetime
+from config import Config
+from services.cluster import cluster
+from services.lobby_state import LOBBY_LIFETIME
+
+LETTERS = string.ascii_uppercase
+CODE_SPACE = len(LETTERS) ** 4
+
+# Skipped in filtered mode: letters easily misread, and codes containing
+# any of these words
+AMBIGUOUS_LETTERS = 'IO'
+BLOCKED_WORDS = (
+    'ANAL', 'ANUS', 'ARSE', 'ASS', 'BUTT', 'COCK', 'CUM', 'CUNT', 'DICK', 'FAG',
+    'FUC', 'FUK', 'JIZZ', 'KKK', 'NAZI', 'NIG', 'PISS', 'PORN', 'RAPE', 'SEX',
+    'SHIT', 'SLUT', 'TIT', 'TWAT', 'WANK', 'WTF'
+)
+_SKIPPED = re.compile('|'.join(list(AMBIGUOUS_LETTERS) + list(BLOCKED_WORDS)))
+
+
+def code_of(index):
+    return (LETTERS[index // 17576] + LETTERS[index // 676 % 26]
+            + LETTERS[index // 26 % 26] + LETTERS[index % 26])
+
+
+def index_of(code):
+    index = 0
+    for letter in code:
+        index = index * 26 + LETTERS.index(letter)
+    return index
+
+
+def is_allowed(code):
+    """False for codes the filtered mode skips"""
+    return _SKIPPED.search(code) is None
+
+
+class CodePool:
+    """Shuffled pool of free lobby codes owned by this worker"""
+
+    def __init__(self, filtered=False):
+        self.filtered = filtered
+        self._lock = threading.Lock()
+        self._free = array('l')
+        self._in_use = {}   # code -> expires_at
+        self.capacity = 0
+
+    def load(self, lobbies=()):
+        """
+        Build the pool, leaving out codes of existing (code, expires_at)
+        lobbies. Call once at startup.
+        """
+        in_use = {code: expires_at for code, expires_at in lobbies if cluster.is_owner(code)}
+        free = array('l')
+        for i in range(CODE_SPACE):
+            code = code_of(i)
+            if cluster.is_owner(code) and (not self.filtered or is_allowed(code)):
+                free.append(i)
+        capacity = len(free)
+        taken = {index_of(code) for code in in_use}
+        if taken:
+            free = array('l', (i for i in free if i not in taken))
+        random.shuffle(free)
+
+        with self._lock:
+            self._free = free
+            self._in_use = in_use
+            self.capacity = capacity
+
+    def reserve(self):
+        """Take a free code, or return None if every code is in use"""
+        with self._lock:
+            if not self._free:
+                return None
+            code = code_of(self._free.pop())
+            self._in_use[code] = datetime.utcnow() + LOBBY_LIFETIME
+            return code
+
+    def release(self, code):
+        """Return a code to the pool at a random position"""
+        with self._lock:
+            if self._in_use.pop(code, False) is False:
+                return
+            if self.filtered and not is_allowed(code):
+                return  # predates filtering
+            self._free.append(index_of(code))
+            last = len(self._free) - 1
+            i = random.randint(0, last)
+            self._free[i], self._free[last] = self._free[last], self._free[i]
+
+    def expired(self, now=None):
+        """Codes in use whose lobby has expired"""
+        now = now or datetime.utcnow()
+        with self._lock:
+            return [code for code, expires_at in self._in_use.items()
+                    if expires_at and expires_at < now]
+
+    def stats(self):
+        with self._lock:
+            in_use = len(self._in_use)
+            free = len(self._free)
+        return {
+            'capacity': self.capacity,
+            'in_use': in_use,
+            'free': free,
+            'occupancy': in_use / self.capacity if self.capacity else 0.0
+        }
+
+
+code_pool = CodePool(filtered=Config.LOBBY_CODE_FILTER)
@@ -1,7 +1,11 @@
-import threading
-from datetime import datetime
-from models import db, Lobby, Player, PlayerAnswer
-from config import GAME_MODES
+import time
+from config import Config
+from services.lobby_state import registry
+from services.persistence import write_behind
+from services.archive import archiver
+from services.scheduler import scheduler
+from services.reveal import build_reveal
+from services.metrics import track_function
 
 def calculate_points(time_taken, time_limit, is_correct):
     """Calculate points based on answer speed and correctness"""
@@ -14,123 +18,273 @@ def calculate_points(time_taken, time_limit, is_correct):
 
     return base_points + time_bonus
 
-def start_question(app, socketio, code):
+@track_function
+def start_question(app, transport, code):
     """Start a question for the lobby"""
-    with app.app_context():
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby or lobby.status != 'playing':
-            return
+    lobby = registry.get(code)
+    if not lobby or lobby.status != 'playing':
+        return
 
-        mode_config = GAME_MODES[lobby.game_mode]
-        questions = mode_config['questions']
+    with lobby.lock:
+        pack = lobby.question_pack()
         question_index = lobby.current_question_index
 
-        if question_index >= len(questions):
-            # Game over
-            end_game(app, socketio, code)
+        if question_index >= len(pack.questions):
+            game_over = True
+        else:
+            game_over = False
+            lobby.begin_question()
+
+    if game_over:
+        end_game(app, transport, code)
+        return
+
+    write_behind.mark_lobby(code)
+
+    # Send question to all clients (payload is encoded once per pack, not per lobby)
+    transport.emit('question_started', pack.question_started(question_index), room=code)
+
+    # Start the answer timer when the narration ends; the host's
+    # audio_finished can only start it sooner
+    delay = pack.timer_delay(question_index)
+    if delay <= 0:
+        start_timer(app, transport, code, question_index)
+    else:
+        scheduler.schedule((code, 'start_timer', question_index), delay,
+                           start_timer, app, transport, code, question_index)
+
+@track_function
+def start_timer(app, transport, code, question_index):
+    """Start the answer timer for a question, once"""
+    lobby = registry.get(code)
+    if not lobby:
+        return
+
+    with lobby.lock:
+        # Verify this is the current question and it is still open
+        if lobby.current_question_index != question_index or lobby.status != 'playing':
             return
+        time_limit = lobby.question_pack().time_per_question
+
+    scheduler.cancel((code, 'start_timer', question_index))
+
+    # Auto-end question after the answer time; a second start is ignored
+    if not scheduler.schedule((code, 'end_question', question_index), time_limit,
+                              end_question, app, transport, code, question_index):
+        return
+    with lobby.lock:
+        if lobby.current_question_index == question_index:
+            lobby.timer_deadline = time.monotonic() + time_limit
+
+    # Send timer_start to everyone
+    transport.emit('timer_start', {
+        'time_limit': time_limit
+    }, room=code)
 
-        question_data = questions[question_index]
-        lobby.question_start_time = datetime.utcnow()
-        db.session.commit()
+def answer_progress(app, transport, code):
+    """
+    Queue a live answer update for the host, and end the question early
+    once every connected player has answered. Called after each answer
+    and disconnect.
+    """
+    lobby = registry.get(code)
+    if not lobby:
+        return
 
-        # Send question to all clients
-        socketio.emit('question_started', {
+    with lobby.lock:
+        if lobby.status != 'playing' or lobby.question_started_at is None:
+            return
+        question_index = lobby.current_question_index
+        done = lobby.all_answered()
+        wait = Config.EARLY_CLOSE_MIN_DWELL - lobby.elapsed()
+        if lobby.timer_deadline is not None:
+            wait = min(wait, lobby.timer_deadline - time.monotonic())
+
+    # Answers arriving before the pending update goes out are folded into
+    # it, so the host gets at most HOST_FEED_RATE updates a second
+    scheduler.schedule((code, 'host_feed'), 1.0 / Config.HOST_FEED_RATE,
+                       send_host_feed, transport, code)
+
+    if not done:
+        return
+
+    # Nobody left to wait for: replace the pending deadline with an
+    # immediate reveal, or one at the end of the minimum dwell time
+    scheduler.cancel((code, 'start_timer', question_index))
+    scheduler.cancel((code, 'end_question', question_index))
+    if wait > 0:
+        scheduler.schedule((code, 'end_question', question_index), wait,
+                           end_question, app, transport, code, question_index)
+    else:
+        end_question(app, transport, code, question_index)
+
+def send_host_feed(transport, code):
+    """Send the host the open question's answered/connected count and answers per choice"""
+    lobby = registry.get(code)
+    if not lobby:
+        return
+
+    with lobby.lock:
+        # The reveal carries the full breakdown
+        if lobby.status != 'playing':
+            return
+        question_index = lobby.current_question_index
+        choices = len(lobby.question_pack().questions[question_index].answers)
+        counts = [lobby.answer_counts.get(i, 0) for i in range(choices)]
+        answered, connected = lobby.answered, lobby.connected
+
+    host_sid = registry.host_socket(code)
+    if host_sid:
+        transport.emit('answer_progress', {
             'question_index': question_index,
-            'question': question_data['question'],
-            'answers': question_data['answers'],
-            'time_limit': mode_config['time_per_question'],
-            'total_questions': len(questions),
-            'audio': question_data.get('audio')  # Include audio path if available
-        }, room=code)
-
-def end_question(app, socketio, code):
+            'answered': answered,
+            'connected': connected,
+            'counts': counts
+        }, to=host_sid)
+
+@track_function
+def end_question(app, transport, code, question_index=None):
     """End the current question and show results"""
-    with app.app_context():
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby or lobby.status != 'playing':
+    lobby = registry.get(code)
+    if not lobby or lobby.status != 'playing':
+        return
+
+    with lobby.lock:
+        if lobby.status != 'playing':
+            return
+        # A deadline for an earlier question must not end this one
+        if question_index is not None and question_index != lobby.current_question_index:
             return
 
         question_index = lobby.current_question_index
-        mode_config = GAME_MODES[lobby.game_mode]
-        question_data = mode_config['questions'][question_index]
-        correct_answer = question_data['correct']
-
-        # Get all answers for this question
-        answers = PlayerAnswer.query.filter_by(
-            lobby_code=code,
-            question_index=question_index
-        ).order_by(PlayerAnswer.answered_at).all()
-
-        # Build answer stats with player names and initials
-        answer_stats = [{'players': []} for _ in range(len(question_data['answers']))]
-
-        for answer in answers:
-            player = Player.query.filter_by(session_id=answer.player_session_id).first()
-            if player:
-                initial = player.display_name[0].upper()
-                answer_stats[answer.answer_index]['players'].append({
-                    'name': player.display_name,
-                    'initial': initial,
-                    'points': answer.points_earned,
-                    'session_id': player.session_id
-                })
+        pack = lobby.question_pack()
+        question = pack.questions[question_index]
+
+        # Build answer stats with player names and initials, and updated scores
+        answer_stats, scored = build_reveal(lobby, question)
+        roster_patch = lobby.roster_patch(changed=scored)
+        ranks = lobby.rank_changes()
+        leaderboard = leaderboard_update(lobby, question_index, ranks)
+        answers = lobby.answers
+        large = lobby.large_audience()
+        if large:
+            answer_counts = [lobby.answer_counts.get(i, 0) for i in range(len(question.answers))]
 
         # Change status to reveal
         lobby.status = 'reveal'
-        db.session.commit()
 
-        # Send updated scores to all players
-        players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=code).all()]
-        socketio.emit('players_updated', {'players': players_list}, room=code)
+    # Persist this question's answers now rather than on the next tick
+    write_behind.mark_lobby(code)
+    write_behind.wake()
 
-        # Send reveal data
-        socketio.emit('question_ended', {
-            'question_index': question_index,
-            'correct_answer': correct_answer,
-            'answer_stats': answer_stats
-        }, room=code)
+    # Reveal data; what the room sees is kept for clients that reconnect during the reveal
+    reveal = pack.question_ended(question_index, answer_stats)
+    if large:
+        summary = pack.question_summary(question_index, answer_counts, leaderboard['total'])
+    else:
+        summary = reveal
+    with lobby.lock:
+        if lobby.current_question_index == question_index:
+            lobby.reveal = summary
+
+    if large:
+        # Only the host gets per-player scores and answers; the room gets
+        # payloads that don't grow with the audience
+        host_sid = registry.host_socket(code)
+        if host_sid:
+            transport.emit('players_patch', roster_patch, to=host_sid)
+            transport.emit('question_ended', reveal, to=host_sid)
+        transport.emit('players_patch', {'seq': roster_patch['seq']}, room=code, skip_sid=host_sid)
+        transport.emit('question_ended', summary, room=code, skip_sid=host_sid)
+    else:
+        # Send updated scores and the full reveal to everyone
+        transport.emit('players_patch', roster_patch, room=code)
+        transport.emit('question_ended', reveal, room=code)
+
+    # Standings after this question; in a large room the top N doesn't
+    # include most players, so each gets their own rank and result
+    transport.emit('leaderboard', leaderboard, room=code)
+    if large or leaderboard['total'] > Config.LEADERBOARD_TOP_N:
+        emit_own_ranks(transport, code, ranks, answers, question_index=question_index)
+
+    # After 5 seconds, move to next question
+    scheduler.schedule((code, 'next_question'), 5.0, next_question, app, transport, code)
 
-        # After 5 seconds, move to next question
-        threading.Timer(5.0, lambda: next_question(app, socketio, code)).start()
+def leaderboard_update(lobby, question_index, ranks):
+    """leaderboard payload: the top N with rank and places gained. Call with the lock held."""
+    top = lobby.standings(Config.LEADERBOARD_TOP_N)
+    for entry in top:
+        entry['delta'] = ranks[entry['session_id']][1]
+    return {'question_index': question_index, 'total': len(lobby.players), 'top': top}
 
-def next_question(app, socketio, code):
+def emit_own_ranks(transport, code, ranks, answers=None, **extra):
+    """
+    Send my_rank to every connected player socket with that player's rank,
+    and after a reveal their own answer and points
+    """
+    lobby = registry.get(code)
+    if not lobby:
+        return
+    total = len(ranks)
+    for socket_state in registry.lobby_sockets(code):
+        session_id = socket_state.session_id
+        entry = ranks.get(session_id)
+        if entry is None:
+            continue
+        player = lobby.players.get(session_id)
+        payload = dict(extra, rank=entry[0], delta=entry[1], total=total,
+                       score=player.score if player else 0)
+        if answers is not None:
+            answer = answers.get(session_id)
+            payload['answer_index'] = answer.answer_index if answer else None
+            payload['points'] = answer.points if answer else 0
+        transport.emit('my_rank', payload, to=socket_state.socket_id)
+
+@track_function
+def next_question(app, transport, code):
     """Move to the next question"""
-    with app.app_context():
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return
+    lobby = registry.get(code)
+    if not lobby:
+        return
 
+    with lobby.lock:
+        if lobby.status != 'reveal':
+            return
         lobby.current_question_index += 1
         lobby.status = 'playing'
-        db.session.commit()
+    write_behind.mark_lobby(code)
 
-        start_question(app, socketio, code)
+    start_question(app, transport, code)
 
-def end_game(app, socketio, code):
+@track_function
+def end_game(app, transport, code):
     """End the game and show final results"""
-    with app.app_context():
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return
+    lobby = registry.get(code)
+    if not lobby:
+        return
 
+    with lobby.lock:
         lobby.status = 'results'
-        db.session.commit()
-
-        # Get final scores
-        players = Player.query.filter_by(lobby_code=code).order_by(Player.score.desc()).all()
-        final_scores = [
-            {
-                'name': p.display_name,
-                'score': p.score,
-                'session_id': p.session_id
-            }
-            for p in players
-        ]
-
-        winner = final_scores[0] if final_scores else None
-
-        socketio.emit('game_ended', {
-            'final_scores': final_scores,
-            'winner': winner
-        }, room=code)
+
+        # Final standings straight from the leaderboard
+        final_scores = lobby.final_scores()
+        if len(final_scores) < len(lobby.players):
+            ranks = lobby.rank_changes()
+        else:
+            ranks = None
+
+    write_behind.mark_lobby(code)
+    write_behind.wake()
+    # Moves the game's answers out of the live tables once they are written
+    archiver.submit(code)
+
+    winner = final_scores[0] if final_scores else None
+
+    transport.emit('game_ended', {
+        'final_scores': final_scores,
+        'winner': winner
+    }, room=code)
+
+    # Players outside the top N learn where they finished
+    if ranks is not None:
+        emit_own_ranks(transport, code, ranks, final=True)
@@ -0,0 +1,100 @@
+"""
+Per-lobby ranked leaderboard.
+
+Scores are small non-negative integers, so players are counted per score in
+a Fenwick tree: moving a player to a new score and looking up a rank are
+both O(log S), S being the highest score, whatever the number of players.
+Players with the same score share a rank (1, 2, 2, 4). Each score also
+keeps its players in the order they reached it, so listing the top N walks
+scores from the highest down and stops after N players.
+"""
+
+
+class Leaderboard:
+    """Scores of one lobby's players, ranked highest first"""
+
+    __slots__ = ('_scores', '_buckets', '_tree')
+
+    def __init__(self):
+        self._scores = {}    # session_id -> score
+        self._buckets = {}   # score -> {session_id: None}, in arrival order
+        self._tree = [0] * 65   # 1-based Fenwick tree over score + 1
+
+    def __len__(self):
+        return len(self._scores)
+
+    def __contains__(self, session_id):
+        return session_id in self._scores
+
+    def _add(self, score, delta):
+        i = score + 1
+        if i >= len(self._tree):
+            self._grow(i)
+        while i < len(self._tree):
+            self._tree[i] += delta
+            i += i & -i
+
+    def _grow(self, needed):
+        size = len(self._tree) - 1
+        while size < needed:
+            size *= 2
+        self._tree = [0] * (size + 1)
+        for score, bucket in self._buckets.items():
+            i = score + 1
+            while i <= size:
+                self._tree[i] += len(bucket)
+                i += i & -i
+
+    def _at_most(self, score):
+        """Players with a score of at most `score`"""
+        i = min(score + 1, len(self._tree) - 1)
+        total = 0
+        while i > 0:
+            total += self._tree[i]
+            i -= i & -i
+        return total
+
+    def set(self, session_id, score):
+        """Add a player, or move them to a new score"""
+        old = self._scores.get(session_id)
+        if old == score:
+            return
+        if old is not None:
+            self._unbucket(session_id, old)
+        # Count before bucketing: growing the tree rebuilds it from the buckets
+        self._add(score, 1)
+        self._scores[session_id] = score
+        self._buckets.setdefault(score, {})[session_id] = None
+
+    def remove(self, session_id):
+        old = self._scores.pop(session_id, None)
+        if old is not None:
+            self._unbucket(session_id, old)
+
+    def _unbucket(self, session_id, score):
+        bucket = self._buckets[score]
+        del bucket[session_id]
+        if not bucket:
+            del self._buckets[score]
+        self._add(score, -1)
+
+    def score(self, session_id):
+        return self._scores.get(session_id)
+
+    def rank(self, session_id):
+        """1 + the number of players with a higher score, or None"""
+        score = self._scores.get(session_id)
+        if score is None:
+            return None
+        return 1 + len(self._scores) - self._at_most(score)
+
+    def top(self, n=None):
+        """[(session_id, score, rank)] for the first n players, highest first"""
+        result = []
+        for score in sorted(self._buckets, reverse=True):
+            rank = len(result) + 1
+            for session_id in self._buckets[score]:
+                if n is not None and len(result) >= n:
+                    return result
+                result.append((session_id, score, rank))
+        return result
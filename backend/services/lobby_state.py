@@ -0,0 +1,418 @@
+"""
+In-memory lobby state.
+
+The registry is the source of truth for lobbies while they are live. Socket
+handlers and game_service read and mutate these objects directly, and the
+write-behind flusher in services.persistence copies changes back to the
+database tables in batches.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from config import Config
+from services.leaderboard import Leaderboard
+from services.question_bank import question_bank
+
+# How long a lobby lives before the sweeper removes it
+LOBBY_LIFETIME = timedelta(hours=24)
+
+
+class PlayerState:
+    """A player in a lobby roster"""
+
+    __slots__ = ('session_id', 'display_name', 'score', 'is_connected', 'last_seen_at', 'joined_at')
+
+    def __init__(self, session_id, display_name, score=0, is_connected=True, last_seen_at=None, joined_at=None):
+        now = datetime.utcnow()
+        self.session_id = session_id
+        self.display_name = display_name
+        self.score = score
+        self.is_connected = is_connected
+        self.last_seen_at = last_seen_at or now
+        self.joined_at = joined_at or now
+
+    @classmethod
+    def from_model(cls, player):
+        return cls(
+            session_id=player.session_id,
+            display_name=player.display_name,
+            score=player.score or 0,
+            is_connected=bool(player.is_connected),
+            last_seen_at=player.last_seen_at,
+            joined_at=player.joined_at
+        )
+
+    def to_dict(self):
+        return {
+            'id': self.session_id,
+            'name': self.display_name,
+            'score': self.score,
+            'connected': self.is_connected
+        }
+
+
+class AnswerState:
+    """An answer submitted for the current question"""
+
+    __slots__ = ('session_id', 'question_index', 'answer_index', 'time_taken', 'points', 'answered_at')
+
+    def __init__(self, session_id, question_index, answer_index, time_taken, points, answered_at=None):
+        self.session_id = session_id
+        self.question_index = question_index
+        self.answer_index = answer_index
+        self.time_taken = time_taken
+        self.points = points
+        self.answered_at = answered_at or datetime.utcnow()
+
+
+class SocketState:
+    """Mapping from a connected socket to its session, lobby and role"""
+
+    __slots__ = ('socket_id', 'session_id', 'lobby_code', 'role', 'connected_at')
+
+    def __init__(self, socket_id, session_id, lobby_code, role, connected_at=None):
+        self.socket_id = socket_id
+        self.session_id = session_id
+        self.lobby_code = lobby_code
+        self.role = role
+        self.connected_at = connected_at or datetime.utcnow()
+
+
+class LobbyState:
+    """Live state of one lobby: status, question progress and roster"""
+
+    __slots__ = (
+        'code', 'host_session_id', 'status', 'game_mode', 'pack', 'current_question_index',
+        'question_start_time', 'question_started_at', 'timer_deadline', 'players', 'answers',
+        'leaderboard', 'ranks', 'connected', 'answered', 'answer_counts', 'roster_seq', 'reveal', 'resume_cache', 'created_at', 'expires_at', 'lock'
+    )
+
+    def __init__(self, code, host_session_id, status='waiting', game_mode=None,
+                 current_question_index=0, created_at=None, expires_at=None):
+        now = datetime.utcnow()
+        self.code = code
+        self.host_session_id = host_session_id
+        self.status = status
+        self.game_mode = game_mode
+        self.pack = None                  # question Pack this game plays, see question_pack
+        self.current_question_index = current_question_index
+        self.question_start_time = None   # wall clock, persisted
+        self.question_started_at = None   # time.monotonic(), used for scoring
+        self.timer_deadline = None        # time.monotonic() the answer timer runs out
+        self.players = {}                 # session_id -> PlayerState, in join order
+        self.answers = {}                 # session_id -> AnswerState for the current question, in answer order
+        self.leaderboard = Leaderboard()  # players' scores, ranked; kept in step by add_player and award
+        self.ranks = {}                   # session_id -> rank at the last reveal
+        self.connected = 0                # connected players
+        self.answered = 0                 # connected players with an answer to the current question
+        self.answer_counts = {}           # answer_index -> answers to the current question
+        self.roster_seq = 0               # bumped by every players_patch
+        self.reveal = None                # question_ended payload while status is 'reveal'
+        self.resume_cache = None          # see services.resume
+        self.created_at = created_at or now
+        self.expires_at = expires_at or now + LOBBY_LIFETIME
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_model(cls, lobby, players, answers=()):
+        state = cls(
+            code=lobby.code,
+            host_session_id=lobby.host_session_id,
+            status=lobby.status,
+            game_mode=lobby.game_mode,
+            current_question_index=lobby.current_question_index or 0,
+            created_at=lobby.created_at,
+            expires_at=lobby.expires_at
+        )
+        if lobby.question_start_time:
+            elapsed = (datetime.utcnow() - lobby.question_start_time).total_seconds()
+            state.question_start_time = lobby.question_start_time
+            state.question_started_at = time.monotonic() - elapsed
+        for player in players:
+            state.add_player(PlayerState.from_model(player))
+        for answer in answers:
+            state.record_answer(AnswerState(
+                session_id=answer.player_session_id,
+                question_index=answer.question_index,
+                answer_index=answer.answer_index,
+                time_taken=answer.time_taken,
+                points=answer.points_earned or 0,
+                answered_at=answer.answered_at
+            ))
+        return state
+
+    def question_pack(self):
+        """
+        The question pack this game plays. Pinned when the host picks the
+        mode, so an edited pack only reaches games started after the reload;
+        a lobby loaded from the database mid-game pins the current one.
+        """
+        if self.pack is None and self.game_mode:
+            self.pack = question_bank.get(self.game_mode)
+        return self.pack
+
+    def begin_question(self):
+        """Stamp the start of the current question and clear its answers"""
+        self.question_start_time = datetime.utcnow()
+        self.question_started_at = time.monotonic()
+        self.timer_deadline = None
+        self.reveal = None
+        self.answers = {}
+        self.answered = 0
+        self.answer_counts = {}
+
+    def elapsed(self):
+        """Seconds since the current question started"""
+        return time.monotonic() - self.question_started_at
+
+    def players_list(self):
+        return [p.to_dict() for p in self.players.values()]
+
+    def add_player(self, player):
+        self.players[player.session_id] = player
+        self.leaderboard.set(player.session_id, player.score)
+        if player.is_connected:
+            self._count_connected(player.session_id, 1)
+
+    def remove_player(self, session_id):
+        """Drop a player from the roster and leaderboard; returns the PlayerState or None"""
+        self.leaderboard.remove(session_id)
+        self.ranks.pop(session_id, None)
+        player = self.players.pop(session_id, None)
+        if player is not None and player.is_connected:
+            self._count_connected(session_id, -1)
+        return player
+
+    def set_connected(self, player, connected):
+        """Mark a player connected or not, keeping the answered/connected counts"""
+        if player.is_connected != connected:
+            player.is_connected = connected
+            self._count_connected(player.session_id, 1 if connected else -1)
+
+    def record_answer(self, answer):
+        """Keep an answer to the current question from a player in the roster"""
+        self.answers[answer.session_id] = answer
+        self.answer_counts[answer.answer_index] = self.answer_counts.get(answer.answer_index, 0) + 1
+        player = self.players.get(answer.session_id)
+        if player is not None and player.is_connected:
+            self.answered += 1
+
+    def _count_connected(self, session_id, delta):
+        self.connected += delta
+        if session_id in self.answers:
+            self.answered += delta
+
+    def large_audience(self):
+        """Whether reveals should be sent in the large-audience form"""
+        return len(self.players) > Config.LARGE_AUDIENCE_PLAYERS
+
+    def all_answered(self):
+        """Whether every connected player has answered the current question"""
+        return 0 < self.connected <= self.answered
+
+    def award(self, player, points):
+        """Add points to a player's total"""
+        if points:
+            player.score += points
+            self.leaderboard.set(player.session_id, player.score)
+
+    def standings(self, limit=None):
+        """The first `limit` players by score, highest first, with their rank"""
+        players = self.players
+        return [
+            {
+                'name': players[session_id].display_name,
+                'score': score,
+                'rank': rank,
+                'session_id': session_id
+            }
+            for session_id, score, rank in self.leaderboard.top(limit)
+        ]
+
+    def final_scores(self):
+        """Standings as sent in game_ended: everyone, or the top N in a large room"""
+        limit = Config.LEADERBOARD_TOP_N
+        return self.standings(limit if len(self.players) > limit else None)
+
+    def rank_changes(self):
+        """
+        Re-rank every player after a reveal. Returns {session_id: (rank,
+        delta)}, delta being the places gained since the previous reveal,
+        and remembers the new ranks. Call with the lock held.
+        """
+        leaderboard = self.leaderboard
+        previous = self.ranks
+        changes = {}
+        ranks = {}
+        for session_id in self.players:
+            rank = leaderboard.rank(session_id)
+            before = previous.get(session_id)
+            changes[session_id] = (rank, before - rank if before is not None else 0)
+            ranks[session_id] = rank
+        self.ranks = ranks
+        return changes
+
+    def roster_snapshot(self):
+        """Full players_updated payload, tagged with the current roster sequence"""
+        return {'seq': self.roster_seq, 'players': self.players_list()}
+
+    def roster_patch(self, added=(), changed=(), removed=()):
+        """
+        Advance the roster sequence and return a players_patch payload with
+        only the entries that changed. Call with the lock held, after the
+        roster has been updated.
+        """
+        self.roster_seq += 1
+        payload = {'seq': self.roster_seq}
+        if added:
+            payload['added'] = [p.to_dict() for p in added]
+        if changed:
+            payload['changed'] = [p.to_dict() for p in changed]
+        if removed:
+            payload['removed'] = list(removed)
+        return payload
+
+
+class LobbyRegistry:
+    """Process-wide index of live lobbies and socket sessions"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lobbies = {}
+        self._sockets = {}
+        self._lobby_sockets = {}   # lobby code -> {sid: SocketState}
+        self._hosts = {}           # lobby code -> sid of the host's latest socket
+
+    def get(self, code):
+        """Return the in-memory lobby or None, without touching the database"""
+        return self._lobbies.get(code)
+
+    def load(self, code, cache=True):
+        """
+        Return the lobby, loading it from the database on a miss.
+        With cache=False a miss is read but not kept, for lobbies owned by
+        another worker. Must be called inside an app context.
+        """
+        lobby = self._lobbies.get(code)
+        if lobby is not None:
+            return lobby
+
+        from models import Lobby, Player, PlayerAnswer
+        from services.answer_ingest import answer_ingest
+
+        row = Lobby.query.filter_by(code=code).first()
+        if not row:
+            return None
+
+        players = Player.query.filter_by(lobby_code=code).all()
+        answers = []
+        if row.status == 'playing':
+            answers = PlayerAnswer.query.filter_by(
+                lobby_code=code,
+                question_index=row.current_question_index
+            ).order_by(PlayerAnswer.answered_at).all()
+        state = LobbyState.from_model(row, players, answers)
+        if not cache:
+            return state
+
+        with self._lock:
+            # Another thread may have loaded it while we were querying
+            if code in self._lobbies:
+                return self._lobbies[code]
+            self._lobbies[code] = state
+        answer_ingest.seed(code, state.answers.values())
+        return state
+
+    def add(self, lobby):
+        with self._lock:
+            self._lobbies[lobby.code] = lobby
+
+    def remove(self, code):
+        """Drop a lobby and unbind every socket that was in it"""
+        with self._lock:
+            lobby = self._lobbies.pop(code, None)
+            sids = list(self._lobby_sockets.pop(code, ()))
+            self._hosts.pop(code, None)
+            for sid in sids:
+                del self._sockets[sid]
+        return lobby, sids
+
+    def find_player_lobby(self, session_id):
+        """Return the live lobby that has this session in its roster"""
+        for lobby in list(self._lobbies.values()):
+            if session_id in lobby.players:
+                return lobby
+        return None
+
+    def lobbies(self):
+        return list(self._lobbies.values())
+
+    def socket(self, sid):
+        return self._sockets.get(sid)
+
+    def bind_socket(self, sid, session_id, lobby_code, role):
+        with self._lock:
+            socket_state = self._sockets.get(sid)
+            if socket_state:
+                self._unindex(socket_state)
+                socket_state.session_id = session_id
+                socket_state.lobby_code = lobby_code
+                socket_state.role = role
+            else:
+                socket_state = SocketState(sid, session_id, lobby_code, role)
+                self._sockets[sid] = socket_state
+            self._lobby_sockets.setdefault(lobby_code, {})[sid] = socket_state
+            if role == 'host':
+                self._hosts[lobby_code] = sid
+        return socket_state
+
+    def unbind_socket(self, sid):
+        with self._lock:
+            socket_state = self._sockets.pop(sid, None)
+            if socket_state:
+                self._unindex(socket_state)
+            return socket_state
+
+    def _unindex(self, socket_state):
+        code = socket_state.lobby_code
+        sockets = self._lobby_sockets.get(code)
+        if sockets is not None:
+            sockets.pop(socket_state.socket_id, None)
+            if not sockets:
+                del self._lobby_sockets[code]
+        if self._hosts.get(code) == socket_state.socket_id:
+            del self._hosts[code]
+
+    def host_socket(self, code):
+        """Sid of the lobby host's socket, or None"""
+        return self._hosts.get(code)
+
+    def lobby_sockets(self, code):
+        """The SocketStates bound to a lobby, for per-player emits"""
+        return list(self._lobby_sockets.get(code, {}).values())
+
+
+registry = LobbyRegistry()
+
+
+def drop_lobby(code, transport=None):
+    """
+    Tear down a live lobby: cancel its timers, forget it in memory, queue
+    its rows for deletion, take its sockets out of the room and free its
+    code. Returns the socket ids that were in it.
+    """
+    from services.scheduler import scheduler
+    from services.answer_ingest import answer_ingest
+    from services.persistence import write_behind
+    from services.code_pool import code_pool
+
+    scheduler.cancel_lobby(code)
+    _, sids = registry.remove(code)
+    answer_ingest.discard_lobby(code)
+    write_behind.remove_lobby(code)
+    if transport is not None:
+        # Otherwise they would get the next lobby's broadcasts once the code is reused
+        for sid in sids:
+            transport.leave_room(sid, code)
+    code_pool.release(code)
+    return sids
@@ -0,0 +1,158 @@
+"""
+Structured, non-blocking logging.
+
+Handlers call get_logger(category).info(event, msg, lobby=..., sid=..., ...).
+The call checks the category's level and the event's sample rate, then puts
+the record on a bounded in-memory queue and returns; it never formats or
+writes. A background listener thread turns records into one JSON object per
+line and writes them to stdout and to a size-rotated file under logs/. If
+the queue is full (the log pipe is backed up) records are dropped and
+counted rather than blocking the event thread.
+
+Levels are set per category in Config.LOG_LEVELS, falling back to
+Config.LOG_LEVEL; Config.LOG_SAMPLING keeps only a fraction of high-volume
+events.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from config import Config
+
+# Attributes every LogRecord has; anything else was passed as a field
+_RESERVED = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'event'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, category, event, msg and fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'category': record.name.rpartition('.')[2],
+            'event': getattr(record, 'event', None)
+        }
+        message = record.getMessage()
+        if message:
+            entry['msg'] = message
+        for key, value in vars(record).items():
+            if key not in _RESERVED:
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records as they are; drop them instead of blocking when full"""
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+        self._lock = threading.Lock()
+
+    def prepare(self, record):
+        # Formatting happens on the listener thread
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._lock:
+                self.dropped += 1
+
+
+class EventLogger:
+    """A category logger taking an event name and structured fields"""
+
+    def __init__(self, category):
+        self.category = category
+        self._logger = logging.getLogger(f'trivia.{category}')
+
+    def log(self, level, event, msg=None, exc_info=None, **fields):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = Config.LOG_SAMPLING.get(event)
+        if rate is not None and random.random() >= rate:
+            return
+        fields['event'] = event
+        self._logger.log(level, msg or '', extra=fields, exc_info=exc_info)
+
+    def debug(self, event, msg=None, **fields):
+        self.log(logging.DEBUG, event, msg, **fields)
+
+    def info(self, event, msg=None, **fields):
+        self.log(logging.INFO, event, msg, **fields)
+
+    def warning(self, event, msg=None, **fields):
+        self.log(logging.WARNING, event, msg, **fields)
+
+    def error(self, event, msg=None, **fields):
+        self.log(logging.ERROR, event, msg, **fields)
+
+    def exception(self, event, msg=None, **fields):
+        self.log(logging.ERROR, event, msg, exc_info=True, **fields)
+
+
+_loggers = {}
+_handler = None
+_listener = None
+
+
+def get_logger(category):
+    logger = _loggers.get(category)
+    if logger is None:
+        logger = _loggers.setdefault(category, EventLogger(category))
+    return logger
+
+
+def dropped():
+    """Records dropped because the queue was full"""
+    return _handler.dropped if _handler else 0
+
+
+def configure_logging():
+    """Route trivia.* loggers through the queue to stdout and logs/. Call once at startup."""
+    global _handler, _listener
+    if _listener is not None:
+        return
+
+    formatter = JsonFormatter()
+    writers = []
+    if Config.LOG_STDOUT:
+        stdout = logging.StreamHandler(sys.stdout)
+        stdout.setFormatter(formatter)
+        writers.append(stdout)
+    if Config.LOG_DIR:
+        os.makedirs(Config.LOG_DIR, exist_ok=True)
+        # Workers rotate their own files; several processes can't share one
+        name = 'trivia.log' if Config.WORKER_COUNT == 1 else f'trivia-{Config.WORKER_INDEX}.log'
+        rotating = logging.handlers.RotatingFileHandler(
+            os.path.join(Config.LOG_DIR, name),
+            maxBytes=Config.LOG_MAX_BYTES,
+            backupCount=Config.LOG_BACKUP_COUNT,
+            encoding='utf-8'
+        )
+        rotating.setFormatter(formatter)
+        writers.append(rotating)
+
+    _handler = DroppingQueueHandler(queue.Queue(Config.LOG_QUEUE_SIZE))
+    root = logging.getLogger('trivia')
+    root.setLevel(Config.LOG_LEVEL)
+    root.addHandler(_handler)
+    root.propagate = False
+    for category, level in Config.LOG_LEVELS.items():
+        logging.getLogger(f'trivia.{category}').setLevel(level)
+
+    _listener = logging.handlers.QueueListener(_handler.queue, *writers, respect_handler_level=True)
+    _listener.start()
+    # Write out whatever is still queued on shutdown
+    atexit.register(_listener.stop)
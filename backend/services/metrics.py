@@ -0,0 +1,198 @@
+"""
+Process metrics in Prometheus text format.
+
+Socket event handlers and game_service functions are wrapped with
+track_event / track_function, which time each call and label it as the
+current source. Database queries and commits are attributed to whatever
+source is running on the same thread, so a slow reveal can be split into
+handler time, SQLite time and commit time. Emit sizes are recorded by
+services.payloads as packets are encoded. Gauges such as active lobbies
+and pending timers are read from their owners when /metrics is scraped.
+"""
+import functools
+import threading
+import time
+from sqlalchemy import event
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+BYTES_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144)
+
+_context = threading.local()
+
+
+def current_source():
+    """Label of the tracked event or function running on this thread"""
+    return getattr(_context, 'source', None) or 'other'
+
+
+class Counter:
+    def __init__(self, name, help, label):
+        self.name = name
+        self.help = help
+        self.label = label
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, label_value, amount=1):
+        with self._lock:
+            self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for value, total in sorted(self._values.items()):
+                lines.append(f'{self.name}{{{self.label}="{value}"}} {total}')
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, label, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label = label
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._series = {}   # label value -> [bucket counts..., sum, count]
+
+    def observe(self, label_value, amount):
+        with self._lock:
+            series = self._series.get(label_value)
+            if series is None:
+                series = self._series[label_value] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if amount <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += amount
+            series[-1] += 1
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for value, series in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {series[-1]}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {series[-2]:.6f}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {series[-1]}')
+        return lines
+
+
+event_seconds = Histogram('trivia_event_seconds', 'Socket event handler latency', 'event')
+event_errors = Counter('trivia_event_errors_total', 'Socket event handlers that raised', 'event')
+function_seconds = Histogram('trivia_function_seconds', 'Game service and background task latency', 'function')
+db_queries = Counter('trivia_db_queries_total', 'SQL statements executed, by source', 'source')
+db_query_seconds = Histogram('trivia_db_query_seconds', 'SQL statement latency, by source', 'source')
+db_commit_seconds = Histogram('trivia_db_commit_seconds', 'Session commit latency, by source', 'source')
+emits = Counter('trivia_emits_total', 'Socket.IO packets encoded, by event', 'event')
+emit_bytes = Histogram('trivia_emit_bytes', 'Encoded Socket.IO packet size, by event', 'event', BYTES_BUCKETS)
+compact_emit_bytes = Histogram('trivia_compact_emit_bytes', 'msgpack payload size of compact emits, by event',
+                               'event', BYTES_BUCKETS)
+
+_sockets_lock = threading.Lock()
+_connected_sockets = 0
+
+
+def _tracker(histogram, errors=None):
+    def decorator(fn):
+        name = fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            previous = getattr(_context, 'source', None)
+            _context.source = name
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except Exception:
+                if errors is not None:
+                    errors.inc(name)
+                raise
+            finally:
+                histogram.observe(name, time.perf_counter() - started)
+                _context.source = previous
+        return wrapper
+    return decorator
+
+
+# Decorators: label by the function's name
+track_event = _tracker(event_seconds, event_errors)
+track_function = _tracker(function_seconds)
+
+
+def record_emit(event_name, size):
+    emits.inc(event_name)
+    emit_bytes.observe(event_name, size)
+
+
+def record_compact_emit(event_name, size):
+    compact_emit_bytes.observe(event_name, size)
+
+
+def socket_connected():
+    global _connected_sockets
+    with _sockets_lock:
+        _connected_sockets += 1
+
+
+def socket_disconnected():
+    global _connected_sockets
+    with _sockets_lock:
+        _connected_sockets -= 1
+
+
+def watch_database(engine, session):
+    """Count and time queries and commits on this engine and session"""
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_query(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_query(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        source = current_source()
+        db_queries.inc(source)
+        db_query_seconds.observe(source, time.perf_counter() - started)
+
+    @event.listens_for(session, 'before_commit')
+    def before_commit(sess):
+        sess.info['commit_started'] = time.perf_counter()
+
+    @event.listens_for(session, 'after_commit')
+    def after_commit(sess):
+        started = sess.info.pop('commit_started', None)
+        if started is not None:
+            db_commit_seconds.observe(current_source(), time.perf_counter() - started)
+
+
+def _gauge(name, help, value):
+    return [f'# HELP {name} {help}', f'# TYPE {name} gauge', f'{name} {value}']
+
+
+def render():
+    """All metrics in Prometheus text exposition format"""
+    from services.lobby_state import registry
+    from services.scheduler import scheduler
+    from services.answer_ingest import answer_ingest
+    from services.code_pool import code_pool
+    from services import log
+
+    timers = scheduler.stats()
+    lines = []
+    lines += _gauge('trivia_active_lobbies', 'Lobbies live in this worker', len(registry.lobbies()))
+    lines += _gauge('trivia_connected_sockets', 'Sockets connected to this worker', _connected_sockets)
+    lines += _gauge('trivia_pending_timers', 'Game deadlines waiting to fire', timers['pending'])
+    lines += _gauge('trivia_timers_fired', 'Game deadlines fired since start', timers['fired'])
+    lines += _gauge('trivia_timer_lateness_avg_seconds', 'Average delay of fired deadlines', f"{timers['lateness_avg']:.6f}")
+    lines += _gauge('trivia_timer_lateness_max_seconds', 'Largest delay of a fired deadline', f"{timers['lateness_max']:.6f}")
+    lines += _gauge('trivia_pending_answers', 'Answers waiting for the next write-behind flush', answer_ingest.pending_count())
+    lines += _gauge('trivia_log_records_dropped', 'Log records dropped because the log queue was full', log.dropped())
+    lines += _gauge('trivia_lobby_code_occupancy', 'Fraction of lobby codes in use', f"{code_pool.stats()['occupancy']:.6f}")
+    for metric in (event_seconds, event_errors, function_seconds, db_queries, db_query_seconds,
+                   db_commit_seconds, emits, emit_bytes, compact_emit_bytes):
+        lines += metric.render()
+    return '\n'.join(lines) + '\n'
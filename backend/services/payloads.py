@@ -0,0 +1,43 @@
+"""
+Pre-encoded emit payloads.
+
+An EncodedPayload is a normal dict that also carries its JSON encoding. The
+`payload_json` module below is given to the Socket.IO server and splices that
+encoding into outgoing packets as-is, so a payload shared by many lobbies is
+serialized once instead of once per emit. Anything that doesn't know about it
+(message queues, test clients) just sees the dict. The size of every encoded
+event packet is recorded in services.metrics.
+"""
+import json
+from services import metrics
+
+
+class EncodedPayload(dict):
+    """A read-only payload dict with its JSON encoding attached"""
+
+    __slots__ = ('json', 'packed')
+
+    def __init__(self, data, encoded=None):
+        super().__init__(data)
+        self.json = encoded if encoded is not None else json.dumps(data, separators=(',', ':'))
+        self.packed = None  # compact encoding, filled in by services.wire on first use
+
+
+class payload_json:
+    """JSON module for the Socket.IO server that reuses EncodedPayload encodings"""
+
+    loads = staticmethod(json.loads)
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        # Socket.IO encodes an event as [name, *args]
+        if isinstance(obj, list) and any(isinstance(item, EncodedPayload) for item in obj):
+            encoded = '[' + ','.join(
+                item.json if isinstance(item, EncodedPayload) else json.dumps(item, **kwargs)
+                for item in obj
+            ) + ']'
+        else:
+            encoded = json.dumps(obj, **kwargs)
+        if isinstance(obj, list) and obj and isinstance(obj[0], str):
+            metrics.record_emit(obj[0], len(encoded))
+        return encoded
@@ -0,0 +1,224 @@
+"""
+Write-behind persistence for the in-memory lobby registry.
+
+Handlers mark what changed; a background thread copies the current state of
+everything marked, plus queued answers from services.answer_ingest, into the
+database in one transaction per flush.
+"""
+import atexit
+import threading
+from sqlalchemy import case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from models import db, Lobby, Player, SocketSession, PlayerAnswer
+from config import Config
+from services.lobby_state import registry
+from services.answer_ingest import answer_ingest
+from services.metrics import track_function
+from services.log import get_logger
+
+log = get_logger('storage')
+
+
+def _upsert(table, rows, key, keep=None):
+    """
+    Insert rows, overwriting any existing row with the same primary key.
+    keep maps column name -> expression to use instead of the new value.
+    """
+    if not rows:
+        return
+    stmt = sqlite_insert(table)
+    set_ = {c.name: stmt.excluded[c.name] for c in table.columns if c.name != key}
+    if keep:
+        set_.update(keep(stmt))
+    stmt = stmt.on_conflict_do_update(index_elements=[key], set_=set_)
+    db.session.execute(stmt, rows)
+
+def _keep_player_score(stmt):
+    # Scores only change through answer_ingest increments; a row that moved
+    # to another lobby starts over from the inserted value
+    table = Player.__table__
+    return {'score': case(
+        (table.c.lobby_code == stmt.excluded.lobby_code, table.c.score),
+        else_=stmt.excluded.score
+    )}
+
+
+class WriteBehind:
+    """Collects dirty lobby state and flushes it to the database in batches"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Held for a whole flush, so a caller that flushes knows every
+        # earlier change is committed when it returns
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._app = None
+        self._reset()
+
+    def _reset(self):
+        self._lobbies = set()
+        self._removed_lobbies = set()
+        self._players = set()
+        self._removed_players = set()
+        self._sockets = {}
+        self._removed_sockets = set()
+
+    def mark_lobby(self, code):
+        with self._lock:
+            self._lobbies.add(code)
+
+    def remove_lobby(self, code):
+        with self._lock:
+            self._lobbies.discard(code)
+            self._removed_lobbies.add(code)
+
+    def mark_player(self, code, session_id):
+        with self._lock:
+            self._removed_players.discard((code, session_id))
+            self._players.add((code, session_id))
+
+    def remove_player(self, code, session_id):
+        with self._lock:
+            self._players.discard((code, session_id))
+            self._removed_players.add((code, session_id))
+
+    def save_socket(self, socket_state):
+        with self._lock:
+            self._removed_sockets.discard(socket_state.socket_id)
+            self._sockets[socket_state.socket_id] = socket_state
+
+    def remove_socket(self, sid):
+        with self._lock:
+            self._sockets.pop(sid, None)
+            self._removed_sockets.add(sid)
+
+    def wake(self):
+        """Ask the flusher to run now instead of waiting for the next tick"""
+        self._wake.set()
+
+    def _take(self):
+        with self._lock:
+            pending = (
+                self._lobbies, self._removed_lobbies, self._players, self._removed_players,
+                self._sockets, self._removed_sockets
+            )
+            self._reset()
+        return pending
+
+    def _requeue(self, pending):
+        lobbies, removed_lobbies, players, removed_players, sockets, removed_sockets = pending
+        with self._lock:
+            self._lobbies |= lobbies - self._removed_lobbies
+            self._removed_lobbies |= removed_lobbies
+            self._players |= players - self._removed_players
+            self._removed_players |= removed_players - self._players
+            for sid, socket_state in sockets.items():
+                if sid not in self._removed_sockets:
+                    self._sockets.setdefault(sid, socket_state)
+            self._removed_sockets |= removed_sockets - set(self._sockets)
+
+    @track_function
+    def flush(self):
+        """Write everything marked so far. Returns the number of rows written."""
+        with self._flush_lock:
+            return self._flush()
+
+    def _flush(self):
+        pending = self._take()
+        lobbies, removed_lobbies, players, removed_players, sockets, removed_sockets = pending
+        answers = answer_ingest.take()
+        if not any(pending) and not answers:
+            return 0
+
+        lobby_rows = []
+        for code in lobbies:
+            lobby = registry.get(code)
+            if lobby is None:
+                continue
+            with lobby.lock:
+                lobby_rows.append({
+                    'code': lobby.code,
+                    'host_session_id': lobby.host_session_id,
+                    'status': lobby.status,
+                    'game_mode': lobby.game_mode,
+                    'current_question_index': lobby.current_question_index,
+                    'question_start_time': lobby.question_start_time,
+                    'created_at': lobby.created_at,
+                    'expires_at': lobby.expires_at
+                })
+
+        player_rows = []
+        for code, session_id in players:
+            lobby = registry.get(code)
+            player = lobby.players.get(session_id) if lobby else None
+            if player is None:
+                continue
+            player_rows.append({
+                'session_id': player.session_id,
+                'lobby_code': code,
+                'display_name': player.display_name,
+                'score': 0,  # only used on insert, see _keep_player_score
+                'is_connected': player.is_connected,
+                'last_seen_at': player.last_seen_at,
+                'joined_at': player.joined_at
+            })
+
+        socket_rows = [
+            {
+                'socket_id': s.socket_id,
+                'session_id': s.session_id,
+                'lobby_code': s.lobby_code,
+                'role': s.role,
+                'connected_at': s.connected_at
+            }
+            for s in sockets.values() if s.lobby_code not in removed_lobbies
+        ]
+
+        answers = [(code, batch) for code, batch in answers if code not in removed_lobbies]
+
+        with self._app.app_context():
+            try:
+                if removed_lobbies:
+                    for model in (PlayerAnswer, SocketSession, Player):
+                        model.query.filter(model.lobby_code.in_(removed_lobbies)).delete(synchronize_session=False)
+                    Lobby.query.filter(Lobby.code.in_(removed_lobbies)).delete(synchronize_session=False)
+                for code, session_id in removed_players:
+                    Player.query.filter_by(session_id=session_id, lobby_code=code).delete(synchronize_session=False)
+                if removed_sockets:
+                    SocketSession.query.filter(SocketSession.socket_id.in_(removed_sockets)).delete(synchronize_session=False)
+
+                _upsert(Lobby.__table__, lobby_rows, 'code')
+                _upsert(Player.__table__, player_rows, 'session_id', keep=_keep_player_score)
+                _upsert(SocketSession.__table__, socket_rows, 'socket_id')
+                answer_count = answer_ingest.write(answers)
+
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                self._requeue(pending)
+                answer_ingest.requeue(answers)
+                log.exception('flush_failed', f"Error flushing lobby state: {e}")
+                return 0
+
+        return len(lobby_rows) + len(player_rows) + len(socket_rows) + answer_count
+
+    def _run(self):
+        while True:
+            self._wake.wait(Config.WRITE_BEHIND_INTERVAL)
+            self._wake.clear()
+            self.flush()
+
+    def init_app(self, app):
+        """Bind the app whose database flush() writes to"""
+        self._app = app
+
+    def start(self, app):
+        """Start the background flusher thread"""
+        self.init_app(app)
+        flush_thread = threading.Thread(target=self._run, daemon=True)
+        flush_thread.start()
+        atexit.register(self.flush)
+        log.info('flusher_started', "Write-behind flusher started")
+
+
+write_behind = WriteBehind()
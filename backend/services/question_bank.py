@@ -0,0 +1,164 @@
+"""
+Question bank.
+
+Loads every question pack in Config.QUESTION_PACKS into immutable Pack
+objects, one per game mode. Each pack pre-encodes its question_started
+payloads and the fixed part of its question_ended payloads, so lobbies
+playing the same pack share the same bytes. Pack files are re-read when
+their mtime changes. A game keeps the Pack it started with (pinned on the
+lobby, see LobbyState.question_pack), so a reload only reaches new games.
+
+Question audio durations come from the audio manifest, so the server knows
+when narration ends and can start the answer timer itself.
+"""
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+from config import Config, basedir
+from services.payloads import EncodedPayload
+from services.log import get_logger
+
+log = get_logger('questions')
+
+Question = namedtuple('Question', ['id', 'text', 'answers', 'correct', 'audio', 'audio_duration'],
+                      defaults=(None,))
+
+# Used when a pack file doesn't set its own
+DEFAULT_TIME_PER_QUESTION = 10
+
+
+class Pack:
+    """One loaded question pack"""
+
+    __slots__ = ('name', 'display_name', 'time_per_question', 'questions',
+                 'path', 'mtime', '_started', '_reveal_prefix')
+
+    def __init__(self, name, path, durations=None):
+        durations = durations or {}
+        self.name = name
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        with open(path, 'r') as f:
+            data = json.load(f)
+
+        self.display_name = data.get('mode_display_name', name.title())
+        self.time_per_question = data.get('time_per_question', DEFAULT_TIME_PER_QUESTION)
+        # Packs list choices under 'answers' or, in older files, 'options'
+        self.questions = tuple(
+            Question(
+                id=q.get('id', i + 1),
+                text=q['question'],
+                answers=tuple(q.get('answers') or q['options']),
+                correct=q['correct'],
+                audio=q.get('audio'),
+                audio_duration=durations.get(q.get('audio'))
+            )
+            for i, q in enumerate(data['questions'])
+        )
+
+        total = len(self.questions)
+        self._started = tuple(
+            EncodedPayload({
+                'question_index': i,
+                'question': q.text,
+                'answers': list(q.answers),
+                'time_limit': self.time_per_question,
+                'total_questions': total,
+                'audio': q.audio
+            })
+            for i, q in enumerate(self.questions)
+        )
+        self._reveal_prefix = tuple(
+            '{"question_index":%d,"correct_answer":%d,"answer_stats":' % (i, q.correct)
+            for i, q in enumerate(self.questions)
+        )
+
+    def timer_delay(self, index):
+        """Seconds from question_started until the answer timer should start"""
+        question = self.questions[index]
+        if not question.audio:
+            return 0.0
+        if question.audio_duration is None:
+            return Config.AUDIO_FALLBACK_DELAY
+        return question.audio_duration + Config.AUDIO_LEAD_TIME
+
+    def question_started(self, index):
+        """Shared question_started payload for a question"""
+        return self._started[index]
+
+    def question_ended(self, index, answer_stats):
+        """question_ended payload; only the lobby's answer_stats are encoded per call"""
+        question = self.questions[index]
+        return EncodedPayload(
+            {'question_index': index, 'correct_answer': question.correct, 'answer_stats': answer_stats},
+            self._reveal_prefix[index] + json.dumps(answer_stats, separators=(',', ':')) + '}'
+        )
+
+    def question_summary(self, index, answer_counts, total):
+        """question_ended payload for large audiences: answers per choice instead of per player"""
+        return {
+            'question_index': index,
+            'correct_answer': self.questions[index].correct,
+            'answer_counts': answer_counts,
+            'total': total
+        }
+
+
+class QuestionBank:
+    """Game mode name -> Pack, reloaded when a pack file changes"""
+
+    def __init__(self, packs, reload_interval, manifest=None):
+        self.files = {name: os.path.join(basedir, filename) for name, filename in packs.items()}
+        self.manifest = os.path.join(basedir, manifest) if manifest else None
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._durations, self._manifest_mtime = self._load_durations()
+        self._packs = {name: Pack(name, path, self._durations) for name, path in self.files.items()}
+        self._checked_at = time.monotonic()
+
+    def _load_durations(self):
+        """(audio url -> seconds, manifest mtime); empty if there is no manifest"""
+        if not self.manifest or not os.path.exists(self.manifest):
+            return {}, None
+        mtime = os.path.getmtime(self.manifest)
+        with open(self.manifest, 'r') as f:
+            files = json.load(f)['files']
+        return {url: entry['duration'] for url, entry in files.items()}, mtime
+
+    def get(self, name):
+        """Return the Pack for a game mode, or None"""
+        if time.monotonic() - self._checked_at >= self.reload_interval:
+            self._reload_changed()
+        return self._packs.get(name)
+
+    def _reload_changed(self):
+        if not self._lock.acquire(blocking=False):
+            return  # another thread is checking
+        try:
+            self._checked_at = time.monotonic()
+            manifest_changed = False
+            try:
+                if (self.manifest and os.path.exists(self.manifest)
+                        and os.path.getmtime(self.manifest) != self._manifest_mtime):
+                    self._durations, self._manifest_mtime = self._load_durations()
+                    manifest_changed = True
+                    log.info('manifest_reloaded', f"Reloaded audio manifest from {self.manifest}")
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                log.error('manifest_reload_failed', f"Error reloading audio manifest: {e}")
+            for name, path in self.files.items():
+                pack = self._packs.get(name)
+                try:
+                    if pack and not manifest_changed and os.path.getmtime(path) == pack.mtime:
+                        continue
+                    self._packs[name] = Pack(name, path, self._durations)
+                    log.info('pack_reloaded', f"Reloaded question pack {name} from {path}", pack=name)
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    # Keep serving the old pack while the file is being edited
+                    log.error('pack_reload_failed', f"Error reloading question pack {name}: {e}", pack=name)
+        finally:
+            self._lock.release()
+
+
+question_bank = QuestionBank(Config.QUESTION_PACKS, Config.QUESTION_RELOAD_INTERVAL, Config.AUDIO_MANIFEST)
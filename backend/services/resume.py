@@ -0,0 +1,104 @@
+"""
+Resume snapshots for reconnecting clients.
+
+One payload carries everything a client needs to redraw the screen it was
+on: lobby status, roster, the current question, the reveal or final scores,
+and the caller's own answer, score, rank and answer time left on the server
+clock. The part shared by the whole lobby is built and encoded once per
+lobby state and cached on the lobby under a version that changes with it;
+each request only encodes the caller's few fields and splices them in.
+Served by /api/reconnect and sent as resume_state when a socket rejoins.
+"""
+import json
+import time
+from services.payloads import EncodedPayload
+
+
+def _state_key(lobby):
+    """Everything the shared part depends on"""
+    return (lobby.status, lobby.game_mode, lobby.current_question_index, lobby.roster_seq,
+            lobby.timer_deadline is not None, lobby.reveal is not None)
+
+
+def _shared(lobby):
+    """(shared dict, its JSON encoding) for the lobby-wide part; call with the lock held"""
+    key = _state_key(lobby)
+    cached = lobby.resume_cache
+    if cached is not None and cached[0] == key:
+        return cached[2], cached[3]
+
+    version = cached[1] + 1 if cached else 1
+    players = lobby.players_list()
+    if lobby.status == 'playing':
+        # Scores as of the question start, like the caller's own score below.
+        # Answers only add points to the open question, so these stay valid
+        # while the cached copy is reused.
+        for entry in players:
+            answer = lobby.answers.get(entry['id'])
+            if answer is not None and answer.question_index == lobby.current_question_index:
+                entry['score'] -= answer.points
+    shared = {
+        'version': version,
+        'lobbyCode': lobby.code,
+        'status': lobby.status,
+        'seq': lobby.roster_seq,
+        'players': players
+    }
+    if lobby.status in ('playing', 'reveal'):
+        pack = lobby.question_pack()
+        if pack and lobby.current_question_index < len(pack.questions):
+            shared['question'] = pack.question_started(lobby.current_question_index)
+            shared['timer_started'] = lobby.timer_deadline is not None
+        if lobby.reveal is not None:
+            shared['reveal'] = lobby.reveal
+    elif lobby.status == 'results':
+        final_scores = lobby.final_scores()
+        shared['results'] = {'final_scores': final_scores,
+                             'winner': final_scores[0] if final_scores else None}
+
+    encoded = json.dumps(shared, separators=(',', ':'))
+    lobby.resume_cache = (key, version, shared, encoded)
+    return shared, encoded
+
+
+def build_resume(lobby, session_id):
+    """
+    Resume snapshot for a session as an EncodedPayload, or None if the
+    session is neither the host nor a player in this lobby.
+    """
+    with lobby.lock:
+        player = lobby.players.get(session_id)
+        if session_id == lobby.host_session_id:
+            personal = {'success': True, 'role': 'host'}
+        elif player is not None:
+            answer = lobby.answers.get(session_id)
+            if answer is not None and answer.question_index != lobby.current_question_index:
+                answer = None
+            score = player.score
+            if lobby.status == 'playing':
+                # Points for the open question aren't shown until the reveal
+                if answer is not None:
+                    score -= answer.points
+                rank = lobby.ranks.get(session_id)
+            else:
+                rank = lobby.leaderboard.rank(session_id)
+            personal = {
+                'success': True,
+                'role': 'player',
+                'displayName': player.display_name,
+                'score': score,
+                'rank': rank,
+                'answer_index': answer.answer_index if answer else None
+            }
+            if lobby.status == 'reveal':
+                # Large-audience reveals don't list players
+                personal['points'] = answer.points if answer else 0
+        else:
+            return None
+
+        if lobby.status == 'playing' and lobby.timer_deadline is not None:
+            personal['time_remaining'] = round(max(0.0, lobby.timer_deadline - time.monotonic()), 2)
+        shared, encoded = _shared(lobby)
+
+    return EncodedPayload(dict(shared, **personal),
+                          encoded[:-1] + ',' + json.dumps(personal, separators=(',', ':'))[1:])
@@ -0,0 +1,32 @@
+"""
+Reveal payload builder.
+
+Builds everything end_question sends from the lobby's in-memory state in a
+single pass over the current question's answers, so reveal cost does not
+include a database round trip per player.
+"""
+
+def build_reveal(lobby, question):
+    """
+    Return (answer_stats, scored) for the lobby's current question, where
+    scored is the players whose score changed. Answers are listed in
+    submission order. Call with lobby.lock held.
+    """
+    answer_stats = [{'players': []} for _ in range(len(question.answers))]
+    players = lobby.players
+    scored = []
+
+    for answer in lobby.answers.values():
+        player = players.get(answer.session_id)
+        if player is None or not 0 <= answer.answer_index < len(answer_stats):
+            continue
+        answer_stats[answer.answer_index]['players'].append({
+            'name': player.display_name,
+            'initial': player.display_name[0].upper(),
+            'points': answer.points,
+            'session_id': player.session_id
+        })
+        if answer.points:
+            scored.append(player)
+
+    return answer_stats, scored
@@ -0,0 +1,142 @@
+"""
+Central scheduler for game deadlines.
+
+One dispatcher thread keeps every pending deadline in a heap and hands due
+callbacks to a small fixed worker pool, so lobbies no longer spawn a thread
+per question phase. Deadlines are keyed: scheduling a key that is already
+pending is a no-op, and all keys for a lobby can be cancelled at once.
+"""
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from services.cluster import cluster
+from services.log import get_logger
+
+log = get_logger('scheduler')
+
+
+class _Entry:
+    __slots__ = ('deadline', 'seq', 'key', 'callback', 'args', 'cancelled')
+
+    def __init__(self, deadline, seq, key, callback, args):
+        self.deadline = deadline
+        self.seq = seq
+        self.key = key
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.deadline, self.seq) < (other.deadline, other.seq)
+
+
+class Scheduler:
+    """Heap-based deadline scheduler with keyed dedup and cancellation"""
+
+    def __init__(self, workers=None):
+        self._cond = threading.Condition()
+        self._heap = []
+        self._pending = {}
+        self._seq = itertools.count()
+        self._workers = workers or Config.SCHEDULER_WORKERS
+        self._pool = None
+        self._thread = None
+        self._fired = 0
+        self._late_total = 0.0
+        self._late_max = 0.0
+
+    def schedule(self, key, delay, callback, *args):
+        """
+        Run callback(*args) after delay seconds.
+        Keys are tuples starting with the lobby code. Returns False if the key
+        is already pending, or if another worker owns the lobby.
+        """
+        if not cluster.is_owner(key[0]):
+            return False
+        with self._cond:
+            if key in self._pending:
+                return False
+            entry = _Entry(time.monotonic() + delay, next(self._seq), key, callback, args)
+            self._pending[key] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+        return True
+
+    def cancel(self, key):
+        """Cancel a pending deadline. Returns True if one was pending."""
+        with self._cond:
+            entry = self._pending.pop(key, None)
+            if entry is None:
+                return False
+            entry.cancelled = True
+        return True
+
+    def cancel_lobby(self, code):
+        """Cancel every pending deadline for a lobby"""
+        with self._cond:
+            keys = [key for key in self._pending if key[0] == code]
+            for key in keys:
+                self._pending.pop(key).cancelled = True
+        return len(keys)
+
+    def pending(self, key):
+        return key in self._pending
+
+    def stats(self):
+        """Queue depth and how late fired deadlines ran, in seconds"""
+        with self._cond:
+            fired = self._fired
+            return {
+                'pending': len(self._pending),
+                'fired': fired,
+                'lateness_avg': self._late_total / fired if fired else 0.0,
+                'lateness_max': self._late_max
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    # Drop cancelled entries lazily
+                    while self._heap and self._heap[0].cancelled:
+                        heapq.heappop(self._heap)
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+                    wait = self._heap[0].deadline - time.monotonic()
+                    if wait <= 0:
+                        break
+                    self._cond.wait(wait)
+
+                entry = heapq.heappop(self._heap)
+                del self._pending[entry.key]
+                lateness = time.monotonic() - entry.deadline
+                self._fired += 1
+                self._late_total += lateness
+                self._late_max = max(self._late_max, lateness)
+
+            self._pool.submit(self._fire, entry)
+
+    @staticmethod
+    def _fire(entry):
+        try:
+            entry.callback(*entry.args)
+        except Exception as e:
+            log.exception('timer_failed', f"Error running scheduled {entry.key}: {e}",
+                          lobby=entry.key[0], timer=entry.key[1])
+
+    def start(self):
+        """Start the dispatcher thread and worker pool"""
+        if self._thread is not None:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix='scheduler')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        log.info('scheduler_started', "Game scheduler started")
+
+
+scheduler = Scheduler()
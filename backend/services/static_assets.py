@@ -0,0 +1,168 @@
+"""
+Static asset layer for the React build.
+
+The build directory is indexed once at startup: every file gets a strong
+ETag from its content hash, a MIME type and a Cache-Control policy.
+Content-hashed files under build/static never change, so they are cached
+for a year as immutable; everything else is revalidated with the ETag and
+answered with a 304 when unchanged. index.html is kept in memory.
+
+Text assets are served precompressed: a .br or .gz file the build left
+next to the original is used as-is, otherwise a gzip (and, if the brotli
+package is installed, a brotli) copy is made in memory at startup.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+from flask import Response, request, send_file
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only without it
+    brotli = None
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+NO_STORE = 'no-cache, no-store, must-revalidate'
+
+# CRA names bundles like main.3f2a1b9c.js or logo.6ce24c58.svg
+_HASHED = re.compile(r'\.[0-9a-f]{8,}\.')
+_COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'application/manifest+json',
+                 'application/xml', 'image/svg+xml')
+# Compressing anything smaller doesn't pay for the Content-Encoding overhead
+MIN_COMPRESS_SIZE = 1024
+# (coding, file suffix) in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+
+class Variant:
+    """One representation of an asset: on disk (path) or in memory (body)"""
+
+    __slots__ = ('etag', 'path', 'body')
+
+    def __init__(self, etag, path=None, body=None):
+        self.etag = etag
+        self.path = path
+        self.body = body
+
+
+class Asset:
+    __slots__ = ('mimetype', 'cache_control', 'identity', 'encoded')
+
+    def __init__(self, mimetype, cache_control, identity, encoded):
+        self.mimetype = mimetype
+        self.cache_control = cache_control
+        self.identity = identity
+        self.encoded = encoded   # coding -> Variant
+
+
+def _digest(path):
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 16), b''):
+            h.update(chunk)
+    return h.hexdigest()[:20]
+
+
+def _compress(coding, data):
+    if coding == 'br':
+        return brotli.compress(data, quality=11) if brotli else None
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def accepted_codings(header):
+    """Codings the Accept-Encoding header allows, ignoring q=0"""
+    codings = set()
+    for part in (header or '').split(','):
+        name, _, params = part.partition(';')
+        params = params.replace(' ', '')
+        if params in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        codings.add(name.strip().lower())
+    return codings
+
+
+class StaticAssets:
+    """Index of the build directory, served with caching headers and compression"""
+
+    def __init__(self, root, overrides=None):
+        self.root = root
+        self.overrides = overrides or {}   # relative path -> Cache-Control
+        self.assets = {}
+
+    def load(self):
+        """Index every file under the root. Call at startup."""
+        assets = {}
+        if os.path.isdir(self.root):
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith(('.br', '.gz')):
+                        continue
+                    path = os.path.join(directory, name)
+                    relative = os.path.relpath(path, self.root).replace(os.sep, '/')
+                    assets[relative] = self._index(relative, path)
+        self.assets = assets
+        return len(assets)
+
+    def _index(self, relative, path):
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if relative in self.overrides:
+            cache_control = self.overrides[relative]
+        elif relative.startswith('static/') and _HASHED.search(os.path.basename(relative)):
+            cache_control = IMMUTABLE
+        else:
+            cache_control = REVALIDATE
+
+        digest = _digest(path)
+        in_memory = relative == 'index.html'
+        body = None
+        encoded = {}
+        if mimetype.startswith(_COMPRESSIBLE) and os.path.getsize(path) >= MIN_COMPRESS_SIZE:
+            with open(path, 'rb') as f:
+                body = f.read()
+            for coding, suffix in ENCODINGS:
+                etag = f'{digest}-{coding}'
+                if os.path.exists(path + suffix):
+                    encoded[coding] = Variant(etag, path=path + suffix)
+                    continue
+                compressed = _compress(coding, body)
+                if compressed is not None and len(compressed) < len(body) * 0.9:
+                    encoded[coding] = Variant(etag, body=compressed)
+        elif in_memory:
+            with open(path, 'rb') as f:
+                body = f.read()
+        identity = Variant(digest, body=body) if in_memory else Variant(digest, path=path)
+        return Asset(mimetype, cache_control, identity, encoded)
+
+    def response(self, relative):
+        """Response for an indexed file, or None if it isn't in the build"""
+        asset = self.assets.get(relative)
+        if asset is None:
+            return None
+
+        variant, coding = asset.identity, None
+        if asset.encoded:
+            accepted = accepted_codings(request.headers.get('Accept-Encoding'))
+            for name, _ in ENCODINGS:
+                if name in accepted and name in asset.encoded:
+                    variant, coding = asset.encoded[name], name
+                    break
+
+        if variant.body is None and coding is None:
+            # Uncompressed from disk: send_file handles ranges (audio seeking)
+            response = send_file(variant.path, mimetype=asset.mimetype, etag=variant.etag, conditional=True)
+        else:
+            if variant.body is not None:
+                response = Response(variant.body, mimetype=asset.mimetype)
+            else:
+                response = send_file(variant.path, mimetype=asset.mimetype, etag=False, conditional=False)
+            response.set_etag(variant.etag)
+            response = response.make_conditional(request)
+        if coding:
+            response.headers['Content-Encoding'] = coding
+        if asset.encoded:
+            response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = asset.cache_control
+        return response
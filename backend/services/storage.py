@@ -0,0 +1,81 @@
+"""
+SQLite storage setup.
+
+Sets connection pragmas (WAL journal, busy timeout, synchronous level) on
+every new connection, and brings an existing database up to the current
+schema. create_all only creates missing tables, so indexes added to
+models.py after a database was created are built here, one numbered step
+at a time, with the step reached kept in PRAGMA user_version.
+"""
+import sqlite3
+from sqlalchemy import event
+from config import Config
+from services.log import get_logger
+
+log = get_logger('storage')
+
+# ON CONFLICT upserts in the write-behind flush need 3.24; RETURNING (3.35)
+# is used when available, see services.answer_ingest
+MIN_SQLITE_VERSION = (3, 24, 0)
+
+
+def _set_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    # WAL lets readers run alongside the write-behind flusher's commits
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute(f'PRAGMA busy_timeout={Config.SQLITE_BUSY_TIMEOUT_MS}')
+    cursor.execute(f'PRAGMA synchronous={Config.SQLITE_SYNCHRONOUS}')
+    cursor.close()
+
+
+def _add_indexes(conn, db):
+    """Version 1: secondary indexes and one answer per player per question"""
+    # Keep the first answer of any duplicates so the unique index can be built
+    removed = conn.exec_driver_sql(
+        'DELETE FROM player_answers WHERE id NOT IN ('
+        ' SELECT MIN(id) FROM player_answers'
+        ' GROUP BY player_session_id, lobby_code, question_index)'
+    ).rowcount
+    if removed:
+        log.info('duplicate_answers_removed', f"Removed {removed} duplicate answers", removed=removed)
+    _create_missing_indexes(conn, db)
+
+
+def _add_sweeper_indexes(conn, db):
+    """Version 2: indexes the expiry sweeper filters on"""
+    _create_missing_indexes(conn, db)
+
+
+def _create_missing_indexes(conn, db):
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
+# (version, step) in order; append new steps, never edit old ones
+MIGRATIONS = [
+    (1, _add_indexes),
+    (2, _add_sweeper_indexes),
+]
+
+
+def upgrade_schema(db):
+    """Run the migration steps a database hasn't had yet"""
+    with db.engine.begin() as conn:
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        for target, step in MIGRATIONS:
+            if version < target:
+                step(conn, db)
+                conn.exec_driver_sql(f'PRAGMA user_version = {target}')
+                log.info('schema_upgraded', f"Database schema upgraded to version {target}", version=target)
+
+
+def init_storage(app, db):
+    """Configure connections, create missing tables and upgrade the schema"""
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        raise RuntimeError(f"SQLite {sqlite3.sqlite_version} is too old, "
+                           f"{'.'.join(map(str, MIN_SQLITE_VERSION))} or newer is required")
+    with app.app_context():
+        event.listen(db.engine, 'connect', _set_pragmas)
+        db.create_all()
+        upgrade_schema(db)
@@ -0,0 +1,183 @@
+"""
+Incremental expiry sweeper.
+
+Replaces the hourly cleanup that loaded every expired lobby and deleted it
+row by row. Each sweep removes expired rows in bounded bulk DELETE batches,
+one short transaction per batch, and stops once its time budget is spent so
+the write-behind flusher is never locked out for long; whatever is left is
+picked up on the next sweep.
+
+A sweep covers:
+    - expired live lobbies in this worker's registry
+    - expired lobbies in the database, with their players, sockets and answers
+    - players disconnected for longer than STALE_PLAYER_AGE whose lobby has
+      expired or is gone (lobbies live on any worker are left alone)
+    - answers and socket sessions whose lobby no longer exists
+and returns the codes of expired lobbies to the code pool once their rows
+are gone, so a lobby reusing a code never loads the old one's players.
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import text, bindparam
+from config import Config
+from models import db
+from services.lobby_state import registry, drop_lobby
+from services.cluster import cluster
+from services.code_pool import code_pool
+from services.metrics import track_function
+from services.log import get_logger
+
+log = get_logger('sweeper')
+
+
+_STORED_LOBBIES = text('SELECT code FROM lobbies WHERE code IN :codes').bindparams(
+    bindparam('codes', expanding=True))
+
+_EXPIRED_LOBBIES = text('SELECT code FROM lobbies WHERE expires_at < :now LIMIT :limit')
+
+_DELETE_LOBBIES = [
+    text('DELETE FROM player_answers WHERE lobby_code IN :codes').bindparams(bindparam('codes', expanding=True)),
+    text('DELETE FROM socket_sessions WHERE lobby_code IN :codes').bindparams(bindparam('codes', expanding=True)),
+    text('DELETE FROM players WHERE lobby_code IN :codes').bindparams(bindparam('codes', expanding=True)),
+    text('DELETE FROM lobbies WHERE code IN :codes').bindparams(bindparam('codes', expanding=True)),
+]
+
+_STALE_PLAYERS = text(
+    'DELETE FROM players WHERE session_id IN ('
+    ' SELECT session_id FROM players'
+    ' WHERE is_connected = 0 AND last_seen_at < :cutoff'
+    ' AND lobby_code NOT IN (SELECT code FROM lobbies WHERE expires_at > :now)'
+    ' LIMIT :limit)'
+)
+
+_ORPHAN_ANSWERS = text(
+    'DELETE FROM player_answers WHERE id IN ('
+    ' SELECT id FROM player_answers'
+    ' WHERE NOT EXISTS (SELECT 1 FROM lobbies WHERE code = player_answers.lobby_code)'
+    ' LIMIT :limit)'
+)
+
+_ORPHAN_SOCKETS = text(
+    'DELETE FROM socket_sessions WHERE socket_id IN ('
+    ' SELECT socket_id FROM socket_sessions'
+    ' WHERE (lobby_code IS NULL AND connected_at < :cutoff)'
+    ' OR (lobby_code IS NOT NULL'
+    '     AND NOT EXISTS (SELECT 1 FROM lobbies WHERE code = socket_sessions.lobby_code))'
+    ' LIMIT :limit)'
+)
+
+
+class Sweeper:
+    """Deletes expired and orphaned rows a bounded batch at a time"""
+
+    def __init__(self, interval, batch_size, time_budget):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.time_budget = time_budget
+        self.last_report = None
+        self.transport = None
+
+    @track_function
+    def sweep(self):
+        """
+        Run one sweep and return a report of rows removed per kind, batches
+        and duration. Must be called inside an app context.
+        """
+        started = time.monotonic()
+        now = datetime.utcnow()
+        report = {'live_lobbies': 0, 'lobbies': 0, 'players': 0, 'answers': 0,
+                  'sockets': 0, 'batches': 0, 'codes': 0, 'complete': True}
+
+        # Live lobbies are cheap to check and this worker is the only one that has them
+        for lobby in registry.lobbies():
+            if lobby.expires_at < now:
+                drop_lobby(lobby.code, self.transport)
+                report['live_lobbies'] += 1
+
+        # Also covers lobbies this worker created but no longer holds in memory
+        report['codes'] = self._release_expired_codes(now)
+
+        # Every worker shares the database; one of them sweeps it
+        if cluster.index == 0:
+            steps = [
+                ('lobbies', lambda: self._delete_expired_lobbies(now)),
+                ('players', lambda: db.session.execute(_STALE_PLAYERS, {
+                    'cutoff': now - timedelta(seconds=Config.STALE_PLAYER_AGE),
+                    'now': now, 'limit': self.batch_size}).rowcount),
+                ('answers', lambda: db.session.execute(_ORPHAN_ANSWERS, {
+                    'limit': self.batch_size}).rowcount),
+                ('sockets', lambda: db.session.execute(_ORPHAN_SOCKETS, {
+                    'cutoff': now - timedelta(seconds=Config.ORPHAN_SOCKET_AGE),
+                    'limit': self.batch_size}).rowcount),
+            ]
+            for kind, batch in steps:
+                if not self._drain(kind, batch, report, started):
+                    report['complete'] = False
+                    break
+
+        report['duration_ms'] = round((time.monotonic() - started) * 1000, 1)
+        self.last_report = report
+        return report
+
+    def _drain(self, kind, batch, report, started):
+        """Run batches of one kind until none is left. Returns False if out of time."""
+        while True:
+            if time.monotonic() - started >= self.time_budget:
+                return False
+            try:
+                removed = batch()
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            report['batches'] += 1
+            report[kind] += removed
+            if removed < self.batch_size:
+                return True
+
+    def _release_expired_codes(self, now):
+        codes = code_pool.expired(now)
+        if not codes:
+            return 0
+        # Rows are deleted in one transaction with their lobby, so no lobby row means none left
+        stored = {row[0] for row in db.session.execute(_STORED_LOBBIES, {'codes': codes})}
+        released = [code for code in codes if code not in stored]
+        for code in released:
+            code_pool.release(code)
+        return len(released)
+
+    def _delete_expired_lobbies(self, now):
+        codes = [row[0] for row in db.session.execute(
+            _EXPIRED_LOBBIES, {'now': now, 'limit': self.batch_size})]
+        if codes:
+            for stmt in _DELETE_LOBBIES:
+                db.session.execute(stmt, {'codes': codes})
+        return len(codes)
+
+    def _run(self, app):
+        while True:
+            time.sleep(self.interval)
+            with app.app_context():
+                try:
+                    report = self.sweep()
+                except Exception as e:
+                    log.exception('sweep_failed', f"Error sweeping: {e}")
+                    continue
+            removed = sum(report[k] for k in ('live_lobbies', 'lobbies', 'players', 'answers', 'sockets'))
+            if removed or not report['complete']:
+                log.info('sweep', f"Sweep removed {report['lobbies']} lobbies ({report['live_lobbies']} live), "
+                         f"{report['players']} stale players, {report['answers']} orphan answers, "
+                         f"{report['sockets']} sockets in {report['batches']} batches, "
+                         f"{report['duration_ms']} ms{'' if report['complete'] else ' (resuming next sweep)'}",
+                         **report)
+
+    def start(self, app, transport=None):
+        """Start sweeping in a background thread. transport takes dropped lobbies' sockets out of their rooms."""
+        self.transport = transport
+        thread = threading.Thread(target=self._run, args=(app,), daemon=True)
+        thread.start()
+        log.info('sweeper_started', "Expiry sweeper started")
+
+
+sweeper = Sweeper(Config.SWEEP_INTERVAL, Config.SWEEP_BATCH_SIZE, Config.SWEEP_TIME_BUDGET)
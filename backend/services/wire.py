@@ -0,0 +1,161 @@
+"""
+Compact wire format.
+
+A client can ask for it when connecting (auth {"wire": "compact"}). If the
+msgpack package is installed and Config.COMPACT_WIRE is on, the server
+answers with a wire_format event carrying FIELDS, and from then on events
+for that socket are sent as one msgpack binary argument instead of JSON:
+dict keys listed in FIELDS become their index in the list (one byte on the
+wire), session ids that are UUIDs go as 16 raw bytes (msgpack ext type 1),
+and player names in question_ended and leaderboard are left out because the
+client already has them in its roster. Every other socket, and any event to
+a socket that didn't ask, stays JSON.
+
+Answer choices are not sent as a per-pack string table: each choice only
+goes out once, in its question's question_started, and a table up front
+would show players the choices of questions not yet asked.
+
+Sockets are tracked per worker. With several workers a compact socket whose
+lobby is owned by another worker gets JSON, which the client also handles.
+"""
+import re
+import threading
+from config import Config
+from services import metrics
+from services.payloads import EncodedPayload
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only without it
+    msgpack = None
+
+# Append only: a key's code is its position. The frontend ships a copy,
+# regenerate it with local_utility/build_wire_fields.py
+FIELDS = (
+    'question_index', 'question', 'answers', 'time_limit', 'total_questions', 'audio',
+    'correct_answer', 'answer_stats', 'players', 'name', 'initial', 'points', 'session_id',
+    'id', 'score', 'connected', 'seq', 'added', 'changed', 'removed', 'top', 'rank', 'delta',
+    'total', 'final_scores', 'winner', 'final', 'answered', 'counts', 'message', 'success',
+    'code', 'sessionId', 'mode', 'mode_name', 'lobbyCode', 'status', 'role', 'displayName',
+    'version', 'timer_started', 'reveal', 'results', 'time_remaining', 'answer_index',
+    'answer_counts'
+)
+_CODES = {name: code for code, name in enumerate(FIELDS)}
+
+# Canonical lowercase UUIDs, as uuid4() prints them, round-trip exactly
+_UUID = re.compile(r'[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}\Z')
+UUID_EXT = 1
+
+# Suffix of the Socket.IO room holding a room's compact sockets
+COMPACT_ROOM = '~c'
+
+
+def available():
+    return msgpack is not None and Config.COMPACT_WIRE
+
+
+def _shorten(obj, drop=()):
+    """obj with FIELDS keys coded and UUIDs packed, leaving out dict keys in drop"""
+    kind = type(obj)
+    if kind is str:
+        if len(obj) == 36 and _UUID.match(obj):
+            return msgpack.ExtType(UUID_EXT, bytes.fromhex(obj.replace('-', '')))
+        return obj
+    if kind is dict or isinstance(obj, dict):
+        codes = _CODES
+        return {codes.get(key, key): _shorten(value, drop)
+                for key, value in obj.items() if key not in drop}
+    if kind is list or kind is tuple:
+        return [_shorten(item, drop) for item in obj]
+    return obj
+
+
+# Keys left out per event; the client restores them from its roster
+_DROP = {
+    'question_ended': frozenset(('name', 'initial')),
+    'leaderboard': frozenset(('name',))
+}
+
+
+def pack(event, data):
+    """msgpack encoding of an event payload in the compact format"""
+    if isinstance(data, EncodedPayload):
+        # Shared payloads are packed once, like their JSON
+        packed = data.packed
+        if packed is None:
+            packed = data.packed = _pack(event, data)
+    else:
+        packed = _pack(event, data)
+    metrics.record_compact_emit(event, len(packed))
+    return packed
+
+
+def _pack(event, data):
+    return msgpack.packb(_shorten(data, _DROP.get(event, ())), use_bin_type=True)
+
+
+class WireFormats:
+    """Which sockets use the compact format, and which rooms they are in"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._compact = {}   # sid -> set of rooms
+        self._rooms = {}     # room -> set of compact sids
+
+    def negotiate(self, sid, auth):
+        """Record a connecting socket's choice; returns the wire_format payload or None"""
+        if not available() or not isinstance(auth, dict) or auth.get('wire') != 'compact':
+            return None
+        with self._lock:
+            self._compact[sid] = set()
+        return {'format': 'compact', 'fields': FIELDS}
+
+    def forget(self, sid):
+        with self._lock:
+            for room in self._compact.pop(sid, ()):
+                members = self._rooms[room]
+                members.discard(sid)
+                if not members:
+                    del self._rooms[room]
+
+    def enter_room(self, sid, room):
+        """Returns True if the socket is compact and should also join the compact room"""
+        with self._lock:
+            rooms = self._compact.get(sid)
+            if rooms is None:
+                return False
+            rooms.add(room)
+            self._rooms.setdefault(room, set()).add(sid)
+            return True
+
+    def leave_room(self, sid, room):
+        with self._lock:
+            rooms = self._compact.get(sid)
+            if rooms is None or room not in rooms:
+                return False
+            rooms.discard(room)
+            members = self._rooms[room]
+            members.discard(sid)
+            if not members:
+                del self._rooms[room]
+            return True
+
+    def split(self, event, data, target, skip_sid=None):
+        """
+        [(payload, to, skip_sid)] emits that deliver an event to `target` (a
+        room or a sid) in each socket's format. A single JSON emit when no
+        compact socket is involved.
+        """
+        if not self._compact or target is None:
+            return [(data, target, skip_sid)]
+        if target in self._compact:
+            return [(pack(event, data), target, None)]
+        with self._lock:
+            members = list(self._rooms.get(target, ()))
+        if not members:
+            return [(data, target, skip_sid)]
+        skip = members + ([skip_sid] if skip_sid else [])
+        return [(data, target, skip), (pack(event, data), target + COMPACT_ROOM, skip_sid)]
+
+
+wire = WireFormats()
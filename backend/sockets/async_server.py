@@ -0,0 +1,35 @@
+"""
+Asyncio deployment mode.
+
+Builds an ASGI app around python-socketio's AsyncServer, with the Flask app
+mounted for HTTP routes. Each connected socket costs a coroutine instead of
+a thread. Run with uvicorn (see app.py) when SOCKETIO_ASYNC_MODE=asgi.
+"""
+import socketio
+from asgiref.wsgi import WsgiToAsgi
+from config import Config
+from services.async_db import AsyncDB
+from services.cluster import cluster
+from services.payloads import payload_json
+from sockets.transport import AsyncTransport
+from sockets.connection import register_async_connection_handlers
+from sockets.lobby import register_async_lobby_handlers
+from sockets.game import register_async_game_handlers
+
+def create_asgi_app(app):
+    """Create the ASGI app serving Socket.IO and the Flask routes. Returns (asgi_app, transport)."""
+    sio = socketio.AsyncServer(
+        async_mode='asgi',
+        cors_allowed_origins=Config.SOCKETIO_CORS_ALLOWED_ORIGINS,
+        client_manager=cluster.client_manager(asyncio=True),
+        json=payload_json
+    )
+    transport = AsyncTransport(sio)
+    async_db = AsyncDB(app)
+
+    register_async_connection_handlers(app, sio, transport)
+    register_async_lobby_handlers(app, sio, transport, async_db)
+    register_async_game_handlers(app, sio, transport)
+
+    asgi_app = socketio.ASGIApp(sio, other_asgi_app=WsgiToAsgi(app), on_startup=transport.start)
+    return asgi_app, transport
@@ -1,40 +1,88 @@
 from flask import request
-from flask_socketio import emit
-from models import db, Player, SocketSession
 from datetime import datetime
+from services.lobby_state import registry
+from services.persistence import write_behind
+from services.cluster import cluster
+from services import metrics
+from services.metrics import track_event
+from services.game_service import answer_progress
+from services.log import get_logger
+from services.wire import wire
 
-def register_connection_handlers(socketio):
+log = get_logger('connection')
+
+@track_event
+def disconnect(app, transport, sid):
+    log.info('client_disconnected', sid=sid)
+
+    # Remove socket session (will be recreated on reconnect)
+    socket_session = registry.unbind_socket(sid)
+    if not socket_session:
+        return
+    write_behind.remove_socket(sid)
+
+    # If player, mark as disconnected (not deleted)
+    if socket_session.role == 'player':
+        code = socket_session.lobby_code
+        lobby = registry.get(code)
+        if not lobby:
+            return
+
+        with lobby.lock:
+            player = lobby.players.get(socket_session.session_id)
+            if not player:
+                return
+            lobby.set_connected(player, False)
+            player.last_seen_at = datetime.utcnow()
+            roster_patch = lobby.roster_patch(changed=[player])
+        write_behind.mark_player(code, socket_session.session_id)
+
+        # Broadcast updated player list
+        transport.emit('players_patch', roster_patch, room=code)
+
+        # The question may have been waiting only for this player
+        answer_progress(app, transport, code)
+
+def register_cluster_handlers(app, transport):
+    """Run disconnects forwarded from other workers"""
+    cluster.add_handler('disconnect', lambda sid, data: disconnect(app, transport, sid))
+
+def register_connection_handlers(app, socketio, transport):
     """Register connect and disconnect socket handlers"""
+    register_cluster_handlers(app, transport)
 
     @socketio.on('connect')
-    def on_connect():
-        print(f"Client connected: {request.sid}")
+    def on_connect(auth=None):
+        log.info('client_connected', sid=request.sid)
+        metrics.socket_connected()
+        negotiated = wire.negotiate(request.sid, auth)
+        if negotiated:
+            transport.emit('wire_format', negotiated, to=request.sid)
 
     @socketio.on('disconnect')
     def on_disconnect():
-        sid = request.sid
-        print(f"Client disconnected: {sid}")
+        if not cluster.route('disconnect', request.sid):
+            disconnect(app, transport, request.sid)
+        cluster.forget(request.sid)
+        wire.forget(request.sid)
+        metrics.socket_disconnected()
 
-        # Find socket session
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session:
-            return
+def register_async_connection_handlers(app, sio, transport):
+    """Register connect and disconnect handlers on an asyncio server"""
+    register_cluster_handlers(app, transport)
+
+    @sio.on('connect')
+    async def on_connect(sid, environ, auth=None):
+        log.info('client_connected', sid=sid)
+        metrics.socket_connected()
+        negotiated = wire.negotiate(sid, auth)
+        if negotiated:
+            transport.emit('wire_format', negotiated, to=sid)
 
-        # If player, mark as disconnected (not deleted)
-        if socket_session.role == 'player':
-            player = Player.query.filter_by(
-                session_id=socket_session.session_id,
-                lobby_code=socket_session.lobby_code
-            ).first()
-            if player:
-                player.is_connected = False
-                player.last_seen_at = datetime.utcnow()
-                db.session.commit()
-
-                # Broadcast updated player list
-                players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=socket_session.lobby_code).all()]
-                socketio.emit('players_updated', {'players': players_list}, room=socket_session.lobby_code)
-
-        # Remove socket session (will be recreated on reconnect)
-        db.session.delete(socket_session)
-        db.session.commit()
+    @sio.on('disconnect')
+    async def on_disconnect(sid):
+        if not cluster.route('disconnect', sid):
+            disconnect(app, transport, sid)
+        cluster.forget(sid)
+        wire.forget(sid)
+        metrics.socket_disconnected()
@@ -1,151 +1,173 @@
 from flask import request
-from flask_socketio import emit
-import threading
-from datetime import datetime
-from models import db, Lobby, Player, SocketSession, PlayerAnswer
-from config import GAME_MODES
-from services.game_service import calculate_points, start_question, end_question
-
-def register_game_handlers(app, socketio):
-    """Register game-related socket handlers"""
-
-    @socketio.on('select_game_mode')
-    def on_select_game_mode(data):
-        sid = request.sid
-        code = data['code']
-        mode = data['mode']  # 'ffa', 'teams_half', etc.
-
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
-
-        # Verify user is the host
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session or socket_session.session_id != lobby.host_session_id:
-            return emit('error', {'message': 'Only host can select game mode'})
-
-        # Validate mode exists
-        if mode not in GAME_MODES:
-            return emit('error', {'message': 'Invalid game mode'})
-
+from services.lobby_state import registry, AnswerState
+from services.persistence import write_behind
+from services.answer_ingest import answer_ingest
+from services.scheduler import scheduler
+from services.question_bank import question_bank
+from services.cluster import cluster
+from services.game_service import calculate_points, start_question, start_timer, answer_progress
+from services.metrics import track_event
+from services.log import get_logger
+
+log = get_logger('game')
+
+@track_event
+def select_game_mode(app, transport, sid, data):
+    code = data['code']
+    mode = data['mode']  # 'ffa', 'teams_half', etc.
+
+    lobby = registry.get(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    # Verify user is the host
+    socket_session = registry.socket(sid)
+    if not socket_session or socket_session.session_id != lobby.host_session_id:
+        return transport.emit('error', {'message': 'Only host can select game mode'}, to=sid)
+
+    # Validate mode exists
+    pack = question_bank.get(mode)
+    if not pack:
+        return transport.emit('error', {'message': 'Invalid game mode'}, to=sid)
+
+    with lobby.lock:
         lobby.game_mode = mode
+        lobby.pack = pack
         lobby.status = 'playing'
         lobby.current_question_index = 0
-        db.session.commit()
+    write_behind.mark_lobby(code)
 
-        mode_info = GAME_MODES[mode]
+    log.info('game_mode_selected', f"Game mode selected: {mode} for lobby {code}", lobby=code, sid=sid)
 
-        print(f"Game mode selected: {mode} for lobby {code}")
+    # Notify all players
+    transport.emit('game_mode_selected', {
+        'mode': mode,
+        'mode_name': pack.display_name
+    }, room=code)
 
-        # Notify all players
-        socketio.emit('game_mode_selected', {
-            'mode': mode,
-            'mode_name': mode_info['mode_display_name']
-        }, room=code)
+    # Start first question after a short delay
+    scheduler.schedule((code, 'start_question'), 2.0, start_question, app, transport, code)
 
-        # Start first question after a short delay
-        threading.Timer(2.0, lambda: start_question(app, socketio, code)).start()
+@track_event
+def submit_answer(app, transport, sid, data):
+    question_index = data['question_index']
+    answer_index = data['answer_index']
 
-    @socketio.on('submit_answer')
-    def on_submit_answer(data):
-        sid = request.sid
-        question_index = data['question_index']
-        answer_index = data['answer_index']
-
-        # Find player
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session or socket_session.role != 'player':
-            return emit('error', {'message': 'Only players can submit answers'})
-
-        code = socket_session.lobby_code
-        session_id = socket_session.session_id
-
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby or lobby.status != 'playing':
-            return emit('error', {'message': 'Game not in progress'})
-
-        # Check if they already answered this question
-        existing_answer = PlayerAnswer.query.filter_by(
-            player_session_id=session_id,
-            lobby_code=code,
-            question_index=question_index
-        ).first()
-
-        if existing_answer:
-            # Silently ignore duplicate submissions (frontend already prevents this)
-            return emit('answer_submitted', {'success': True})
+    # Find player
+    socket_session = registry.socket(sid)
+    if not socket_session or socket_session.role != 'player':
+        return transport.emit('error', {'message': 'Only players can submit answers'}, to=sid)
+
+    code = socket_session.lobby_code
+    session_id = socket_session.session_id
+
+    lobby = registry.get(code)
+    if not lobby or lobby.status != 'playing':
+        return transport.emit('error', {'message': 'Game not in progress'}, to=sid)
+
+    with lobby.lock:
+        if lobby.status != 'playing' or question_index != lobby.current_question_index:
+            return transport.emit('error', {'message': 'Question not active'}, to=sid)
 
         # Calculate time taken
-        if not lobby.question_start_time:
-            return emit('error', {'message': 'Question not started'})
+        if lobby.question_started_at is None:
+            return transport.emit('error', {'message': 'Question not started'}, to=sid)
 
-        time_taken = (datetime.utcnow() - lobby.question_start_time).total_seconds()
+        time_taken = lobby.elapsed()
 
-        mode_config = GAME_MODES[lobby.game_mode]
-        question_data = mode_config['questions'][question_index]
-        correct_answer = question_data['correct']
+        pack = lobby.question_pack()
+        correct_answer = pack.questions[question_index].correct
         is_correct = (answer_index == correct_answer)
 
         # Calculate points
-        points = calculate_points(time_taken, mode_config['time_per_question'], is_correct)
-
-        # Save answer
-        player_answer = PlayerAnswer(
-            player_session_id=session_id,
-            lobby_code=code,
-            question_index=question_index,
-            answer_index=answer_index,
-            time_taken=time_taken,
-            points_earned=points
-        )
-        db.session.add(player_answer)
-
-        # Update player total score
-        player = Player.query.filter_by(session_id=session_id, lobby_code=code).first()
+        points = calculate_points(time_taken, pack.time_per_question, is_correct)
+
+        # Queue answer for the next bulk write
+        answer = AnswerState(session_id, question_index, answer_index, time_taken, points)
+        if not answer_ingest.submit(code, answer):
+            # Silently ignore duplicate submissions (frontend already prevents this)
+            return transport.emit('answer_submitted', {'success': True}, to=sid)
+
+        # Record answer and update player total score
+        lobby.record_answer(answer)
+        player = lobby.players.get(session_id)
         if player:
-            player.score += points
+            lobby.award(player, points)
+
+    log.info('answer_submitted', lobby=code, sid=sid, session=session_id, question=question_index,
+             answer=answer_index, correct=is_correct, points=points)
+
+    # Confirm to player
+    transport.emit('answer_submitted', {
+        'question_index': question_index,
+        'answer_index': answer_index
+    }, to=sid)
+
+    # Update the host's count; reveal now if this was the last answer
+    answer_progress(app, transport, code)
+
+@track_event
+def audio_finished(app, transport, sid, data):
+    """Host finished playing the question audio: an early start for the answer timer"""
+    question_index = data.get('question_index')
+
+    # Get lobby code from socket session
+    socket_session = registry.socket(sid)
+    if not socket_session:
+        return transport.emit('error', {'message': 'Socket session not found'}, to=sid)
+
+    code = socket_session.lobby_code
+    lobby = registry.get(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    # Verify user is the host
+    if socket_session.session_id != lobby.host_session_id:
+        return transport.emit('error', {'message': 'Only host can notify audio finished'}, to=sid)
 
-        db.session.commit()
+    # Start the timer now if the server hasn't already
+    start_timer(app, transport, code, question_index)
 
-        print(f"Player {session_id} answered question {question_index} with answer {answer_index} (correct: {is_correct}, points: {points})")
+def register_cluster_handlers(app, transport):
+    """Run game events forwarded from other workers"""
+    cluster.add_handler('select_game_mode', lambda sid, data: select_game_mode(app, transport, sid, data))
+    cluster.add_handler('submit_answer', lambda sid, data: submit_answer(app, transport, sid, data))
+    cluster.add_handler('audio_finished', lambda sid, data: audio_finished(app, transport, sid, data))
 
-        # Confirm to player
-        emit('answer_submitted', {
-            'question_index': question_index,
-            'answer_index': answer_index
-        })
+def register_game_handlers(app, socketio, transport):
+    """Register game-related socket handlers"""
+    register_cluster_handlers(app, transport)
+
+    @socketio.on('select_game_mode')
+    def on_select_game_mode(data):
+        if not cluster.route('select_game_mode', request.sid, data, code=data['code']):
+            select_game_mode(app, transport, request.sid, data)
+
+    @socketio.on('submit_answer')
+    def on_submit_answer(data):
+        if not cluster.route('submit_answer', request.sid, data):
+            submit_answer(app, transport, request.sid, data)
 
     @socketio.on('audio_finished')
     def on_audio_finished(data):
-        """Handle notification from host that audio has finished playing"""
-        sid = request.sid
-        question_index = data.get('question_index')
-
-        # Get lobby code from socket session
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session:
-            return emit('error', {'message': 'Socket session not found'})
-
-        code = socket_session.lobby_code
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
-
-        # Verify user is the host
-        if socket_session.session_id != lobby.host_session_id:
-            return emit('error', {'message': 'Only host can notify audio finished'})
-
-        # Verify this is the current question
-        if lobby.current_question_index != question_index:
-            return
-
-        mode_config = GAME_MODES[lobby.game_mode]
-        time_limit = mode_config['time_per_question']
-
-        # Send timer_start to everyone
-        socketio.emit('timer_start', {
-            'time_limit': time_limit
-        }, room=code)
-
-        # Auto-end question after the answer time
-        threading.Timer(time_limit, lambda: end_question(app, socketio, code)).start()
+        if not cluster.route('audio_finished', request.sid, data):
+            audio_finished(app, transport, request.sid, data)
+
+def register_async_game_handlers(app, sio, transport):
+    """Register game-related handlers on an asyncio server"""
+    register_cluster_handlers(app, transport)
+
+    @sio.on('select_game_mode')
+    async def on_select_game_mode(sid, data):
+        if not cluster.route('select_game_mode', sid, data, code=data['code']):
+            select_game_mode(app, transport, sid, data)
+
+    @sio.on('submit_answer')
+    async def on_submit_answer(sid, data):
+        if not cluster.route('submit_answer', sid, data):
+            submit_answer(app, transport, sid, data)
+
+    @sio.on('audio_finished')
+    async def on_audio_finished(sid, data):
+        if not cluster.route('audio_finished', sid, data):
+            audio_finished(app, transport, sid, data)
@@ -1,115 +1,107 @@
 from flask import request
-from flask_socketio import emit, join_room
 import uuid
 from datetime import datetime
-from models import db, Lobby, Player, SocketSession
-from utils.helpers import generate_code
-
-def register_lobby_handlers(socketio):
-    """Register lobby-related socket handlers"""
-
-    @socketio.on('create_lobby')
-    def on_create_lobby(data):
-        sid = request.sid
-        code = generate_code()
-
-        # Generate or use existing session ID
-        session_id = data.get('sessionId') or str(uuid.uuid4())
-
-        # Create lobby in database
-        lobby = Lobby(
-            code=code,
-            host_session_id=session_id,
-            status='waiting',
-            current_question_index=0
-        )
-        db.session.add(lobby)
-
-        # Create socket session mapping
-        socket_session = SocketSession(
-            socket_id=sid,
-            session_id=session_id,
-            lobby_code=code,
-            role='host'
-        )
-        db.session.add(socket_session)
-
-        db.session.commit()
-        join_room(code)
-
-        print(f"Lobby created: {code} by session {session_id}")
-        emit('lobby_created', {'code': code, 'sessionId': session_id})
-
-    @socketio.on('rejoin_host')
-    def on_rejoin_host(data):
-        sid = request.sid
-        code = data['code'].upper()
-        session_id = data.get('sessionId')
-
-        # Verify lobby exists and user is the host
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
-
-        if lobby.host_session_id != session_id:
-            return emit('error', {'message': 'Not authorized as host'})
-
-        # Create socket session mapping for host
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if socket_session:
-            socket_session.session_id = session_id
-            socket_session.lobby_code = code
-            socket_session.role = 'host'
-        else:
-            socket_session = SocketSession(
-                socket_id=sid,
-                session_id=session_id,
-                lobby_code=code,
-                role='host'
-            )
-            db.session.add(socket_session)
-
-        db.session.commit()
-        join_room(code)
-
-        print(f"Host reconnected to lobby {code}")
-
-        # Send updated player list to host
-        players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=code).all()]
-        emit('players_updated', {'players': players_list})
-
-    @socketio.on('join_lobby')
-    def on_join_lobby(data):
-        sid = request.sid
-        code = data['code'].upper()
-        name = data['name']
-
-        # Generate or use existing session ID
-        session_id = data.get('sessionId') or str(uuid.uuid4())
-
-        # Check if lobby exists
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
-
+from services.lobby_state import registry, drop_lobby, LobbyState, PlayerState
+from services.persistence import write_behind
+from services.cluster import cluster
+from services.code_pool import code_pool
+from services.resume import build_resume
+from services.game_service import answer_progress
+from services.metrics import track_event
+from services.log import get_logger
+
+log = get_logger('lobby')
+
+@track_event
+def create_lobby(transport, sid, data):
+    code = code_pool.reserve()
+    if code is None:
+        return transport.emit('error', {'message': 'No lobby codes available'}, to=sid)
+
+    # Generate or use existing session ID
+    session_id = data.get('sessionId') or str(uuid.uuid4())
+
+    # Create lobby in memory (persisted by the write-behind flusher)
+    lobby = LobbyState(
+        code=code,
+        host_session_id=session_id,
+        status='waiting',
+        current_question_index=0
+    )
+    registry.add(lobby)
+    write_behind.mark_lobby(code)
+
+    # Create socket session mapping
+    socket_session = registry.bind_socket(sid, session_id, code, 'host')
+    write_behind.save_socket(socket_session)
+
+    transport.enter_room(sid, code)
+
+    log.info('lobby_created', f"Lobby created: {code} by session {session_id}", lobby=code, sid=sid)
+    transport.emit('lobby_created', {'code': code, 'sessionId': session_id}, to=sid)
+
+@track_event
+def rejoin_host(transport, sid, data):
+    code = data['code'].upper()
+    session_id = data.get('sessionId')
+
+    # Verify lobby exists and user is the host
+    lobby = registry.load(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    if lobby.host_session_id != session_id:
+        return transport.emit('error', {'message': 'Not authorized as host'}, to=sid)
+
+    # Create socket session mapping for host
+    socket_session = registry.bind_socket(sid, session_id, code, 'host')
+    write_behind.save_socket(socket_session)
+
+    transport.enter_room(sid, code)
+
+    log.info('host_rejoined', f"Host reconnected to lobby {code}", lobby=code, sid=sid)
+
+    # Send updated player list to host
+    with lobby.lock:
+        snapshot = lobby.roster_snapshot()
+    transport.emit('players_updated', snapshot, to=sid)
+
+    # Rejoining mid-game: the same snapshot /api/reconnect serves
+    if lobby.status != 'waiting':
+        transport.emit('resume_state', build_resume(lobby, session_id), to=sid)
+
+@track_event
+def join_lobby(transport, sid, data):
+    code = data['code'].upper()
+    name = data['name']
+
+    # Generate or use existing session ID
+    session_id = data.get('sessionId') or str(uuid.uuid4())
+
+    # Check if lobby exists
+    lobby = registry.load(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    # Remove this session from any other live lobby; the upsert moves the row
+    old_lobby = registry.find_player_lobby(session_id)
+    if old_lobby is not None and old_lobby is not lobby:
+        with old_lobby.lock:
+            old_lobby.remove_player(session_id)
+
+    with lobby.lock:
         # Check if player already exists (reconnection case)
-        player = Player.query.filter_by(session_id=session_id, lobby_code=code).first()
+        player = lobby.players.get(session_id)
 
         if player:
             # Reconnecting player - keep their existing name, don't modify it
-            player.is_connected = True
+            lobby.set_connected(player, True)
             player.last_seen_at = datetime.utcnow()
             name = player.display_name  # Use existing name
+            roster_patch = lobby.roster_patch(changed=[player])
         else:
-            # Delete any existing player with this session_id from other lobbies
-            old_player = Player.query.filter_by(session_id=session_id).first()
-            if old_player:
-                db.session.delete(old_player)
-                db.session.flush()  # Flush the delete before adding new player
-
             # New player - check for duplicate names
-            existing_players = Player.query.filter_by(lobby_code=code).all()
-            names = [p.display_name for p in existing_players]
+            names = {p.display_name for p in lobby.players.values()}
             original_name = name
             counter = 2
             while name in names:
@@ -117,112 +109,207 @@ def register_lobby_handlers(socketio):
                 counter += 1
 
             # Create new player
-            player = Player(
-                session_id=session_id,
-                lobby_code=code,
-                display_name=name,
-                score=0,
-                is_connected=True
-            )
-            db.session.add(player)
-
-        # Create socket session mapping
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if socket_session:
-            socket_session.session_id = session_id
-            socket_session.lobby_code = code
-            socket_session.role = 'player'
-        else:
-            socket_session = SocketSession(
-                socket_id=sid,
-                session_id=session_id,
-                lobby_code=code,
-                role='player'
-            )
-            db.session.add(socket_session)
+            player = PlayerState(session_id=session_id, display_name=name)
+            lobby.add_player(player)
+            roster_patch = lobby.roster_patch(added=[player])
 
-        db.session.commit()
-        join_room(code)
+        snapshot = lobby.roster_snapshot()
 
-        print(f"Player {name} joined {code}")
+    write_behind.mark_player(code, session_id)
 
-        emit('lobby_joined', {'code': code, 'sessionId': session_id, 'name': name})
+    # Create socket session mapping
+    socket_session = registry.bind_socket(sid, session_id, code, 'player')
+    write_behind.save_socket(socket_session)
 
-        # Broadcast updated player list
-        players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=code).all()]
-        socketio.emit('players_updated', {'players': players_list}, room=code)
+    transport.enter_room(sid, code)
 
-    @socketio.on('leave_lobby')
-    def on_leave_lobby(data):
-        sid = request.sid
+    log.info('player_joined', f"Player {name} joined {code}", lobby=code, sid=sid)
 
-        # Find socket session
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session:
-            return emit('error', {'message': 'Session not found'})
+    transport.emit('lobby_joined', {'code': code, 'sessionId': session_id, 'name': name}, to=sid)
 
-        code = socket_session.lobby_code
-        session_id = socket_session.session_id
+    # Full roster for the joining player, just the change for everyone else
+    transport.emit('players_updated', snapshot, to=sid)
+    transport.emit('players_patch', roster_patch, room=code, skip_sid=sid)
 
-        # Remove player from database
-        player = Player.query.filter_by(session_id=session_id, lobby_code=code).first()
-        if player:
-            player_name = player.display_name
-            db.session.delete(player)
-            db.session.commit()
-            print(f"Player {player_name} left lobby {code}")
+    # Joining mid-game: the same snapshot /api/reconnect serves
+    if lobby.status != 'waiting':
+        transport.emit('resume_state', build_resume(lobby, session_id), to=sid)
 
-            # Broadcast updated player list
-            players_list = [p.to_dict() for p in Player.query.filter_by(lobby_code=code).all()]
-            socketio.emit('players_updated', {'players': players_list}, room=code)
+@track_event
+def leave_lobby(app, transport, sid, data):
+    # Find socket session
+    socket_session = registry.unbind_socket(sid)
+    if not socket_session:
+        return transport.emit('error', {'message': 'Session not found'}, to=sid)
 
-        # Remove socket session
-        db.session.delete(socket_session)
-        db.session.commit()
+    code = socket_session.lobby_code
+    session_id = socket_session.session_id
 
-        # Confirm to the player
-        emit('lobby_left', {'success': True})
+    # Remove player from the lobby
+    lobby = registry.get(code)
+    player = None
+    if lobby:
+        with lobby.lock:
+            player = lobby.remove_player(session_id)
+            if player:
+                roster_patch = lobby.roster_patch(removed=[session_id])
 
-    @socketio.on('disband_lobby')
-    def on_disband_lobby(data):
-        sid = request.sid
-        code = data['code']
+    if player:
+        write_behind.remove_player(code, session_id)
+        log.info('player_left', f"Player {player.display_name} left lobby {code}", lobby=code, sid=sid)
 
-        # Verify lobby exists
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
+        # Broadcast updated player list
+        transport.emit('players_patch', roster_patch, room=code)
 
-        # Verify user is the host
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session or socket_session.session_id != lobby.host_session_id:
-            return emit('error', {'message': 'Only host can disband lobby'})
+        # The question may have been waiting only for this player
+        answer_progress(app, transport, code)
 
-        print(f"Lobby {code} disbanded by host")
+    # Remove socket session
+    write_behind.remove_socket(sid)
+    transport.leave_room(sid, code)
 
-        # Notify all clients in the lobby
-        socketio.emit('lobby_disbanded', {'message': 'Host disbanded the lobby'}, room=code)
+    # Confirm to the player
+    transport.emit('lobby_left', {'success': True}, to=sid)
 
-        # Delete lobby (cascade will delete players and socket sessions)
-        db.session.delete(lobby)
-        db.session.commit()
+@track_event
+def disband_lobby(transport, sid, data):
+    code = data['code']
 
-    @socketio.on('start_game')
-    def on_start_game(data):
-        sid = request.sid
-        code = data['code']
+    # Verify lobby exists
+    lobby = registry.get(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    # Verify user is the host
+    socket_session = registry.socket(sid)
+    if not socket_session or socket_session.session_id != lobby.host_session_id:
+        return transport.emit('error', {'message': 'Only host can disband lobby'}, to=sid)
+
+    log.info('lobby_disbanded', f"Lobby {code} disbanded by host", lobby=code, sid=sid)
+
+    # Notify all clients in the lobby
+    transport.emit('lobby_disbanded', {'message': 'Host disbanded the lobby'}, room=code)
+
+    # Delete lobby (players, socket sessions and answers go with it)
+    drop_lobby(code, transport)
 
-        lobby = Lobby.query.filter_by(code=code).first()
-        if not lobby:
-            return emit('error', {'message': 'Lobby not found'})
+@track_event
+def start_game(transport, sid, data):
+    code = data['code']
 
-        # Check if the socket belongs to the host
-        socket_session = SocketSession.query.filter_by(socket_id=sid).first()
-        if not socket_session or socket_session.session_id != lobby.host_session_id:
-            return emit('error', {'message': 'Only host can start'})
+    lobby = registry.get(code)
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
 
+    # Check if the socket belongs to the host
+    socket_session = registry.socket(sid)
+    if not socket_session or socket_session.session_id != lobby.host_session_id:
+        return transport.emit('error', {'message': 'Only host can start'}, to=sid)
+
+    with lobby.lock:
         lobby.status = 'mode_selection'
-        db.session.commit()
+    write_behind.mark_lobby(code)
+
+    log.info('game_starting', f"Game starting in {code} - entering mode selection", lobby=code, sid=sid)
+    transport.emit('mode_selection_started', {}, room=code)
+
+@track_event
+def sync_players(transport, sid, data):
+    """Resend the full roster, e.g. after the client saw a players_patch sequence gap"""
+    socket_session = registry.socket(sid)
+    lobby = registry.get(socket_session.lobby_code) if socket_session else None
+    if not lobby:
+        return transport.emit('error', {'message': 'Lobby not found'}, to=sid)
+
+    with lobby.lock:
+        snapshot = lobby.roster_snapshot()
+    transport.emit('players_updated', snapshot, to=sid)
+
+def register_cluster_handlers(app, transport):
+    """Run lobby events forwarded from other workers"""
+    cluster.add_handler('rejoin_host', lambda sid, data: rejoin_host(transport, sid, data))
+    cluster.add_handler('join_lobby', lambda sid, data: join_lobby(transport, sid, data))
+    cluster.add_handler('leave_lobby', lambda sid, data: leave_lobby(app, transport, sid, data))
+    cluster.add_handler('disband_lobby', lambda sid, data: disband_lobby(transport, sid, data))
+    cluster.add_handler('start_game', lambda sid, data: start_game(transport, sid, data))
+    cluster.add_handler('sync_players', lambda sid, data: sync_players(transport, sid, data))
+
+def register_lobby_handlers(app, socketio, transport):
+    """Register lobby-related socket handlers"""
+    register_cluster_handlers(app, transport)
+
+    # Lobbies are created on the worker the host is connected to
+    @socketio.on('create_lobby')
+    def on_create_lobby(data):
+        create_lobby(transport, request.sid, data)
+
+    # Everything else runs on the worker that owns the lobby
+    @socketio.on('rejoin_host')
+    def on_rejoin_host(data):
+        if not cluster.route('rejoin_host', request.sid, data, code=data['code'].upper()):
+            rejoin_host(transport, request.sid, data)
 
-        print(f"Game starting in {code} - entering mode selection")
-        socketio.emit('mode_selection_started', {}, room=code)
+    @socketio.on('join_lobby')
+    def on_join_lobby(data):
+        if not cluster.route('join_lobby', request.sid, data, code=data['code'].upper()):
+            join_lobby(transport, request.sid, data)
+
+    @socketio.on('leave_lobby')
+    def on_leave_lobby(data):
+        if not cluster.route('leave_lobby', request.sid, data):
+            leave_lobby(app, transport, request.sid, data)
+
+    @socketio.on('disband_lobby')
+    def on_disband_lobby(data):
+        if not cluster.route('disband_lobby', request.sid, data, code=data['code']):
+            disband_lobby(transport, request.sid, data)
+
+    @socketio.on('start_game')
+    def on_start_game(data):
+        if not cluster.route('start_game', request.sid, data, code=data['code']):
+            start_game(transport, request.sid, data)
+
+    @socketio.on('sync_players')
+    def on_sync_players(data):
+        if not cluster.route('sync_players', request.sid, data):
+            sync_players(transport, request.sid, data)
+
+def register_async_lobby_handlers(app, sio, transport, async_db):
+    """Register lobby-related handlers on an asyncio server"""
+    register_cluster_handlers(app, transport)
+
+    # These may hit the database (code allocation, loading a lobby after a restart)
+    @sio.on('create_lobby')
+    async def on_create_lobby(sid, data):
+        await async_db.run(create_lobby, transport, sid, data)
+
+    @sio.on('rejoin_host')
+    async def on_rejoin_host(sid, data):
+        if not cluster.route('rejoin_host', sid, data, code=data['code'].upper()):
+            await async_db.run(rejoin_host, transport, sid, data)
+
+    @sio.on('join_lobby')
+    async def on_join_lobby(sid, data):
+        if not cluster.route('join_lobby', sid, data, code=data['code'].upper()):
+            await async_db.run(join_lobby, transport, sid, data)
+
+    # The rest only touch in-memory state
+    @sio.on('leave_lobby')
+    async def on_leave_lobby(sid, data):
+        if not cluster.route('leave_lobby', sid, data):
+            leave_lobby(app, transport, sid, data)
+
+    @sio.on('disband_lobby')
+    async def on_disband_lobby(sid, data):
+        if not cluster.route('disband_lobby', sid, data, code=data['code']):
+            disband_lobby(transport, sid, data)
+
+    @sio.on('start_game')
+    async def on_start_game(sid, data):
+        if not cluster.route('start_game', sid, data, code=data['code']):
+            start_game(transport, sid, data)
+
+    @sio.on('sync_players')
+    async def on_sync_players(sid, data):
+        if not cluster.route('sync_players', sid, data):
+            sync_players(transport, sid, data)
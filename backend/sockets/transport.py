@@ -0,0 +1,91 @@
+"""
+Server-agnostic emit and room interface.
+
+Handler logic and game_service talk to one of these instead of a specific
+Socket.IO server, so the same code runs under the threading server and the
+asyncio (ASGI) server. Both are safe to call from any thread. Both send each
+socket its negotiated wire format (see services.wire).
+"""
+import asyncio
+from services.log import get_logger
+from services.wire import wire, COMPACT_ROOM
+
+log = get_logger('transport')
+
+
+class ThreadingTransport:
+    """Transport for the Flask-SocketIO threading server"""
+
+    def __init__(self, socketio):
+        self.socketio = socketio
+
+    def emit(self, event, data, room=None, to=None, skip_sid=None):
+        for payload, target, skip in wire.split(event, data, to or room, skip_sid):
+            self.socketio.emit(event, payload, to=target, skip_sid=skip)
+
+    def enter_room(self, sid, room):
+        self.socketio.server.enter_room(sid, room, namespace='/')
+        if wire.enter_room(sid, room):
+            self.socketio.server.enter_room(sid, room + COMPACT_ROOM, namespace='/')
+
+    def leave_room(self, sid, room):
+        self.socketio.server.leave_room(sid, room, namespace='/')
+        if wire.leave_room(sid, room):
+            self.socketio.server.leave_room(sid, room + COMPACT_ROOM, namespace='/')
+
+
+class AsyncTransport:
+    """
+    Transport for a python-socketio AsyncServer.
+    Calls are queued and sent in order by one task on the event loop, so
+    callers on scheduler or DB threads never block on the network.
+    """
+
+    def __init__(self, sio):
+        self.sio = sio
+        self._loop = None
+        self._outbox = None
+
+    async def start(self):
+        """Bind to the running event loop and start the sender task"""
+        self._loop = asyncio.get_running_loop()
+        self._outbox = asyncio.Queue()
+        self._loop.create_task(self._sender())
+
+    def _put(self, item):
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._outbox.put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(self._outbox.put_nowait, item)
+
+    def emit(self, event, data, room=None, to=None, skip_sid=None):
+        for payload, target, skip in wire.split(event, data, to or room, skip_sid):
+            self._put(('emit', event, payload, target, skip))
+
+    def enter_room(self, sid, room):
+        self._put(('enter_room', sid, room))
+        if wire.enter_room(sid, room):
+            self._put(('enter_room', sid, room + COMPACT_ROOM))
+
+    def leave_room(self, sid, room):
+        self._put(('leave_room', sid, room))
+        if wire.leave_room(sid, room):
+            self._put(('leave_room', sid, room + COMPACT_ROOM))
+
+    async def _sender(self):
+        while True:
+            action, *args = await self._outbox.get()
+            try:
+                if action == 'emit':
+                    event, data, to, skip_sid = args
+                    await self.sio.emit(event, data, to=to, skip_sid=skip_sid)
+                elif action == 'enter_room':
+                    await self.sio.enter_room(*args)
+                else:
+                    await self.sio.leave_room(*args)
+            except Exception as e:
+                log.exception('send_failed', f"Error sending {action}: {e}")
@@ -0,0 +1,72 @@
+"""Lobby ownership, event forwarding and shared room emits over MemoryBus"""
+import queue
+import time
+import socketio
+from flask import Flask
+from services.cluster import Cluster, MemoryBus, BusManager
+
+CODES = [f'{a}{b}{c}{d}' for a in 'ABCD' for b in 'EFGH' for c in 'JKLM' for d in 'NPQR']
+
+
+def make_cluster(index, count, bus):
+    worker = Cluster(index=index, count=count, url='memory://')
+    worker.bus = bus
+    return worker
+
+
+def test_every_code_has_exactly_one_owner():
+    bus = MemoryBus()
+    workers = [make_cluster(i, 3, bus) for i in range(3)]
+    for code in CODES:
+        owners = [w.index for w in workers if w.is_owner(code)]
+        assert owners == [workers[0].owner_of(code)]
+    # Spread over every worker
+    assert {workers[0].owner_of(code) for code in CODES} == {0, 1, 2}
+
+
+def test_single_worker_owns_everything():
+    worker = Cluster(index=0, count=1, url='memory://')
+    assert all(worker.is_owner(code) for code in CODES)
+    assert worker.route('submit_answer', 'sid', {}, code=CODES[0]) is False
+
+
+def test_route_forwards_to_owner():
+    bus = MemoryBus()
+    workers = [make_cluster(i, 2, bus) for i in range(2)]
+    code = next(c for c in CODES if workers[0].owner_of(c) == 1)
+    received = queue.Queue()
+    workers[1].add_handler('submit_answer', lambda sid, data: received.put((sid, data)))
+    workers[1].start(Flask(__name__))
+
+    # The owner handles it itself
+    assert workers[1].route('submit_answer', 'sid-1', {'answer_index': 0}, code=code) is False
+    # Anyone else forwards it, and later events from the socket follow the same lobby
+    assert workers[0].route('submit_answer', 'sid-0', {'answer_index': 2}, code=code) is True
+    assert workers[0].route('submit_answer', 'sid-0', {'answer_index': 3}) is True
+    assert received.get(timeout=2) == ('sid-0', {'answer_index': 2})
+    assert received.get(timeout=2) == ('sid-0', {'answer_index': 3})
+
+    workers[0].forget('sid-0')
+    assert workers[0].route('submit_answer', 'sid-0', {}) is False
+
+
+def test_bus_manager_shares_room_emits():
+    bus = MemoryBus()
+    sender = socketio.Server(async_mode='threading', client_manager=BusManager(bus))
+    receiver = socketio.Server(async_mode='threading', client_manager=BusManager(bus))
+    for server in (sender, receiver):
+        server.manager.initialize()
+    # Each manager subscribes from its own listener thread
+    deadline = time.monotonic() + 2
+    while len(bus._subscribers['socketio']) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    sent = queue.Queue()
+    receiver._send_eio_packet = lambda eio_sid, pkt: sent.put((eio_sid, pkt.data))
+    sid = receiver.manager.connect('eio-1', '/')
+    receiver.manager.enter_room(sid, '/', 'ABCD')
+
+    sender.emit('game_ended', {'winner': None}, room='ABCD')
+    eio_sid, data = sent.get(timeout=2)
+    assert eio_sid == 'eio-1'
+    assert data == '2["game_ended",{"winner":null}]'
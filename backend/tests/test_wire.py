@@ -0,0 +1,14 @@
+"""The frontend's copy of the compact wire field table"""
+import os
+import re
+from services.wire import FIELDS
+
+WIRE_FIELDS_JS = os.path.join(os.path.dirname(__file__), '..', '..', 'frontend', 'src', 'api', 'wireFields.js')
+
+
+def test_frontend_fields_match_server():
+    # Regenerate with local_utility/build_wire_fields.py
+    with open(WIRE_FIELDS_JS, encoding='utf-8') as f:
+        source = f.read()
+    table = source[source.index('['):source.rindex(']')]
+    assert tuple(re.findall(r"'([^']*)'", table)) == FIELDS
@@ -55,7 +55,9 @@ function App() {
   const [correctAnswer, setCorrectAnswer] = useState(null);
   const [answerStats, setAnswerStats] = useState([]);
   const [pointsEarned, setPointsEarned] = useState(0);
+  const [answerProgress, setAnswerProgress] = useState(null); // { answered, connected, counts }
   const [myScore, setMyScore] = useState(0);
+  const [myRank, setMyRank] = useState(null); // { rank, delta, total }
   const [finalScores, setFinalScores] = useState([]);
   const [winner, setWinner] = useState(null);
 
@@ -144,6 +146,8 @@ function App() {
               setPlayerId(storedSessionId);
               joinLobby(data.lobbyCode, data.displayName, storedSessionId);
             }
+            // Redraw the game screen now rather than waiting for the next question
+            applyResume(data);
           } else {
             // Reconnection failed - lobby doesn't exist anymore
             localStorage.removeItem('lobbyCode');
@@ -275,6 +279,7 @@ function App() {
         setCorrectAnswer(null);
         setAnswerStats([]);
         setPointsEarned(0);
+        setAnswerProgress(null);
 
         const role = localStorage.getItem('role');
         if (role === 'host') {
@@ -315,17 +320,27 @@ function App() {
         selectedAnswerRef.current = data.answer_index;
         console.log('Answer submitted, index:', data.answer_index);
       },
+      onAnswerProgress: (data) => {
+        setAnswerProgress({ answered: data.answered, connected: data.connected, counts: data.counts });
+      },
       onQuestionEnded: (data) => {
+        // Everyone may have answered before the narration finished
+        if (questionAudioRef.current) {
+          questionAudioRef.current.pause();
+          questionAudioRef.current = null;
+        }
+
         console.log('Question ended data:', data);
         console.log('My selectedAnswer from ref:', selectedAnswerRef.current);
         console.log('My playerId:', playerId);
 
         setCorrectAnswer(data.correct_answer);
-        setAnswerStats(data.answer_stats);
+        setAnswerStats(revealStats(data));
 
         // Calculate points earned for this player using ref
+        // Large audiences only get counts here; my_rank brings our own points
         const myAnswerIndex = selectedAnswerRef.current;
-        const myAnswerData = myAnswerIndex !== null ? data.answer_stats[myAnswerIndex]?.players?.find(
+        const myAnswerData = myAnswerIndex !== null && data.answer_stats ? data.answer_stats[myAnswerIndex]?.players?.find(
           p => p.session_id === playerId
         ) : null;
 
@@ -367,6 +382,20 @@ function App() {
           clearInterval(timerRef.current);
         }
       },
+      onLeaderboard: (data) => {
+        // Small rooms: everyone is in the top N, so find our own entry there
+        const mine = data.top.find(p => p.session_id === playerId);
+        if (mine) {
+          setMyRank({ rank: mine.rank, delta: mine.delta, total: data.total });
+        }
+      },
+      onMyRank: (data) => {
+        setMyRank({ rank: data.rank, delta: data.delta, total: data.total });
+        setMyScore(data.score);
+        if (data.points !== undefined) {
+          setPointsEarned(data.points);
+        }
+      },
       onError: (data) => {
         setError(data.message);
       },
@@ -379,6 +408,10 @@ function App() {
         setPlayers([]);
         setDisplayName('');
         setPlayerId('');
+        setMyRank(null);
+      },
+      onResumeState: (data) => {
+        applyResume(data);
       },
       onLobbyDisbanded: (data) => {
         showToast(data.message, 'warning');
@@ -390,6 +423,7 @@ function App() {
         setPlayers([]);
         setDisplayName('');
         setPlayerId('');
+        setMyRank(null);
       }
     });
 
@@ -398,6 +432,56 @@ function App() {
     };
   }, [playerId]);
 
+  // Per-answer stats from a question_ended payload; large-audience reveals
+  // carry answer_counts instead of player lists
+  const revealStats = (reveal) => reveal.answer_stats
+    || reveal.answer_counts.map(count => ({ players: [], count }));
+
+  // Restore the current screen from a resume snapshot (/api/reconnect or resume_state)
+  const applyResume = (resume) => {
+    const isHost = resume.role === 'host';
+    const question = resume.question;
+    const answerIndex = resume.answer_index ?? null;
+
+    if (question) {
+      setCurrentQuestion(question.question);
+      setCurrentAnswers(question.answers);
+      setQuestionIndex(question.question_index);
+      setTotalQuestions(question.total_questions);
+      setTimeLimit(question.time_limit);
+      setSelectedAnswer(answerIndex);
+      selectedAnswerRef.current = answerIndex;
+    }
+    if (!isHost && resume.score !== undefined) {
+      setMyScore(resume.score);
+    }
+    if (!isHost && resume.rank) {
+      setMyRank({ rank: resume.rank, delta: 0, total: resume.players.length });
+    }
+
+    if (resume.status === 'playing' && question) {
+      setCorrectAnswer(null);
+      setAnswerStats([]);
+      if (resume.timer_started) {
+        startTimer(Math.ceil(resume.time_remaining || 0));
+      } else {
+        setTimeRemaining(question.time_limit);
+      }
+      setView(isHost ? 'host_question' : 'player_question');
+    } else if (resume.status === 'reveal' && resume.reveal) {
+      setCorrectAnswer(resume.reveal.correct_answer);
+      setAnswerStats(revealStats(resume.reveal));
+      setPointsEarned(resume.points || 0);
+      setView(isHost ? 'host_reveal' : 'player_reveal');
+    } else if (resume.status === 'results' && resume.results) {
+      setFinalScores(resume.results.final_scores);
+      setWinner(resume.results.winner);
+      setView(isHost ? 'host_results' : 'player_results');
+    } else if (resume.status === 'mode_selection') {
+      setView(isHost ? 'host_mode_select' : 'player_waiting');
+    }
+  };
+
   const startTimer = (duration) => {
     setTimeRemaining(duration);
 
@@ -779,6 +863,9 @@ function App() {
                     <div className="answer-letter">{String.fromCharCode(65 + idx)}</div>
                     <span>{answer}</span>
                   </div>
+                  {answerProgress?.counts && (
+                    <div className="answer-count">{answerProgress.counts[idx] || 0}</div>
+                  )}
                 </div>
               ))}
             </div>
@@ -786,7 +873,9 @@ function App() {
 
           <div style={{ textAlign: 'center', marginTop: '32px' }}>
             <span className="game-status-text">
-              Players are answering...
+              {answerProgress
+                ? `${answerProgress.answered}/${answerProgress.connected} answered`
+                : 'Players are answering...'}
             </span>
           </div>
         </div>
@@ -822,6 +911,7 @@ function App() {
                   <div className="answer-letter">{String.fromCharCode(65 + idx)}</div>
                   <span>{currentAnswers[idx]}</span>
                 </div>
+                {stat.count !== undefined && <div className="answer-count">{stat.count}</div>}
                 <div className="player-badges">
                   {stat.players.map((player, pIdx) => (
                     <div
@@ -905,7 +995,7 @@ function App() {
                     >
                       <div className="leaderboard-rank">
                         {isTopScore && <Crown size={20} />}
-                        #{idx + 1} {player.name}
+                        #{player.rank ?? idx + 1} {player.name}
                       </div>
                       <div className="leaderboard-score">{player.score} pts</div>
                     </div>
@@ -1115,6 +1205,13 @@ function App() {
                 <p className="text-muted" style={{ fontSize: '16px' }}>Better luck next time!</p>
               </>
             )}
+            {myRank && (
+              <p className="text-muted" style={{ fontSize: '16px', marginTop: '12px' }}>
+                <strong>#{myRank.rank}</strong> of {myRank.total}
+                {myRank.delta > 0 && <span style={{ color: 'var(--success)' }}> ▲{myRank.delta}</span>}
+                {myRank.delta < 0 && <span style={{ color: '#ef4444' }}> ▼{-myRank.delta}</span>}
+              </p>
+            )}
           </div>
 
           <div style={{ flex: '0 0 auto' }}>
@@ -1129,10 +1226,11 @@ function App() {
 
   // PLAYER RESULTS VIEW
   if (view === 'player_results') {
-    const myRank = finalScores.findIndex(p => p.session_id === playerId) + 1;
+    // Large rooms only list the top N; my_rank carries everyone else's place
+    const myPlayer = finalScores.find(p => p.session_id === playerId);
+    const myPlace = myPlayer ? myPlayer.rank : myRank?.rank;
     // Check if player is a winner (tied for first place)
     const topScore = finalScores.length > 0 ? finalScores[0].score : 0;
-    const myPlayer = finalScores.find(p => p.session_id === playerId);
     const isWinner = myPlayer && myPlayer.score === topScore;
 
     return renderWithNotifications(
@@ -1155,7 +1253,7 @@ function App() {
           )}
 
           <div className="text-center" style={{ margin: '20px 0' }}>
-            <p className="text-muted" style={{ fontSize: '16px' }}>You placed <strong style={{ color: isWinner ? '#10b981' : '#64748b' }}>#{myRank}</strong></p>
+            <p className="text-muted" style={{ fontSize: '16px' }}>You placed <strong style={{ color: isWinner ? '#10b981' : '#64748b' }}>#{myPlace}</strong></p>
             <p style={{ fontSize: '36px', margin: '8px 0', fontWeight: '900', color: isWinner ? '#10b981' : '#ef4444' }}>{myScore} pts</p>
           </div>
         </div>
@@ -1170,7 +1268,7 @@ function App() {
               >
                 <div className="leaderboard-rank">
                   {isTopScore && <Crown size={18} />}
-                  #{idx + 1} {player.name}
+                  #{player.rank ?? idx + 1} {player.name}
                 </div>
                 <div className="leaderboard-score">{player.score} pts</div>
               </div>
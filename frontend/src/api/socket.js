@@ -1,10 +1,40 @@
 import io from 'socket.io-client';
+import { decodeEvent, setFields, wantsCompact } from './wire';
 
 // Determine if we're in development mode
 const isDev = window.location.hostname === 'localhost' && window.location.port === '3000';
 
-// Create socket connection
-export const socket = io(isDev ? 'http://localhost:5000' : undefined);
+// Create socket connection, asking for the compact wire format if opted in
+export const socket = io(isDev ? 'http://localhost:5000' : undefined,
+  wantsCompact() ? { auth: { wire: 'compact' } } : {});
+
+// Local copy of the lobby roster, kept in sync by players_updated snapshots
+// and players_patch deltas
+let roster = { seq: null, players: new Map() };
+
+function rosterList() {
+  return Array.from(roster.players.values());
+}
+
+/**
+ * Apply a players_patch. Returns false if a patch was missed and a full
+ * snapshot has been requested instead.
+ * @param {Object} patch - { seq, added, changed, removed }
+ */
+function applyRosterPatch(patch) {
+  if (roster.seq !== null && patch.seq <= roster.seq) {
+    return true; // Already covered by a newer snapshot
+  }
+  if (roster.seq === null || patch.seq !== roster.seq + 1) {
+    socket.emit('sync_players', {});
+    return false;
+  }
+  (patch.added || []).forEach(p => roster.players.set(p.id, p));
+  (patch.changed || []).forEach(p => roster.players.set(p.id, p));
+  (patch.removed || []).forEach(id => roster.players.delete(id));
+  roster.seq = patch.seq;
+  return true;
+}
 
 /**
  * Initialize socket event listeners
@@ -21,13 +51,26 @@ export function initializeSocketListeners(handlers) {
     onQuestionStarted,
     onTimerStart,
     onAnswerSubmitted,
+    onAnswerProgress,
     onQuestionEnded,
     onGameEnded,
+    onLeaderboard,
+    onMyRank,
     onError,
     onLobbyLeft,
-    onLobbyDisbanded
+    onLobbyDisbanded,
+    onResumeState
   } = handlers;
 
+  // Payloads may arrive in the compact format; handlers always see JSON
+  const on = (event, fn) => socket.on(event, (data) => fn(decodeEvent(event, data, roster.players)));
+
+  // The server accepted the compact format: prefer its field table to the
+  // built-in one, in case it is newer
+  on('wire_format', (data) => {
+    setFields(data.fields);
+  });
+
   // Connection event
   socket.on('connect', () => {
     console.log('Connected to server');
@@ -35,69 +78,106 @@ export function initializeSocketListeners(handlers) {
   });
 
   // Lobby created (host)
-  socket.on('lobby_created', (data) => {
+  on('lobby_created', (data) => {
+    roster = { seq: 0, players: new Map() }; // New lobbies start empty at seq 0
     if (onLobbyCreated) onLobbyCreated(data);
   });
 
   // Lobby joined (player)
-  socket.on('lobby_joined', (data) => {
+  on('lobby_joined', (data) => {
     if (onLobbyJoined) onLobbyJoined(data);
   });
 
-  // Players list updated
-  socket.on('players_updated', (data) => {
-    if (onPlayersUpdated) onPlayersUpdated(data);
+  // Players list updated (full snapshot)
+  on('players_updated', (data) => {
+    roster = {
+      seq: data.seq ?? null,
+      players: new Map(data.players.map(p => [p.id, p]))
+    };
+    if (onPlayersUpdated) onPlayersUpdated({ players: rosterList() });
+  });
+
+  // Players list changed (delta against the last snapshot)
+  on('players_patch', (patch) => {
+    if (applyRosterPatch(patch) && onPlayersUpdated) {
+      onPlayersUpdated({ players: rosterList() });
+    }
   });
 
   // Game mode selection started
-  socket.on('mode_selection_started', () => {
+  on('mode_selection_started', () => {
     if (onModeSelectionStarted) onModeSelectionStarted();
   });
 
   // Game mode selected
-  socket.on('game_mode_selected', (data) => {
+  on('game_mode_selected', (data) => {
     if (onGameModeSelected) onGameModeSelected(data);
   });
 
   // Question started
-  socket.on('question_started', (data) => {
+  on('question_started', (data) => {
     if (onQuestionStarted) onQuestionStarted(data);
   });
 
   // Timer start (after audio completes)
-  socket.on('timer_start', (data) => {
+  on('timer_start', (data) => {
     if (onTimerStart) onTimerStart(data);
   });
 
   // Answer submitted confirmation
-  socket.on('answer_submitted', (data) => {
+  on('answer_submitted', (data) => {
     if (onAnswerSubmitted) onAnswerSubmitted(data);
   });
 
+  // Answered/connected count for the open question (host only)
+  on('answer_progress', (data) => {
+    if (onAnswerProgress) onAnswerProgress(data);
+  });
+
   // Question ended (reveal)
-  socket.on('question_ended', (data) => {
+  on('question_ended', (data) => {
     if (onQuestionEnded) onQuestionEnded(data);
   });
 
   // Game ended (final results)
-  socket.on('game_ended', (data) => {
+  on('game_ended', (data) => {
     if (onGameEnded) onGameEnded(data);
   });
 
+  // Standings after each reveal (top N with rank and places gained)
+  on('leaderboard', (data) => {
+    if (onLeaderboard) onLeaderboard(data);
+  });
+
+  // This player's own rank, sent when the room is larger than the top N
+  on('my_rank', (data) => {
+    if (onMyRank) onMyRank(data);
+  });
+
   // Error event
-  socket.on('error', (data) => {
+  on('error', (data) => {
     if (onError) onError(data);
   });
 
   // Lobby left
-  socket.on('lobby_left', () => {
+  on('lobby_left', () => {
     if (onLobbyLeft) onLobbyLeft();
   });
 
   // Lobby disbanded by host
-  socket.on('lobby_disbanded', (data) => {
+  on('lobby_disbanded', (data) => {
     if (onLobbyDisbanded) onLobbyDisbanded(data);
   });
+
+  // Full game state after rejoining a lobby mid-game
+  on('resume_state', (data) => {
+    roster = {
+      seq: data.seq ?? null,
+      players: new Map(data.players.map(p => [p.id, p]))
+    };
+    if (onPlayersUpdated) onPlayersUpdated({ players: rosterList() });
+    if (onResumeState) onResumeState(data);
+  });
 }
 
 /**
@@ -105,18 +185,24 @@ export function initializeSocketListeners(handlers) {
  */
 export function cleanupSocketListeners() {
   socket.off('connect');
+  socket.off('wire_format');
   socket.off('lobby_created');
   socket.off('lobby_joined');
   socket.off('players_updated');
+  socket.off('players_patch');
   socket.off('mode_selection_started');
   socket.off('game_mode_selected');
   socket.off('question_started');
   socket.off('answer_submitted');
+  socket.off('answer_progress');
   socket.off('question_ended');
   socket.off('game_ended');
+  socket.off('leaderboard');
+  socket.off('my_rank');
   socket.off('error');
   socket.off('lobby_left');
   socket.off('lobby_disbanded');
+  socket.off('resume_state');
 }
 
 /**
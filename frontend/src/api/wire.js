@@ -0,0 +1,158 @@
+/**
+ * Compact wire format (see backend services/wire.py).
+ *
+ * Sockets that connect with auth { wire: 'compact' } receive events as a
+ * single msgpack binary argument: dict keys are indexes into the field table
+ * (FIELDS, generated from the server's, see wireFields.js), UUID session
+ * ids are ext type 1 (16 bytes), and player names are left out of
+ * question_ended and leaderboard. decodeEvent turns that back into the JSON
+ * shape; JSON payloads pass through untouched. The server also sends its
+ * table in a wire_format event at connect; since the table is append only,
+ * that one replaces the built-in copy whenever it arrives.
+ */
+import { FIELDS } from './wireFields';
+
+const UUID_EXT = 1;
+
+// Opt in with ?wire=compact or localStorage.wire = 'compact'
+export function wantsCompact() {
+  const param = new URLSearchParams(window.location.search).get('wire');
+  return (param || localStorage.getItem('wire')) === 'compact';
+}
+
+let fields = FIELDS;
+
+export function setFields(table) {
+  fields = table;
+}
+
+function hex(bytes) {
+  let out = '';
+  for (let i = 0; i < bytes.length; i++) {
+    out += bytes[i].toString(16).padStart(2, '0');
+  }
+  return out;
+}
+
+function uuidString(bytes) {
+  const h = hex(bytes);
+  return `${h.slice(0, 8)}-${h.slice(8, 12)}-${h.slice(12, 16)}-${h.slice(16, 20)}-${h.slice(20)}`;
+}
+
+const textDecoder = new TextDecoder();
+
+/**
+ * Decode the msgpack subset the server's packer produces
+ * @param {Uint8Array} bytes
+ */
+function unpack(bytes) {
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  let pos = 0;
+
+  const str = (length) => {
+    const value = textDecoder.decode(bytes.subarray(pos, pos + length));
+    pos += length;
+    return value;
+  };
+  const bin = (length) => {
+    const value = bytes.slice(pos, pos + length);
+    pos += length;
+    return value;
+  };
+  const array = (length) => {
+    const value = new Array(length);
+    for (let i = 0; i < length; i++) value[i] = read();
+    return value;
+  };
+  const map = (length) => {
+    const value = {};
+    for (let i = 0; i < length; i++) {
+      const key = read();
+      value[typeof key === 'number' && key < fields.length ? fields[key] : key] = read();
+    }
+    return value;
+  };
+  const ext = (length) => {
+    const type = view.getInt8(pos);
+    pos += 1;
+    const data = bin(length);
+    return type === UUID_EXT ? uuidString(data) : data;
+  };
+
+  function read() {
+    const byte = bytes[pos++];
+    if (byte < 0x80) return byte;
+    if (byte < 0x90) return map(byte & 0x0f);
+    if (byte < 0xa0) return array(byte & 0x0f);
+    if (byte < 0xc0) return str(byte & 0x1f);
+    if (byte >= 0xe0) return byte - 0x100;
+
+    let value;
+    switch (byte) {
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: pos += 1; return bin(bytes[pos - 1]);
+      case 0xca: value = view.getFloat32(pos); pos += 4; return value;
+      case 0xcb: value = view.getFloat64(pos); pos += 8; return value;
+      case 0xcc: value = view.getUint8(pos); pos += 1; return value;
+      case 0xcd: value = view.getUint16(pos); pos += 2; return value;
+      case 0xce: value = view.getUint32(pos); pos += 4; return value;
+      case 0xcf: value = Number(view.getBigUint64(pos)); pos += 8; return value;
+      case 0xd0: value = view.getInt8(pos); pos += 1; return value;
+      case 0xd1: value = view.getInt16(pos); pos += 2; return value;
+      case 0xd2: value = view.getInt32(pos); pos += 4; return value;
+      case 0xd3: value = Number(view.getBigInt64(pos)); pos += 8; return value;
+      case 0xd4: return ext(1);
+      case 0xd5: return ext(2);
+      case 0xd6: return ext(4);
+      case 0xd7: return ext(8);
+      case 0xd8: return ext(16);
+      default: break;
+    }
+
+    // Variable lengths: read the length, then the body
+    const sized = {
+      0xc5: [2, bin], 0xc6: [4, bin],
+      0xc7: [1, ext], 0xc8: [2, ext], 0xc9: [4, ext],
+      0xd9: [1, str], 0xda: [2, str], 0xdb: [4, str],
+      0xdc: [2, array], 0xdd: [4, array],
+      0xde: [2, map], 0xdf: [4, map]
+    }[byte];
+    if (!sized) throw new Error(`Unsupported msgpack byte 0x${byte.toString(16)}`);
+    const [size, body] = sized;
+    const length = size === 1 ? view.getUint8(pos) : size === 2 ? view.getUint16(pos) : view.getUint32(pos);
+    pos += size;
+    return body(length);
+  }
+
+  return read();
+}
+
+/**
+ * Event payload in the JSON shape, whichever format it arrived in
+ * @param {string} event - Event name
+ * @param {*} data - JSON payload, or an ArrayBuffer/Uint8Array in the compact format
+ * @param {Map} players - Roster by id, to restore left-out names
+ */
+export function decodeEvent(event, data, players) {
+  if (!(data instanceof ArrayBuffer || ArrayBuffer.isView(data))) {
+    return data;
+  }
+  const bytes = data instanceof ArrayBuffer ? new Uint8Array(data) : new Uint8Array(data.buffer, data.byteOffset, data.byteLength);
+  const decoded = unpack(bytes);
+
+  const nameOf = (id) => players.get(id)?.name || '?';
+  if (event === 'question_ended') {
+    // Large rooms get the summary form, answer_counts without answer_stats
+    if (decoded.answer_stats) {
+      decoded.answer_stats.forEach(stat => stat.players.forEach(p => {
+        p.name = nameOf(p.session_id);
+        p.initial = p.name[0].toUpperCase();
+      }));
+    }
+  } else if (event === 'leaderboard') {
+    decoded.top.forEach(p => { p.name = nameOf(p.session_id); });
+  }
+  return decoded;
+}
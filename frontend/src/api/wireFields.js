@@ -0,0 +1,50 @@
+// Generated by local_utility/build_wire_fields.py from backend/services/wire.py.
+// Do not edit; append to FIELDS there and re-run the script.
+export const FIELDS = [
+  'question_index',
+  'question',
+  'answers',
+  'time_limit',
+  'total_questions',
+  'audio',
+  'correct_answer',
+  'answer_stats',
+  'players',
+  'name',
+  'initial',
+  'points',
+  'session_id',
+  'id',
+  'score',
+  'connected',
+  'seq',
+  'added',
+  'changed',
+  'removed',
+  'top',
+  'rank',
+  'delta',
+  'total',
+  'final_scores',
+  'winner',
+  'final',
+  'answered',
+  'counts',
+  'message',
+  'success',
+  'code',
+  'sessionId',
+  'mode',
+  'mode_name',
+  'lobbyCode',
+  'status',
+  'role',
+  'displayName',
+  'version',
+  'timer_started',
+  'reveal',
+  'results',
+  'time_remaining',
+  'answer_index',
+  'answer_counts',
+];
@@ -0,0 +1,45 @@
+"""
+Build the audio duration manifest the backend schedules answer timers from.
+
+Parses every MP3 under frontend/public/audio/questions and writes
+backend/audio_manifest.json, mapping each file's public URL (the value
+question packs use for "audio") to its duration in seconds and content
+hash. Re-run after adding or re-voicing question audio.
+
+    python build_audio_manifest.py
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import mp3_info
+
+ROOT = Path(__file__).resolve().parent.parent
+AUDIO_DIR = ROOT / "frontend" / "public" / "audio" / "questions"
+PUBLIC_DIR = ROOT / "frontend" / "public"
+OUTPUT_FILE = ROOT / "backend" / "audio_manifest.json"
+
+
+def main():
+    files = {}
+    for path in sorted(AUDIO_DIR.glob("*.mp3")):
+        with open(path, "rb") as f:
+            data = f.read()
+        url = "/" + path.relative_to(PUBLIC_DIR).as_posix()
+        files[url] = {
+            "duration": round(mp3_info.duration(data), 3),
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+
+    tmp = OUTPUT_FILE.with_name(OUTPUT_FILE.name + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"files": files}, f, indent=2)
+        f.write("\n")
+    os.replace(tmp, OUTPUT_FILE)
+    print(f"✓ Wrote durations for {len(files)} files to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Build the compact wire format's field table for the frontend.
+
+Reads FIELDS from backend/services/wire.py and writes
+frontend/src/api/wireFields.js, so clients can decode compact payloads
+without waiting for the server's wire_format event. Re-run after
+appending to FIELDS; backend/tests/test_wire.py fails while the two differ.
+
+    python build_wire_fields.py
+"""
+
+import ast
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+WIRE_FILE = ROOT / "backend" / "services" / "wire.py"
+OUTPUT_FILE = ROOT / "frontend" / "src" / "api" / "wireFields.js"
+
+
+def read_fields():
+    """FIELDS as written in wire.py, without importing the backend"""
+    tree = ast.parse(WIRE_FILE.read_text(encoding="utf-8"))
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(t, "id", None) == "FIELDS" for t in node.targets):
+            return ast.literal_eval(node.value)
+    raise ValueError(f"No FIELDS in {WIRE_FILE}")
+
+
+def main():
+    fields = read_fields()
+    lines = [
+        "// Generated by local_utility/build_wire_fields.py from backend/services/wire.py.",
+        "// Do not edit; append to FIELDS there and re-run the script.",
+        "export const FIELDS = [",
+        *(f"  '{name}'," for name in fields),
+        "];",
+        ""
+    ]
+    OUTPUT_FILE.write_text("\n".join(lines), encoding="utf-8")
+    print(f"✓ Wrote {len(fields)} fields to {OUTPUT_FILE}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,112 +1,243 @@
 """
 Generate audio narration for trivia questions using ElevenLabs API
 Reads questions from questions_ffa.json and creates MP3 files with Santa's voice
+
+Questions are voiced in parallel by a bounded thread pool, with retries and
+exponential backoff on rate limits and server errors. Every generated clip
+is cached under question_audio/.cache by a hash of (text, voice, model,
+format), so re-running only pays for questions whose text or voice changed.
+question_audio/manifest.json lists each file with its content hash and
+duration in seconds.
+
+    python generate_question_audio.py
+    python generate_question_audio.py --workers 8 --force
+    python generate_question_audio.py --backend stub --output /tmp/audio
 """
 
+import argparse
+import hashlib
 import json
 import os
+import random
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
-from elevenlabs import ElevenLabs
 from dotenv import load_dotenv
 
+import mp3_info
+from tts_backends import BACKENDS
+
 # Load environment variables
 load_dotenv()
 
 # Configuration
 SANTA_VOICE_ID = "ncsgABEEnuQrLrlvQqua"
+MODEL_ID = "eleven_multilingual_v2"  # Higher quality
+OUTPUT_FORMAT = "mp3_44100_128"
 INPUT_FILE = "questions_ffa.json"
 OUTPUT_DIR = "question_audio"
+CACHE_DIR = ".cache"
+MANIFEST_FILE = "manifest.json"
+
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0  # seconds, doubled each retry
+BACKOFF_MAX = 30.0
+
+
+def cache_key(text, voice, model, output_format):
+    """Content hash identifying one rendering of a question"""
+    key = json.dumps([text, voice, model, output_format], ensure_ascii=False)
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def file_hash(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
 
-# Initialize ElevenLabs client
-client = ElevenLabs(api_key=os.getenv("ELEVEN_LABS_API_KEY"))
 
-def create_output_directory():
-    """Create output directory if it doesn't exist"""
-    output_path = Path(OUTPUT_DIR)
-    output_path.mkdir(exist_ok=True)
-    print(f"✓ Output directory ready: {OUTPUT_DIR}/")
+def write_atomic(path, data):
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def is_retryable(error):
+    """Rate limits, server errors and network failures are worth retrying"""
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+def synthesize_with_retries(backend, text, voice, model, output_format, attempts=MAX_ATTEMPTS):
+    for attempt in range(1, attempts + 1):
+        try:
+            return backend.synthesize(text, voice, model, output_format)
+        except Exception as e:
+            if attempt == attempts or not is_retryable(e):
+                raise
+            delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1))
+            delay *= random.uniform(0.5, 1.0)  # jitter so workers don't retry in lockstep
+            print(f"  … attempt {attempt} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def create_output_directory(output_dir):
+    """Create output and cache directories if they don't exist"""
+    output_path = Path(output_dir)
+    (output_path / CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    print(f"✓ Output directory ready: {output_dir}/")
     return output_path
 
-def load_questions():
+
+def load_questions(input_file):
     """Load questions from JSON file"""
-    with open(INPUT_FILE, 'r', encoding='utf-8') as f:
+    with open(input_file, 'r', encoding='utf-8') as f:
         data = json.load(f)
     questions = data.get('questions', [])
-    print(f"✓ Loaded {len(questions)} questions from {INPUT_FILE}")
+    print(f"✓ Loaded {len(questions)} questions from {input_file}")
     return questions
 
-def generate_audio(question_text, question_id, output_path):
-    """Generate audio for a single question using ElevenLabs API"""
+
+def load_manifest(output_path):
+    path = output_path / MANIFEST_FILE
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('files', {})
+
+
+def save_manifest(output_path, files, voice, model, output_format):
+    manifest = {
+        "voice": voice,
+        "model": model,
+        "format": output_format,
+        "files": dict(sorted(files.items(), key=lambda item: item[1]["id"]))
+    }
+    data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+    write_atomic(output_path / MANIFEST_FILE, data)
+
+
+def manifest_entry(question_id, key, path):
+    with open(path, "rb") as f:
+        data = f.read()
+    return {
+        "id": question_id,
+        "key": key,
+        "sha256": hashlib.sha256(data).hexdigest(),
+        "duration": round(mp3_info.duration(data), 3),
+        "bytes": len(data)
+    }
+
+
+def generate_audio(backend, job, output_path, voice, model, output_format):
+    """Voice one question into the cache and copy it to its output file"""
+    question_id, text, key = job
     filename = output_path / f"question-{question_id}.mp3"
+    cached = output_path / CACHE_DIR / f"{key}.mp3"
 
-    try:
+    if not cached.exists():
         print(f"  Generating audio for Question {question_id}...")
+        audio = synthesize_with_retries(backend, text, voice, model, output_format)
+        write_atomic(cached, audio)
+    shutil.copyfile(cached, filename)
+    return manifest_entry(question_id, key, filename)
 
-        # Generate audio from text
-        audio = client.text_to_speech.convert(
-            text=question_text,
-            voice_id=SANTA_VOICE_ID,
-            model_id="eleven_multilingual_v2",  # Higher quality
-            output_format="mp3_44100_128"
-        )
-
-        # Save to file
-        with open(filename, "wb") as f:
-            for chunk in audio:
-                if chunk:
-                    f.write(chunk)
-
-        print(f"  ✓ Saved: {filename}")
-        return True
-
-    except Exception as e:
-        print(f"  ✗ Error generating audio for Question {question_id}: {e}")
-        return False
 
 def main():
     """Main execution function"""
+    parser = argparse.ArgumentParser(description="Generate question narration")
+    parser.add_argument("--input", default=INPUT_FILE, help="question pack to voice")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="directory for the MP3s and manifest")
+    parser.add_argument("--backend", default="elevenlabs", choices=sorted(BACKENDS))
+    parser.add_argument("--voice", default=SANTA_VOICE_ID)
+    parser.add_argument("--model", default=MODEL_ID)
+    parser.add_argument("--format", default=OUTPUT_FORMAT, dest="output_format",
+                        help="ElevenLabs output format; must be an mp3_* format")
+    parser.add_argument("--workers", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--force", action="store_true", help="regenerate even if cached")
+    args = parser.parse_args()
+    if not args.output_format.startswith("mp3_"):
+        # Files are saved as .mp3 and the manifest durations are read from MP3 frames
+        parser.error(f"unsupported --format {args.output_format}: only mp3_* formats are supported")
+
     print("\n" + "="*60)
     print("  Santa's Trivia Question Audio Generator")
     print("="*60 + "\n")
 
-    # Create output directory
-    output_path = create_output_directory()
-
-    # Load questions
-    questions = load_questions()
+    output_path = create_output_directory(args.output)
+    questions = load_questions(args.input)
 
     if not questions:
         print("✗ No questions found in JSON file!")
         return
 
-    # Generate audio for each question
-    print(f"\nGenerating audio for {len(questions)} questions...\n")
-
-    success_count = 0
+    previous = load_manifest(output_path)
+    files = {}
+    jobs = []
+    skipped_count = 0
     fail_count = 0
 
     for question_data in questions:
         question_id = question_data.get('id')
         question_text = question_data.get('question')
 
-        if question_id and question_text:
-            if generate_audio(question_text, question_id, output_path):
-                success_count += 1
-            else:
-                fail_count += 1
-        else:
+        if not (question_id and question_text):
             print(f"  ✗ Skipping invalid question: {question_data}")
             fail_count += 1
+            continue
+
+        key = cache_key(question_text, args.voice, args.model, args.output_format)
+        filename = f"question-{question_id}.mp3"
+        entry = previous.get(filename)
+        path = output_path / filename
+        if (not args.force and entry and entry.get("key") == key and path.exists()
+                and file_hash(path) == entry.get("sha256")):
+            files[filename] = entry
+            skipped_count += 1
+            continue
+        if args.force:
+            (output_path / CACHE_DIR / f"{key}.mp3").unlink(missing_ok=True)
+        jobs.append((question_id, question_text, key))
+
+    print(f"\n{skipped_count} unchanged, generating audio for {len(jobs)} questions "
+          f"with {args.workers} workers...\n")
+
+    success_count = 0
+    if jobs:
+        backend = BACKENDS[args.backend]()
+        with ThreadPoolExecutor(max_workers=args.workers) as pool:
+            futures = {
+                pool.submit(generate_audio, backend, job, output_path,
+                            args.voice, args.model, args.output_format): job
+                for job in jobs
+            }
+            for future in as_completed(futures):
+                question_id = futures[future][0]
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    print(f"  ✗ Error generating audio for Question {question_id}: {e}")
+                    fail_count += 1
+                    continue
+                files[f"question-{question_id}.mp3"] = entry
+                success_count += 1
+                print(f"  ✓ Saved: question-{question_id}.mp3 ({entry['duration']:.1f}s)")
+
+    save_manifest(output_path, files, args.voice, args.model, args.output_format)
 
     # Summary
     print("\n" + "="*60)
     print(f"  Generation Complete!")
     print("="*60)
     print(f"  ✓ Success: {success_count} files")
+    print(f"  • Unchanged: {skipped_count} files")
     if fail_count > 0:
         print(f"  ✗ Failed: {fail_count} files")
     print(f"  → Output location: {output_path.absolute()}")
+    print(f"  → Manifest: {output_path / MANIFEST_FILE}")
     print("="*60 + "\n")
 
+
 if __name__ == "__main__":
     main()
@@ -0,0 +1,88 @@
+"""
+MP3 duration without third-party libraries.
+
+Walks the MPEG Layer III frame headers, skipping any ID3v2 tag, and adds up
+the samples in each frame. A Xing/Info header, when present, gives the
+frame count directly so the whole file doesn't need walking.
+"""
+
+# Layer III bitrates in kbps by version, indexed by the header's bitrate bits
+BITRATES = {
+    1: (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    2: (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+_VERSIONS = {0b11: 1, 0b10: 2, 0b00: 2.5}
+
+
+def _frame_header(data, pos):
+    """(frame length, samples, sample rate, version, mono) or None if not a frame"""
+    if pos + 4 > len(data) or data[pos] != 0xFF or data[pos + 1] & 0xE0 != 0xE0:
+        return None
+    version = _VERSIONS.get((data[pos + 1] >> 3) & 0b11)
+    layer = (data[pos + 1] >> 1) & 0b11
+    bitrate_index = data[pos + 2] >> 4
+    rate_index = (data[pos + 2] >> 2) & 0b11
+    if version is None or layer != 0b01 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    bitrate = BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+    sample_rate = SAMPLE_RATES[version][rate_index]
+    padding = (data[pos + 2] >> 1) & 1
+    mono = (data[pos + 3] >> 6) == 0b11
+    if version == 1:
+        return 144 * bitrate // sample_rate + padding, 1152, sample_rate, version, mono
+    return 72 * bitrate // sample_rate + padding, 576, sample_rate, version, mono
+
+
+def _skip_id3(data):
+    if data[:3] != b'ID3' or len(data) < 10:
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _xing_frames(data, pos, version, mono):
+    """Frame count from a Xing/Info header in the frame at pos, if it has one"""
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    tag = pos + 4 + side_info
+    if data[tag:tag + 4] not in (b'Xing', b'Info'):
+        return None
+    flags = int.from_bytes(data[tag + 4:tag + 8], 'big')
+    if not flags & 1:
+        return None
+    return int.from_bytes(data[tag + 8:tag + 12], 'big')
+
+
+def duration(data):
+    """Duration in seconds of MP3 bytes; 0.0 if no frames are found"""
+    pos = _skip_id3(data)
+    samples = 0
+    sample_rate = None
+    first = True
+    while pos < len(data):
+        header = _frame_header(data, pos)
+        if header is None:
+            pos += 1   # resync on junk between frames
+            continue
+        length, frame_samples, rate, version, mono = header
+        if first:
+            first = False
+            sample_rate = rate
+            frames = _xing_frames(data, pos, version, mono)
+            if frames is not None:
+                return frames * frame_samples / rate
+        samples += frame_samples
+        pos += length
+    return samples / sample_rate if sample_rate else 0.0
+
+
+def file_duration(path):
+    with open(path, 'rb') as f:
+        return duration(f.read())
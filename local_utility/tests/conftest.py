@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The scripts import each other from the local_utility directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,67 @@
+"""The content-hash cache skips unchanged questions and regenerates edited ones"""
+import json
+import pytest
+import sys
+import generate_question_audio
+from generate_question_audio import CACHE_DIR, MANIFEST_FILE
+from tts_backends import StubBackend
+
+
+def write_pack(path, texts):
+    questions = [{"id": i + 1, "question": text} for i, text in enumerate(texts)]
+    path.write_text(json.dumps({"questions": questions}), encoding="utf-8")
+
+
+def run(monkeypatch, pack, output):
+    monkeypatch.setattr(sys, "argv", [
+        "generate_question_audio.py", "--backend", "stub",
+        "--input", str(pack), "--output", str(output), "--workers", "2"
+    ])
+    generate_question_audio.main()
+
+
+def test_cache_skips_unchanged_and_regenerates_edited(tmp_path, monkeypatch):
+    backend = StubBackend()
+    monkeypatch.setitem(generate_question_audio.BACKENDS, "stub", lambda: backend)
+    pack = tmp_path / "questions.json"
+    output = tmp_path / "audio"
+    texts = ["How many reindeer?", "What colour is Rudolph's nose?", "Where does Santa live?"]
+
+    write_pack(pack, texts)
+    run(monkeypatch, pack, output)
+    assert backend.calls == 3
+    assert len(list(output.glob("question-*.mp3"))) == 3
+    assert len(list((output / CACHE_DIR).glob("*.mp3"))) == 3
+
+    # Nothing changed: nothing is voiced again
+    run(monkeypatch, pack, output)
+    assert backend.calls == 3
+
+    # One edited question is voiced again, under a new cache key
+    manifest = json.loads((output / MANIFEST_FILE).read_text(encoding="utf-8"))["files"]
+    texts[1] = "What colour is Rudolph's famous nose?"
+    write_pack(pack, texts)
+    run(monkeypatch, pack, output)
+    assert backend.calls == 4
+    assert len(list(output.glob("question-*.mp3"))) == 3
+    assert len(list((output / CACHE_DIR).glob("*.mp3"))) == 4
+    edited = json.loads((output / MANIFEST_FILE).read_text(encoding="utf-8"))["files"]
+    assert edited["question-2.mp3"]["key"] != manifest["question-2.mp3"]["key"]
+    assert edited["question-1.mp3"] == manifest["question-1.mp3"]
+
+    # Reverting the edit reuses the clip already in the cache
+    texts[1] = "What colour is Rudolph's nose?"
+    write_pack(pack, texts)
+    run(monkeypatch, pack, output)
+    assert backend.calls == 4
+    assert json.loads((output / MANIFEST_FILE).read_text(encoding="utf-8"))["files"] == manifest
+
+
+def test_non_mp3_format_is_rejected(tmp_path, monkeypatch):
+    monkeypatch.setattr(sys, "argv", [
+        "generate_question_audio.py", "--backend", "stub", "--format", "pcm_16000",
+        "--output", str(tmp_path / "audio")
+    ])
+    with pytest.raises(SystemExit):
+        generate_question_audio.main()
+    assert not (tmp_path / "audio").exists()
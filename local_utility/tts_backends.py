@@ -0,0 +1,54 @@
+"""
+Text-to-speech backends for generate_question_audio.py
+
+A backend has one method, synthesize(text, voice, model, output_format),
+returning the encoded audio as bytes. Errors with a status_code of 429 or
+5xx (or no status at all, e.g. a dropped connection) are retried by the
+caller; anything else fails the question straight away.
+"""
+import os
+
+# One silent MPEG-1 Layer III frame: 128 kbps, 44.1 kHz, mono, 1152 samples
+_SILENT_FRAME = bytes([0xFF, 0xFB, 0x90, 0xC4]) + bytes(413)
+_FRAME_SECONDS = 1152 / 44100
+
+
+class ElevenLabsBackend:
+    """The ElevenLabs text_to_speech API"""
+
+    def __init__(self, api_key=None):
+        from elevenlabs import ElevenLabs  # only needed for real generation
+        self.client = ElevenLabs(api_key=api_key or os.getenv("ELEVEN_LABS_API_KEY"))
+
+    def synthesize(self, text, voice, model, output_format):
+        audio = self.client.text_to_speech.convert(
+            text=text,
+            voice_id=voice,
+            model_id=model,
+            output_format=output_format
+        )
+        return b"".join(chunk for chunk in audio if chunk)
+
+
+class StubBackend:
+    """
+    Offline stand-in: silent MP3s about as long as the text would take to
+    read aloud, so the pipeline and manifest can be exercised without an
+    API key or any cost.
+    """
+
+    SECONDS_PER_CHARACTER = 0.06
+
+    def __init__(self):
+        self.calls = 0
+
+    def synthesize(self, text, voice, model, output_format):
+        self.calls += 1
+        seconds = max(1.0, len(text) * self.SECONDS_PER_CHARACTER)
+        return _SILENT_FRAME * round(seconds / _FRAME_SECONDS)
+
+
+BACKENDS = {
+    "elevenlabs": ElevenLabsBackend,
+    "stub": StubBackend,
+}